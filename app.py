@@ -1,27 +1,32 @@
 import os
 import json
 import time
-import random
 import datetime
 import threading
 import logging
-import requests
 import re
 import pytz
-from flask import Flask, request, abort, render_template
+from flask import Flask, request, abort, render_template, jsonify
 from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import (
-    MessageEvent, TextMessage, TextSendMessage,
+    MessageEvent, TextMessage, TextSendMessage, UnfollowEvent,
     FlexSendMessage, BubbleContainer, BoxComponent,
     TextComponent, ButtonComponent, SeparatorComponent,
     URIAction, MessageAction, RichMenu, RichMenuArea, RichMenuBounds, PostbackAction,
     RichMenuSize
 )
 import schedule
-from PIL import Image, ImageDraw, ImageFont
-from routes import task, convert, search, map, route_message
+from routes import task, convert, search, map, command_router
 from routes.materials import materials_bp, handle_materials_command
+from database import pool_metrics
+from storage import create_storage, DEFAULT_FLUSH_INTERVAL
+from utils.event_dispatcher import EventDispatcher
+from utils.push_dispatcher import PushDispatcher
+from utils.reply_pipeline import ReplyPipeline
+from utils.render_cache import rich_menu_cache
+from utils.fonts import font_registry
+from utils import http_client
 from utils.rich_menu import preview_rich_menu, preview_gold_rich_menu, create_and_apply_rich_menu, create_and_apply_gold_rich_menu, delete_all_rich_menus
 
 # 設置台灣時區環境變數，確保所有時間處理使用相同時區
@@ -47,11 +52,12 @@ app.static_url_path = '/resources'
 
 # 註冊藍圖
 app.register_blueprint(materials_bp)
+app.register_blueprint(convert.convert_bp)
 
 # 從環境變數獲取配置
 LINE_CHANNEL_ACCESS_TOKEN = os.environ.get('LINE_CHANNEL_ACCESS_TOKEN')
 LINE_CHANNEL_SECRET = os.environ.get('LINE_CHANNEL_SECRET')
-USER_ID = os.environ.get('USER_ID')  # 要發送訊息的使用者 ID
+USER_ID = os.environ.get('USER_ID')  # 舊版單一使用者 ID，其資料會轉移到該使用者名下
 
 # 確保關鍵環境變數存在
 if not LINE_CHANNEL_ACCESS_TOKEN or not LINE_CHANNEL_SECRET:
@@ -61,11 +67,59 @@ if not LINE_CHANNEL_ACCESS_TOKEN or not LINE_CHANNEL_SECRET:
 line_bot_api = LineBotApi(LINE_CHANNEL_ACCESS_TOKEN) if LINE_CHANNEL_ACCESS_TOKEN else None
 handler = WebhookHandler(LINE_CHANNEL_SECRET) if LINE_CHANNEL_SECRET else None
 
-# 儲存任務的檔案
+# 排程推播的並行數、每秒請求上限與失敗重試次數
+PUSH_WORKERS = int(os.environ.get('PUSH_WORKERS', '4'))
+PUSH_RATE_LIMIT = float(os.environ.get('PUSH_RATE_LIMIT', '10'))
+PUSH_MAX_RETRIES = int(os.environ.get('PUSH_MAX_RETRIES', '3'))
+
+# 排程問題與提醒使用的批次推播
+push_dispatcher = PushDispatcher(
+    line_bot_api,
+    max_workers=PUSH_WORKERS,
+    rate_per_second=PUSH_RATE_LIMIT,
+    max_retries=PUSH_MAX_RETRIES
+)
+
+# Webhook 事件處理模式：async 先回應 200 再交給工作線程處理，sync 在請求中直接處理
+WEBHOOK_DISPATCH_MODE = os.environ.get('WEBHOOK_DISPATCH_MODE', 'async').lower()
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', '4'))
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', '100'))
+WEBHOOK_QUEUE_FULL_POLICY = os.environ.get('WEBHOOK_QUEUE_FULL_POLICY', 'inline').lower()
+
+# 從事件抵達起算的回覆時限（秒），超過時先回覆處理中，結果改用推播送出
+REPLY_DEADLINE = float(os.environ.get('REPLY_DEADLINE', '5'))
+REPLY_WORKERS = int(os.environ.get('REPLY_WORKERS', '4'))
+# 舊事件（重送或排隊過久）剩餘時限不足時，仍至少等待處理函數的秒數
+REPLY_MIN_WAIT = float(os.environ.get('REPLY_MIN_WAIT', '0.3'))
+
+# 舊版單一使用者的資料檔案，啟動時會轉移到 USER_ID 名下
 TASKS_FILE = 'tasks.json'
 REFLECTIONS_FILE = 'reflections.json'
+REFLECTIONS_JOURNAL_FILE = 'reflections.jsonl'
 QUESTIONS_FILE = 'questions.json'
 
+# 每位使用者的任務與反思存放在 DATA_DIR/users/<user_id>/ 之下
+DATA_DIR = os.environ.get('DATA_DIR', 'data')
+
+# 任務資料的批次寫入間隔（秒），設為 0 則每次修改立即寫入
+TASKS_FLUSH_INTERVAL = float(os.environ.get('TASKS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+
+# 儲存後端：設定了 DATABASE_URL 時預設使用 PostgreSQL，否則使用本機 JSON 檔案
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'postgres' if os.environ.get('DATABASE_URL') else 'json').lower()
+
+# 所有任務、反思與問題的讀寫都透過此儲存後端，請以 get_data_store() 取得已啟動的實例
+data_store = create_storage(
+    STORAGE_BACKEND,
+    TIMEZONE,
+    data_dir=DATA_DIR,
+    questions_file=QUESTIONS_FILE,
+    legacy_owner=USER_ID,
+    legacy_tasks_file=TASKS_FILE,
+    legacy_reflections_file=REFLECTIONS_FILE,
+    legacy_journal_file=REFLECTIONS_JOURNAL_FILE,
+    flush_interval=TASKS_FLUSH_INTERVAL
+)
+
 # 確保資料檔案存在
 def ensure_file_exists(filename, default_content):
     if not os.path.exists(filename):
@@ -74,8 +128,6 @@ def ensure_file_exists(filename, default_content):
 
 # 初始化資料檔案
 def init_files():
-    ensure_file_exists(TASKS_FILE, {"tasks": [], "daily_plan": {}})
-    ensure_file_exists(REFLECTIONS_FILE, {"reflections": []})
     ensure_file_exists(QUESTIONS_FILE, {
         "morning": [
             "今天你最重要的一件事是什麼？",
@@ -105,157 +157,42 @@ def init_files():
     })
     logger.info("資料檔案初始化完成")
 
-# 讀取資料
-def load_data(filename):
-    try:
-        with open(filename, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    except Exception as e:
-        logger.error(f"讀取 {filename} 時發生錯誤: {e}")
-        return None
-
-# 儲存資料
-def save_data(filename, data):
-    try:
-        with open(filename, 'w', encoding='utf-8') as file:
-            json.dump(data, file, ensure_ascii=False, indent=2)
-        return True
-    except Exception as e:
-        logger.error(f"儲存 {filename} 時發生錯誤: {e}")
-        return False
-
 # 添加任務
-def add_task(task_content, reminder_time=None):
-    data = load_data(TASKS_FILE)
-    if not data:
-        return False
-    
-    now = datetime.datetime.now(TIMEZONE)
-    
-    # 創建新任務
-    new_task = {
-        "content": task_content,
-        "created_at": now.strftime("%Y-%m-%d %H:%M:%S"),
-        "completed": False,
-        "completed_at": None,
-        "reminder_time": reminder_time,
-        "last_reminded_at": None,
-        "progress": 0
-    }
-    
-    # 添加到任務列表
-    data["tasks"].append(new_task)
-    
-    # 保存更新後的數據
-    return save_data(TASKS_FILE, data)
+def add_task(user_id, task_content, reminder_time=None):
+    return get_data_store().add_task(user_id, task_content, reminder_time)
 
 # 獲取任務列表
-def get_tasks(completed=None):
-    data = load_data(TASKS_FILE)
-    if not data:
-        return []
-    
-    tasks = []
-    for task in data["tasks"]:
-        if completed is None or task["completed"] == completed:
-            tasks.append(task)
-    
+def get_tasks(user_id, completed=None):
     # 按創建時間排序，最新的排在前面
-    return sorted(tasks, key=lambda x: x["created_at"], reverse=True)
+    return get_data_store().get_tasks(user_id, completed)
 
 # 標記任務為已完成
-def complete_task(task_content):
-    data = load_data(TASKS_FILE)
-    if not data:
-        return False
-    
-    for task in data["tasks"]:
-        if task["content"] == task_content and not task["completed"]:
-            task["completed"] = True
-            task["completed_at"] = datetime.datetime.now(TIMEZONE).strftime("%Y-%m-%d %H:%M:%S")
-            return save_data(TASKS_FILE, data)
-    
-    return False
+def complete_task(user_id, task_content):
+    return get_data_store().complete_task(user_id, task_content)
 
 # 獲取今日任務完成率
-def get_today_progress():
-    data = load_data(TASKS_FILE)
-    if not data:
-        return 0, 0, 0
-    
-    today = datetime.datetime.now(TIMEZONE).strftime("%Y-%m-%d")
-    total = 0
-    completed = 0
-    
-    for task in data["tasks"]:
-        task_date = task["created_at"].split()[0]  # 只取日期部分
-        if task_date == today:
-            total += 1
-            if task["completed"]:
-                completed += 1
-    
-    percentage = (completed / total * 100) if total > 0 else 0
-    return completed, total, percentage
+def get_today_progress(user_id):
+    return get_data_store().get_today_progress(user_id)
 
 # 儲存反思內容
-def save_reflection(question, answer):
-    data = load_data(REFLECTIONS_FILE)
-    if not data:
-        return False
-    
-    # 創建新反思
-    new_reflection = {
-        "question": question,
-        "answer": answer,
-        "created_at": datetime.datetime.now(TIMEZONE).strftime("%Y-%m-%d %H:%M:%S")
-    }
-    
-    # 添加到反思列表
-    data["reflections"].append(new_reflection)
-    
-    # 保存更新後的數據
-    return save_data(REFLECTIONS_FILE, data)
+def save_reflection(user_id, question, answer):
+    return get_data_store().save_reflection(user_id, question, answer)
 
 # 獲取隨機問題
 def get_random_question(time_of_day):
-    data = load_data(QUESTIONS_FILE)
-    if not data or time_of_day not in data or not data[time_of_day]:
-        return None
-    
-    return random.choice(data[time_of_day])
+    return get_data_store().get_random_question(time_of_day)
 
 # 設定每日計畫
-def set_daily_plan(plan_data):
-    data = load_data(TASKS_FILE)
-    if not data:
-        return False
-    
-    # 更新每日計畫
-    data["daily_plan"] = plan_data
-    
-    # 保存更新後的數據
-    return save_data(TASKS_FILE, data)
+def set_daily_plan(user_id, plan_data):
+    return get_data_store().set_daily_plan(user_id, plan_data)
 
 # 獲取每日計畫
-def get_daily_plan():
-    data = load_data(TASKS_FILE)
-    if not data:
-        return {}
-    
-    return data.get("daily_plan", {})
+def get_daily_plan(user_id):
+    return get_data_store().get_daily_plan(user_id)
 
 # 設置任務提醒
-def set_task_reminder(task_content, reminder_time):
-    data = load_data(TASKS_FILE)
-    if not data:
-        return False
-    
-    for task in data["tasks"]:
-        if task["content"] == task_content and not task["completed"]:
-            task["reminder_time"] = reminder_time
-            return save_data(TASKS_FILE, data)
-    
-    return False
+def set_task_reminder(user_id, task_content, reminder_time):
+    return get_data_store().set_task_reminder(user_id, task_content, reminder_time)
 
 # 發送LINE訊息
 def send_line_message(user_id, message):
@@ -364,45 +301,52 @@ def create_task_list_flex_message(tasks):
 
 # 發送思考問題
 def send_thinking_question(user_id, time_of_day):
+    message = create_thinking_question_message(time_of_day)
+    if message:
+        send_line_message(user_id, message)
+
+# 發送思考問題給所有訂閱者
+def send_thinking_question_to_subscribers(time_of_day):
+    message = create_thinking_question_message(time_of_day)
+    if not message:
+        return
+    
+    # 內容相同，以 multicast 批次發送
+    push_dispatcher.send((user_id, message) for user_id in get_data_store().get_subscribers())
+
+# 創建思考問題訊息
+def create_thinking_question_message(time_of_day):
     question = get_random_question(time_of_day)
     if not question:
         logger.error(f"無法獲取 {time_of_day} 反思問題")
-        return
+        return None
     
     time_label = "早晨" if time_of_day == "morning" else "晚間"
-    message = f"📝 {time_label}反思問題：\n\n{question}\n\n請回覆你的想法。"
-    send_line_message(user_id, message)
+    return f"📝 {time_label}反思問題：\n\n{question}\n\n請回覆你的想法。"
 
 # 發送任務提醒
 def send_task_reminder():
     now = datetime.datetime.now(TIMEZONE)
-    current_time = now.strftime("%H:%M")
     
-    data = load_data(TASKS_FILE)
-    if not data:
-        return
-    
-    # 檢查每個未完成的任務，看是否需要提醒
-    for task in data["tasks"]:
-        if not task["completed"] and task.get("reminder_time") == current_time:
-            # 發送提醒
-            message = f"⏰ 任務提醒：「{task['content']}」\n"
-            
-            # 如果有進度信息，添加到提醒中
-            if task.get("progress", 0) > 0:
-                message += f"目前進度: {task['progress']}%\n"
-            
-            # 添加創建時間信息
-            created_date = task["created_at"].split()[0]  # 只取日期部分
-            message += f"(建立於 {created_date})"
-            
-            send_line_message(USER_ID, message)
-            
-            # 更新上次提醒時間
-            task["last_reminded_at"] = now.strftime("%Y-%m-%d %H:%M:%S")
+    # 只查看到期分鐘的任務，且只有實際發出提醒時，任務資料才會被標記為需要寫回
+    # 每個任務都帶有所屬使用者的 user_id
+    messages = []
+    for task in get_data_store().collect_due_reminders(now):
+        message = f"⏰ 任務提醒：「{task['content']}」\n"
+        
+        # 如果有進度信息，添加到提醒中
+        if task.get("progress", 0) > 0:
+            message += f"目前進度: {task['progress']}%\n"
+        
+        # 添加創建時間信息
+        created_date = task["created_at"].split()[0]  # 只取日期部分
+        message += f"(建立於 {created_date})"
+        
+        messages.append((task["user_id"], message))
     
-    # 儲存更新後的任務數據
-    save_data(TASKS_FILE, data)
+    # 同一位使用者同時到期的提醒會合併成一則訊息
+    if messages:
+        push_dispatcher.send(messages)
 
 # 設置自我請求的時間間隔（秒）
 PING_INTERVAL = 840  # 14分鐘，略少於 Render 的 15 分鐘閒置限制
@@ -414,7 +358,7 @@ def keep_alive():
     """定期發送請求到自己的服務來保持活躍"""
     while True:
         try:
-            response = requests.get(APP_URL)
+            response = http_client.get(APP_URL)
             logger.info(f"Keep-alive ping sent. Response: {response.status_code}")
         except Exception as e:
             logger.error(f"Keep-alive ping failed: {e}")
@@ -431,11 +375,15 @@ def start_keep_alive_thread():
 # 排程任務
 def schedule_jobs():
     # 早晚定時發送問題 (使用台灣時區，而非UTC時區)
-    schedule.every().day.at("07:00").do(lambda: send_thinking_question(USER_ID, "morning"))
-    schedule.every().day.at("21:00").do(lambda: send_thinking_question(USER_ID, "evening"))
+    # 所有訂閱者都會收到同一則問題
+    schedule.every().day.at("07:00").do(lambda: send_thinking_question_to_subscribers("morning"))
+    schedule.every().day.at("21:00").do(lambda: send_thinking_question_to_subscribers("evening"))
     
-    # 每分鐘檢查任務提醒
-    schedule.every(1).minutes.do(send_task_reminder)
+    # 每分鐘整點檢查任務提醒（延遲喚醒時由 collect_due_reminders 補發錯過的分鐘）
+    schedule.every().minute.at(":00").do(send_task_reminder)
+    
+    # 每天凌晨整理儲存空間（JSON 儲存會清理反思日誌中寫到一半的殘行）
+    schedule.every().day.at("03:00").do(lambda: get_data_store().compact())
     
     # 執行排程任務的線程
     def run_scheduler():
@@ -448,11 +396,33 @@ def schedule_jobs():
     scheduler_thread.start()
     logger.info("排程任務已啟動")
 
-# 初始化資料庫（在這個版本中實際上是初始化檔案）
+# 初始化資料庫（JSON 儲存會建立資料檔案，PostgreSQL 儲存會建立資料表與索引）
 def init_db():
-    init_files()
+    if STORAGE_BACKEND == 'json':
+        init_files()
+    data_store.start()
     logger.info("資料初始化完成")
 
+# 資料儲存在第一次使用時才啟動（舊資料轉移、載入任務、建立資料表），
+# 匯入 app 時不做任何阻塞的讀寫，gunicorn 與 python app.py 都適用
+_data_store_started = False
+_data_store_lock = threading.Lock()
+
+def get_data_store():
+    """返回已啟動的資料儲存後端，第一次呼叫時才啟動"""
+    global _data_store_started
+    if not _data_store_started:
+        with _data_store_lock:
+            if not _data_store_started:
+                init_db()
+                _data_store_started = True
+    return data_store
+
+@app.before_first_request
+def start_data_store_in_background():
+    # 第一個請求（例如 /ping）到達後在背景啟動，不拖延該請求，第一則訊息也不必等待
+    threading.Thread(target=get_data_store, name="storage-start", daemon=True).start()
+
 # 新增測試路由
 @app.route("/ping", methods=['GET'])
 def ping():
@@ -481,41 +451,97 @@ def callback():
     body = request.get_data(as_text=True)
     app.logger.info("Request body: " + body)
     
+    if not event_dispatcher:
+        try:
+            handler.handle(body, signature)
+        except InvalidSignatureError:
+            abort(400)
+        return 'OK'
+    
+    # 驗證簽名並解析事件後立即回應，訊息處理交給工作線程
     try:
-        handler.handle(body, signature)
+        events = handler.parser.parse(body, signature)
     except InvalidSignatureError:
         abort(400)
     
+    if not event_dispatcher.submit_all(events):
+        # 佇列已滿，讓 LINE 稍後重送
+        abort(503)
+    
     return 'OK'
 
+# 在工作線程中處理單一 webhook 事件
+def dispatch_event(event):
+    if isinstance(event, MessageEvent) and isinstance(event.message, TextMessage):
+        handle_text_message(event)
+    elif isinstance(event, UnfollowEvent):
+        handle_unfollow(event)
+    else:
+        logger.info(f"略過未處理的事件類型: {type(event).__name__}")
+
 # 處理文字訊息
 @handler.add(MessageEvent, message=TextMessage)
 def handle_text_message(event):
     text = event.message.text.strip()
     user_id = event.source.user_id
     
+    subscription_reply = handle_subscription_command(text, user_id)
+    if subscription_reply:
+        try:
+            line_bot_api.reply_message(event.reply_token, TextSendMessage(text=subscription_reply))
+        except Exception as e:
+            logger.error(f"回覆訂閱設定失敗: {e}")
+        return
+    
+    # 傳過訊息的使用者會收到排程問題與提醒（主動取消訂閱的使用者除外）
+    get_data_store().add_subscriber(user_id)
+    
     # 將文本消息轉發到統一路由處理器
-    process_message(line_bot_api, text, user_id, event.reply_token)
-
-# 嘗試加載字體，用於繪製 Rich Menu
-# 在Render等環境中可能需要安裝中文字體或提供字體文件路徑
-FONT_PATH = None
-try:
-    # 嘗試常見的中文黑體字體 (Windows)
-    font_path_win = "C:/Windows/Fonts/msyh.ttc" # 微軟雅黑
-    if os.path.exists(font_path_win):
-        FONT_PATH = font_path_win
-    else:
-        # 嘗試常見的中文黑體字體 (Linux/Render)
-        # 可能需要通過 apt-get install fonts-wqy-zenhei 等方式安裝
-        font_path_linux = "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc"
-        if os.path.exists(font_path_linux):
-            FONT_PATH = font_path_linux
-        else:
-            # 如果找不到特定字體，嘗試系統預設 (可能不支持中文)
-            logger.warning("找不到指定的中文字體，Rich Menu 上的文字可能無法正確顯示。")
-except Exception as e:
-    logger.warning(f"加載字體時出錯: {e}")
+    process_message(line_bot_api, text, user_id, event.reply_token, event.timestamp)
+
+# 封鎖或刪除好友的使用者不再接收推播，避免繼續佔用推播額度
+@handler.add(UnfollowEvent)
+def handle_unfollow(event):
+    user_id = event.source.user_id
+    if get_data_store().remove_subscriber(user_id):
+        logger.info(f"使用者 {user_id} 已取消追蹤，移出推播名單")
+
+# 訂閱設定命令，需要使用者 ID，不經過命令路由器
+UNSUBSCRIBE_COMMANDS = ("#取消訂閱", "#停止推播")
+SUBSCRIBE_COMMANDS = ("#訂閱",)
+
+def handle_subscription_command(text, user_id):
+    """處理訂閱與取消訂閱命令，不是訂閱命令時返回 None"""
+    if text in UNSUBSCRIBE_COMMANDS:
+        if get_data_store().remove_subscriber(user_id, opt_out=True):
+            return "🔕 已停止每日問題推播，之後想再收到請輸入「#訂閱」"
+        return "❌ 取消訂閱失敗，請稍後再試"
+    if text in SUBSCRIBE_COMMANDS:
+        if get_data_store().add_subscriber(user_id, opt_in=True):
+            return "🔔 已訂閱每日問題推播，想停止請輸入「#取消訂閱」"
+        return "❌ 訂閱失敗，請稍後再試"
+    return None
+
+# 非同步事件分派器（sync 模式下不使用）
+event_dispatcher = EventDispatcher(
+    dispatch_event,
+    workers=WEBHOOK_WORKERS,
+    max_queue=WEBHOOK_QUEUE_SIZE,
+    full_policy=WEBHOOK_QUEUE_FULL_POLICY
+) if handler and WEBHOOK_DISPATCH_MODE == 'async' else None
+
+# 執行狀態指標
+@app.route("/admin/metrics", methods=['GET'])
+def metrics():
+    return jsonify({
+        "webhook": event_dispatcher.metrics() if event_dispatcher else {"mode": "sync"},
+        "database_pool": pool_metrics(),
+        "push": push_dispatcher.metrics(),
+        "search_cache": search.search_cache.metrics(),
+        "http_client": http_client.metrics(),
+        "replies": reply_pipeline.metrics(),
+        "rich_menu_render": rich_menu_cache.metrics()
+    })
 
 # 創建Rich Menu
 def create_rich_menu():
@@ -576,45 +602,44 @@ def test_rich_menu():
     except Exception as e:
         return f"創建Rich Menu時發生錯誤: {str(e)}", 500
 
-# 創建Rich Menu圖片
-def create_rich_menu_image(filename="rich_menu.png", text_enabled=True):
-    """創建2500x1686的Rich Menu圖片"""
-    width, height = 2500, 1686
-    img = Image.new('RGB', (width, height), (255, 255, 255))
-    draw = ImageDraw.Draw(img)
-
-    # 繪製網格線和區域
+# 舊版 Rich Menu 的六個區域：(標籤, 中心 x, 中心 y)
+RICH_MENU_SIZE = (2500, 1686)
+RICH_MENU_ITEMS = [
+    ("新增任務", RICH_MENU_SIZE[0] // 6, RICH_MENU_SIZE[1] // 4),
+    ("查詢任務", RICH_MENU_SIZE[0] // 2, RICH_MENU_SIZE[1] // 4),
+    ("今日進度", RICH_MENU_SIZE[0] * 5 // 6, RICH_MENU_SIZE[1] // 4),
+    ("反思", RICH_MENU_SIZE[0] // 6, RICH_MENU_SIZE[1] * 3 // 4),
+    ("設定計畫", RICH_MENU_SIZE[0] // 2, RICH_MENU_SIZE[1] * 3 // 4),
+    ("幫助", RICH_MENU_SIZE[0] * 5 // 6, RICH_MENU_SIZE[1] * 3 // 4)
+]
+
+def _draw_rich_menu_grid(draw, width, height):
     # 水平分隔線
     draw.line([(0, height // 2), (width, height // 2)], fill=(200, 200, 200), width=5)
     # 垂直分隔線
     draw.line([(width // 3, 0), (width // 3, height)], fill=(200, 200, 200), width=5)
     draw.line([(width * 2 // 3, 0), (width * 2 // 3, height)], fill=(200, 200, 200), width=5)
 
+def render_rich_menu_image(params):
+    """依參數繪製舊版 Rich Menu 圖片，返回 PIL 圖片"""
+    # Pillow 只在繪製選單圖片時才載入，不拖慢冷啟動
+    from PIL import Image, ImageDraw
+
+    width, height = params["size"]
+    img = Image.new('RGB', (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+
+    # 繪製網格線和區域
+    _draw_rich_menu_grid(draw, width, height)
+
     # 如果啓用了文字且字體可用，則添加文字
-    if text_enabled and FONT_PATH:
+    if params["font_path"]:
         try:
-            font_size = 80 # 調整字體大小
-            font = ImageFont.truetype(FONT_PATH, font_size)
-
-            menu_items = [
-                ("新增任務", width // 6, height // 4),
-                ("查詢任務", width // 2, height // 4),
-                ("今日進度", width * 5 // 6, height // 4),
-                ("反思", width // 6, height * 3 // 4),
-                ("設定計畫", width // 2, height * 3 // 4),
-                ("幫助", width * 5 // 6, height * 3 // 4)
-            ]
+            font = font_registry.get_font(params["font_size"], params["font_path"])
 
-            for text, x_center, y_center in menu_items:
+            for text, x_center, y_center in params["items"]:
                 # 計算文字寬高以居中
-                try:
-                    # Pillow >= 9.2.0
-                    bbox = font.getbbox(text)
-                    text_width = bbox[2] - bbox[0]
-                    text_height = bbox[3] - bbox[1]
-                except AttributeError:
-                    # Pillow < 9.2.0
-                    text_width, text_height = font.getsize(text)
+                text_width, text_height = font_registry.text_size(text, params["font_size"], params["font_path"])
 
                 x = x_center - text_width // 2
                 y = y_center - text_height // 2
@@ -625,18 +650,32 @@ def create_rich_menu_image(filename="rich_menu.png", text_enabled=True):
             img = Image.new('RGB', (width, height), (230, 230, 230)) # 使用不同背景色區分
             draw = ImageDraw.Draw(img)
             # 重新繪製分隔線
-            draw.line([(0, height // 2), (width, height // 2)], fill=(200, 200, 200), width=5)
-            draw.line([(width // 3, 0), (width // 3, height)], fill=(200, 200, 200), width=5)
-            draw.line([(width * 2 // 3, 0), (width * 2 // 3, height)], fill=(200, 200, 200), width=5)
+            _draw_rich_menu_grid(draw, width, height)
 
-    elif not FONT_PATH:
-         logger.info("未找到可用字體，創建無文字 Rich Menu 圖片。")
-         # 可以選擇繪製圖標或簡單圖形代替文字
+    return img
+
+# 創建Rich Menu圖片
+def create_rich_menu_image(filename="rich_menu.png", text_enabled=True):
+    """創建2500x1686的Rich Menu圖片，相同參數的圖片只繪製一次"""
+    font_path = font_registry.font_path
+    if not font_path:
+        logger.info("未找到可用字體，創建無文字 Rich Menu 圖片。")
+
+    params = {
+        "size": RICH_MENU_SIZE,
+        "items": RICH_MENU_ITEMS,
+        "font_path": font_path if text_enabled else None,
+        "font_size": 80,
+    }
 
     try:
+        png = rich_menu_cache.get_or_render(
+            "rich_menu_legacy", params, lambda: render_rich_menu_image(params)
+        )
         # 保存圖片
-        img.save(filename)
-        logger.info(f"Rich Menu圖片 '{filename}' 創建成功 (Text enabled: {text_enabled and FONT_PATH is not None})")
+        with open(filename, 'wb') as f:
+            f.write(png)
+        logger.info(f"Rich Menu圖片 '{filename}' 創建成功 (Text enabled: {text_enabled and font_path is not None})")
         return filename
     except Exception as e:
         logger.error(f"保存Rich Menu圖片 '{filename}' 時發生錯誤: {e}")
@@ -653,76 +692,71 @@ def ensure_rich_menu_image_exists():
     # return create_rich_menu_image(filename=filename, text_enabled=True)
     return filename
 
-# 路由處理函數 - 臨時實現
-def process_message(line_bot_api, text, user_id, reply_token):
-    # 嘗試使用統一的路由處理函數
-    from routes import route_message
-    
-    # 如果route_message處理了消息，則直接返回
-    if route_message(line_bot_api, text, user_id, reply_token):
-        return
-    
-    # 根據消息前綴決定使用哪個模組處理
-    if text.startswith("熱力學地圖") or text.startswith("記憶術地圖"):
-        reply_text = "主題地圖功能即將推出！"
-        line_bot_api.reply_message(reply_token, TextSendMessage(text=reply_text))
-    
-    elif text.startswith("#今天任務") or text.startswith("#打卡"):
-        reply_text = "任務與打卡功能即將推出！"
-        line_bot_api.reply_message(reply_token, TextSendMessage(text=reply_text))
-    
-    elif text.startswith("#挑戰"):
-        reply_text = "知識挑戰功能即將推出！"
-        line_bot_api.reply_message(reply_token, TextSendMessage(text=reply_text))
-    
-    elif text.startswith("#AI"):
-        reply_text = "AI助手功能即將推出！"
-        line_bot_api.reply_message(reply_token, TextSendMessage(text=reply_text))
-    
-    elif text.startswith("#開始專注") or text.startswith("#專注"):
-        reply_text = "專注模式功能即將推出！"
-        line_bot_api.reply_message(reply_token, TextSendMessage(text=reply_text))
-    
-    elif text.startswith("#呼叫"):
-        reply_text = "角色助理功能即將推出！"
-        line_bot_api.reply_message(reply_token, TextSendMessage(text=reply_text))
-    
-    elif text.startswith("/export-report") or text.startswith("#報告"):
-        reply_text = "學習報告功能即將推出！"
-        line_bot_api.reply_message(reply_token, TextSendMessage(text=reply_text))
-    
-    elif text.startswith("#新增卡") or text.startswith("#卡片"):
-        reply_text = "記憶卡片功能即將推出！"
-        line_bot_api.reply_message(reply_token, TextSendMessage(text=reply_text))
-    
-    else:
-        # 通用命令處理
-        handle_general_command(line_bot_api, text, user_id, reply_token)
+HELP_TEXT = (
+    "📚 學習助手指令：\n\n"
+    "ℹ️ 功能說明:\n #幫助、#help\n\n"
+    "🔄 時區轉換:\n #時區轉換 [時間] [原時區] to [目標時區]\n\n"
+    "🔍 搜尋解釋:\n #搜尋 [關鍵詞]\n\n"
+    "🗺️ 主題地圖:\n 熱力學地圖、記憶術地圖\n\n"
+    "✅ 任務管理:\n #今天任務、#打卡 [內容] [時間]分鐘\n\n"
+    "🔍 知識挑戰:\n #挑戰 [主題]\n\n"
+    "🤖 AI協助:\n #AI [問題]\n\n"
+    "⏱️ 專注模式:\n #開始專注、#專注 [主題] [時間]分鐘\n\n"
+    "📊 學習分析:\n #報告 [日/週/月]\n\n"
+    "🏆 設定目標:\n #目標 [描述] [日期]\n\n"
+    "📚 學習材料:\n #材料、#材料 [主題]、#推薦材料\n\n"
+    "🔔 每日推播:\n #取消訂閱、#訂閱\n\n"
+)
+
+UNKNOWN_COMMAND_TEXT = "🤔 我不確定你想做什麼，請輸入「#幫助」查看可用指令"
+
+# 尚未實作的功能，(命令前綴, 回覆文字)
+COMING_SOON_COMMANDS = (
+    (("熱力學地圖", "記憶術地圖"), "主題地圖功能即將推出！"),
+    (("#今天任務", "#打卡"), "任務與打卡功能即將推出！"),
+    (("#挑戰",), "知識挑戰功能即將推出！"),
+    (("#AI",), "AI助手功能即將推出！"),
+    (("#開始專注", "#專注"), "專注模式功能即將推出！"),
+    (("#呼叫",), "角色助理功能即將推出！"),
+    (("/export-report", "#報告"), "學習報告功能即將推出！"),
+    (("#新增卡", "#卡片"), "記憶卡片功能即將推出！"),
+)
+
+HELP_COMMANDS = ("help", "幫助", "#help", "#幫助")
+
+
+def _coming_soon_handler(reply_text):
+    return lambda text: reply_text
+
+
+def handle_help_command(text):
+    """完整輸入幫助命令時返回指令說明"""
+    if text.strip().lower() in HELP_COMMANDS:
+        return HELP_TEXT
+    return None
 
-def handle_general_command(line_bot_api, text, user_id, reply_token):
-    """處理通用命令，如幫助、設置等"""
-    from linebot.models import TextSendMessage
-    
-    HELP_TEXT = (
-        "📚 學習助手指令：\n\n"
-        "ℹ️ 功能說明:\n #幫助、#help\n\n"
-        "🔄 時區轉換:\n #時區轉換 [時間] [原時區] to [目標時區]\n\n"
-        "🔍 搜尋解釋:\n #搜尋 [關鍵詞]\n\n"
-        "🗺️ 主題地圖:\n 熱力學地圖、記憶術地圖\n\n"
-        "✅ 任務管理:\n #今天任務、#打卡 [內容] [時間]分鐘\n\n"
-        "🔍 知識挑戰:\n #挑戰 [主題]\n\n"
-        "🤖 AI協助:\n #AI [問題]\n\n"
-        "⏱️ 專注模式:\n #開始專注、#專注 [主題] [時間]分鐘\n\n"
-        "📊 學習分析:\n #報告 [日/週/月]\n\n"
-        "🏆 設定目標:\n #目標 [描述] [日期]\n\n"
-        "📚 學習材料:\n #材料、#材料 [主題]、#推薦材料\n\n"
-    )
-    
-    if text.lower() in ["help", "幫助", "#help", "#幫助"]:
-        line_bot_api.reply_message(reply_token, TextSendMessage(text=HELP_TEXT))
-    else:
-        reply_text = "🤔 我不確定你想做什麼，請輸入「#幫助」查看可用指令"
-        line_bot_api.reply_message(reply_token, TextSendMessage(text=reply_text))
+
+# 登記在各模組處理函數之後，模組沒有回覆時才使用
+for _prefixes, _reply_text in COMING_SOON_COMMANDS:
+    command_router.register(_prefixes, _coming_soon_handler(_reply_text), name='coming_soon')
+command_router.register(HELP_COMMANDS, handle_help_command, name='help', ignore_case=True)
+
+
+# 文字訊息的回覆流程：時限內以回覆權杖回覆，逾時改用推播
+reply_pipeline = ReplyPipeline(
+    line_bot_api,
+    command_router,
+    push_dispatcher,
+    budget=REPLY_DEADLINE,
+    workers=REPLY_WORKERS,
+    min_wait=REPLY_MIN_WAIT,
+    fallback_text=UNKNOWN_COMMAND_TEXT
+)
+
+
+def process_message(line_bot_api, text, user_id, reply_token, event_timestamp=None):
+    """以命令路由器分派訊息，沒有任何命令回覆時提示使用幫助"""
+    reply_pipeline.process(text, user_id, reply_token, event_timestamp)
 
 # LIFF頁面路由
 @app.route('/liff')
@@ -754,10 +788,6 @@ def remove_all_rich_menus():
     return result
 
 if __name__ == "__main__":
-    # 初始化資料庫（文件）
-    logger.info("正在初始化資料...")
-    init_db()
-    
     # 確保Rich Menu圖片存在
     logger.info("確認Rich Menu圖片...")
     rich_menu_image = ensure_rich_menu_image_exists()
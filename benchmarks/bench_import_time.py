@@ -0,0 +1,83 @@
+"""app.py 冷啟動匯入時間檢查
+
+以 python -X importtime 在全新的直譯器中匯入 app，取多次中最快的一次，
+列出累計耗時最多的模組；匯入時間超過門檻，或冷啟動時就載入了
+應延後載入的重量級套件（pandas、PIL）時以狀態碼 1 結束。
+
+用法：
+    python benchmarks/bench_import_time.py --max-ms 600 --runs 3
+"""
+import os
+import re
+import sys
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只應在使用到對應功能時才載入的套件
+LAZY_MODULES = ('pandas', 'numpy', 'PIL')
+
+# import time:  self [us] | cumulative | imported package
+_LINE_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def measure_import(module='app'):
+    """在新的直譯器中匯入 module，返回 {模組名稱: (累計微秒, 縮排層級)}"""
+    env = dict(os.environ)
+    env.setdefault('LINE_CHANNEL_SECRET', 'benchmark')
+    env.setdefault('LINE_CHANNEL_ACCESS_TOKEN', 'benchmark')
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    # 在暫存目錄執行，避免匯入時建立的資料檔案寫進專案目錄
+    with tempfile.TemporaryDirectory() as tmp:
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=tmp, env=env, capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f'匯入 {module} 失敗:\n{result.stderr}')
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = _LINE_PATTERN.match(line)
+        if match:
+            cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+            modules.setdefault(name, (cumulative, indent))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='檢查 app.py 的冷啟動匯入時間')
+    parser.add_argument('--max-ms', type=float, default=600, help='匯入 app 的時間上限（毫秒）')
+    parser.add_argument('--runs', type=int, default=3, help='匯入次數，取最快的一次')
+    parser.add_argument('--top', type=int, default=15, help='列出累計耗時最多的模組數')
+    args = parser.parse_args()
+
+    best = min((measure_import() for _ in range(max(1, args.runs))), key=lambda modules: modules['app'][0])
+    total_ms = best['app'][0] / 1000
+
+    # 只列出 app 直接匯入的模組（app 的下一層），避免重複計算子模組
+    direct = sorted(
+        ((cumulative, name) for name, (cumulative, indent) in best.items() if indent == 3),
+        reverse=True
+    )
+    print(f'{"模組":<32}{"累計 (ms)":>12}')
+    for cumulative, name in direct[:args.top]:
+        print(f'{name:<32}{cumulative / 1000:>12.1f}')
+    print(f'{"app":<32}{total_ms:>12.1f}')
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in best]
+    if eager:
+        print(f'冷啟動時載入了應延後載入的套件: {", ".join(eager)}')
+        failed = True
+    if total_ms > args.max_ms:
+        print(f'匯入時間 {total_ms:.1f}ms 超過門檻 {args.max_ms:.0f}ms')
+        failed = True
+    print('檢查結果: ' + ('失敗' if failed else '通過'))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
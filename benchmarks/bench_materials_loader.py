@@ -0,0 +1,107 @@
+"""學習材料載入效能比較
+
+產生一份合成的材料試算表，分別計時：
+  1. pd.read_excel 讀取試算表
+  2. 舊版以 DataFrame.iterrows 逐列轉換並分組
+  3. routes.materials.group_materials 整欄轉換並分組
+
+用法：
+    python benchmarks/bench_materials_loader.py --rows 50000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.materials import group_materials, read_materials_frame  # noqa: E402
+
+TOPICS = ['Python', '機器學習', '資料結構', '英文', '統計', '設計模式', '網路', '作業系統']
+TYPES = ['文章', '視頻', '書籍', '練習', '課程', '筆記', '測驗', '項目']
+
+
+def build_frame(rows, seed=42):
+    """建立與 learning_materials.xlsx 欄位相同的合成資料"""
+    rng = random.Random(seed)
+    start = pd.Timestamp('2023-01-01')
+    return pd.DataFrame({
+        '編號': range(1, rows + 1),
+        '主題': [rng.choice(TOPICS) if rng.random() > 0.02 else None for _ in range(rows)],
+        '標題': [f'材料 {i} - {rng.choice(TOPICS)}' for i in range(rows)],
+        '類型': [rng.choice(TYPES) for _ in range(rows)],
+        '描述': [f'第 {i} 份學習材料的說明文字，涵蓋{rng.choice(TOPICS)}相關內容' for i in range(rows)],
+        '連結': [f'https://example.com/materials/{i}' if rng.random() > 0.3 else None for i in range(rows)],
+        '推薦': [rng.choice(['是', '否', None]) for _ in range(rows)],
+        '日期': [start + pd.Timedelta(days=rng.randrange(720)) for _ in range(rows)],
+    })
+
+
+def legacy_group(df):
+    """舊版 load_materials_from_excel 的轉換邏輯（逐列 iterrows）"""
+    materials = []
+    for _, row in df.iterrows():
+        material = {col: row[col] for col in df.columns}
+        for key, value in material.items():
+            if pd.isna(value):
+                material[key] = None
+            elif isinstance(value, pd.Timestamp):
+                material[key] = value.strftime('%Y-%m-%d')
+            elif isinstance(value, (int, float)):
+                material[key] = value
+            else:
+                material[key] = str(value)
+        materials.append(material)
+
+    materials_by_topic = {}
+    for material in materials:
+        topic = material.get('主題', '未分類')
+        materials_by_topic.setdefault(topic, []).append(material)
+    return materials_by_topic
+
+
+def timed(func, *args, repeat=1):
+    """返回 (最佳耗時秒數, 最後一次的結果)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較學習材料載入方式的效能')
+    parser.add_argument('--rows', type=int, default=50000, help='合成資料列數')
+    parser.add_argument('--repeat', type=int, default=3, help='轉換步驟重複次數（取最佳值）')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'learning_materials.xlsx')
+        build_frame(args.rows).to_excel(path, index=False)
+
+        read_time, df = timed(read_materials_frame, path)
+        legacy_time, legacy = timed(legacy_group, df, repeat=args.repeat)
+        vectorized_time, grouped = timed(group_materials, df, repeat=args.repeat)
+
+    legacy_count = sum(len(items) for items in legacy.values())
+    grouped_count = sum(len(items) for items in grouped.values())
+
+    print(f'資料列數: {args.rows}')
+    print(f'{"步驟":<24}{"耗時 (秒)":>12}')
+    print(f'{"pd.read_excel":<24}{read_time:>12.3f}')
+    print(f'{"iterrows 轉換 (舊版)":<24}{legacy_time:>12.3f}')
+    print(f'{"group_materials":<24}{vectorized_time:>12.3f}')
+    if vectorized_time > 0:
+        print(f'轉換加速: {legacy_time / vectorized_time:.1f}x')
+    print(f'材料筆數: 舊版 {legacy_count}，新版 {grouped_count}')
+
+
+if __name__ == '__main__':
+    main()
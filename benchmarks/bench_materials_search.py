@@ -0,0 +1,93 @@
+"""學習材料搜索效能比較
+
+建立合成的材料目錄，比較舊版逐筆子字串比對與倒排索引 (BM25) 的查詢延遲。
+索引查詢（含多個查詢詞的中文 bigram 與英文查詢）的中位數超過門檻時以狀態碼 1 結束。
+
+用法：
+    python benchmarks/bench_materials_search.py --materials 100000 --max-ms 1
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.materials import MaterialsSnapshot  # noqa: E402
+
+TOPICS = ['Python', '機器學習', '資料結構', '英文', '統計', '設計模式', '網路', '作業系統']
+WORDS = ['演算法', '遞迴', '排序', '向量', '矩陣', '梯度', '記憶', '遷移', '類比', '函數',
+         'async', 'graph', 'tensor', 'cache', 'index', 'thread', 'lambda', 'regex']
+QUERIES = ['遞迴', '機器學習', '梯度下降', 'python', 'graph cache', '矩陣 向量', '學', 'lambda',
+           '資料結構', 'async 設計模式 cache']
+
+
+def build_materials(count, seed=42):
+    rng = random.Random(seed)
+    materials = {}
+    for i in range(count):
+        topic = rng.choice(TOPICS)
+        words = rng.sample(WORDS, 4)
+        materials.setdefault(topic, []).append({
+            '標題': f'{words[0]}{words[1]} 入門 {i}',
+            '描述': f'介紹{words[2]}與{words[3]}的關係，並以{topic}為例說明',
+            '主題': topic,
+        })
+    return materials
+
+
+def legacy_search(materials, keyword):
+    """舊版 search_materials 的逐筆比對"""
+    results = []
+    for topic, topic_materials in materials.items():
+        for material in topic_materials:
+            title = str(material.get('標題', '')).lower()
+            description = str(material.get('描述', '')).lower()
+            if keyword.lower() in title or keyword.lower() in description or keyword.lower() in topic.lower():
+                results.append(material)
+    return results
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較學習材料搜索方式的效能')
+    parser.add_argument('--materials', type=int, default=100000, help='合成材料數量')
+    parser.add_argument('--repeat', type=int, default=20, help='每個查詢的重複次數（取中位數）')
+    parser.add_argument('--limit', type=int, default=20, help='索引查詢的每頁筆數')
+    parser.add_argument('--max-ms', type=float, default=1.0, help='索引查詢的延遲上限（毫秒）')
+    args = parser.parse_args()
+
+    materials = build_materials(args.materials)
+    start = time.perf_counter()
+    snapshot = MaterialsSnapshot(materials)
+    snapshot.build_search_index()
+    print(f'材料數量: {args.materials}，建立索引耗時 {time.perf_counter() - start:.2f} 秒')
+
+    print(f'{"查詢":<16}{"命中數":>10}{"逐筆比對 (ms)":>16}{"索引 (ms)":>12}')
+    slow = []
+    for query in QUERIES:
+        total, _ = snapshot.search(query, limit=args.limit)
+        legacy_ms = measure(lambda: legacy_search(materials, query), max(1, args.repeat // 10))
+        index_ms = measure(lambda: snapshot.search(query, limit=args.limit), args.repeat)
+        print(f'{query:<16}{total:>10}{legacy_ms:>16.2f}{index_ms:>12.3f}')
+        if index_ms > args.max_ms:
+            slow.append(query)
+
+    if slow:
+        print(f'索引查詢超過 {args.max_ms}ms: {", ".join(slow)}')
+    print('檢查結果: ' + ('失敗' if slow else '通過'))
+    sys.exit(1 if slow else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""時間解析效能比較與解析結果檢查
+
+以固定的 CORPUS 檢查 routes.convert.parse_time_str 的解析結果，
+再比較舊版逐一嘗試 strptime 的寫法與單一正則表達式的解析速度。
+
+用法：
+    python benchmarks/bench_time_parser.py --repeat 20000
+"""
+import os
+import re
+import sys
+import timeit
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.convert import parse_time_str  # noqa: E402
+
+# 固定的「現在」，讓相對日期的結果可以重現
+NOW = datetime(2024, 3, 1, 9, 0)
+
+# (輸入, 預期結果)，預期結果為 None 表示應解析失敗
+CORPUS = [
+    ("14:30", datetime(2024, 3, 1, 14, 30)),
+    ("2:30 PM", datetime(2024, 3, 1, 14, 30)),
+    ("2:30PM", datetime(2024, 3, 1, 14, 30)),
+    ("2:30 am", datetime(2024, 3, 1, 2, 30)),
+    ("12:15 AM", datetime(2024, 3, 1, 0, 15)),
+    ("2:30", datetime(2024, 3, 1, 2, 30)),
+    ("14:30:45", datetime(2024, 3, 1, 14, 30, 45)),
+    ("2:30:00 PM", datetime(2024, 3, 1, 14, 30)),
+    ("2023-06-10 14:30", datetime(2023, 6, 10, 14, 30)),
+    ("2023/06/10 9:05", datetime(2023, 6, 10, 9, 5)),
+    ("14時30分", datetime(2024, 3, 1, 14, 30)),
+    ("14：30", datetime(2024, 3, 1, 14, 30)),
+    ("2:30 下午", datetime(2024, 3, 1, 14, 30)),
+    ("下午三點半", datetime(2024, 3, 1, 15, 30)),
+    ("下午3點", datetime(2024, 3, 1, 15, 0)),
+    ("上午10點一刻", datetime(2024, 3, 1, 10, 15)),
+    ("三點三刻", datetime(2024, 3, 1, 3, 45)),
+    ("晚上8點15分", datetime(2024, 3, 1, 20, 15)),
+    ("晚上12點", datetime(2024, 3, 2, 0, 0)),
+    ("晚上12點半", datetime(2024, 3, 2, 0, 30)),
+    ("明天 晚上12點", datetime(2024, 3, 3, 0, 0)),
+    ("十點零五分", datetime(2024, 3, 1, 10, 5)),
+    ("二十三點五十九分", datetime(2024, 3, 1, 23, 59)),
+    ("中午12點", datetime(2024, 3, 1, 12, 0)),
+    ("中午1點", datetime(2024, 3, 1, 13, 0)),
+    ("凌晨12:30", datetime(2024, 3, 1, 0, 30)),
+    ("明天 14:00", datetime(2024, 3, 2, 14, 0)),
+    ("後天 上午9點", datetime(2024, 3, 3, 9, 0)),
+    ("昨天 下午3點", datetime(2024, 2, 29, 15, 0)),
+    ("25:00", None),
+    ("14:75", None),
+    ("2023-02-30 10:00", None),
+    ("abc", None),
+    ("", None),
+]
+
+
+def legacy_parse_time_str(time_str):
+    """舊版 parse_time_str：逐一嘗試 strptime，最後以正則表達式補救"""
+    time_str = time_str.strip()
+    formats = ["%H:%M", "%I:%M %p", "%I:%M%p", "%I:%M", "%H:%M:%S", "%I:%M:%S %p", "%Y-%m-%d %H:%M"]
+    for fmt in formats:
+        try:
+            dt = datetime.strptime(time_str, fmt)
+            now = datetime.now()
+            return datetime(now.year, now.month, now.day, dt.hour, dt.minute, dt.second)
+        except ValueError:
+            continue
+
+    match = re.search(r"(\d{1,2})[:：時](\d{1,2})(?:分|)(?:\s*(上午|下午|am|pm|AM|PM)|)", time_str)
+    if match:
+        hour = int(match.group(1))
+        minute = int(match.group(2))
+        am_pm = match.group(3).lower() if match.group(3) else None
+        if am_pm in ["下午", "pm"]:
+            if hour < 12:
+                hour += 12
+        elif am_pm in ["上午", "am"]:
+            if hour == 12:
+                hour = 0
+        now = datetime.now()
+        return datetime(now.year, now.month, now.day, hour, minute, 0)
+    return None
+
+
+def check_corpus():
+    """返回解析結果與預期不符的項目"""
+    failures = []
+    for text, expected in CORPUS:
+        result = parse_time_str(text, NOW)
+        if result != expected:
+            failures.append((text, expected, result))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較時間解析方式的效能')
+    parser.add_argument('--repeat', type=int, default=20000, help='每種輸入的解析次數')
+    args = parser.parse_args()
+
+    failures = check_corpus()
+    for text, expected, result in failures:
+        print(f'解析錯誤: {text!r} 預期 {expected}，實際 {result}')
+    print(f'解析結果檢查: {len(CORPUS) - len(failures)}/{len(CORPUS)} 通過')
+
+    # 只用舊版也支援的輸入比較速度
+    samples = ["14:30", "2:30 PM", "14:30:45", "2023-06-10 14:30", "14時30分", "2:30 下午"]
+    print(f'{"輸入":<20}{"舊版 (µs)":>12}{"新版 (µs)":>12}')
+    for text in samples:
+        legacy = timeit.timeit(lambda: legacy_parse_time_str(text), number=args.repeat) / args.repeat * 1e6
+        current = timeit.timeit(lambda: parse_time_str(text, NOW), number=args.repeat) / args.repeat * 1e6
+        print(f'{text:<20}{legacy:>12.2f}{current:>12.2f}')
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,10 @@
 import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
 import psycopg2
 from psycopg2.extras import RealDictCursor
-import logging
 import pytz
 
 logger = logging.getLogger(__name__)
@@ -12,132 +15,360 @@ TIMEZONE = pytz.timezone('Asia/Taipei')
 # 獲取資料庫連接 URL
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
+# 連接池設定
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '5'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+# 連接閒置超過此秒數，取出時先以 SELECT 1 確認連線仍可用
+DB_POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+
+
+class PoolTimeout(Exception):
+    """在 timeout 內無法從連接池取得連接"""
+
+
+def _connect():
+    """建立新的實體連接，時區只在建立時設定一次"""
+    conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    cursor = conn.cursor()
+    cursor.execute("SET timezone TO 'Asia/Taipei'")
+    cursor.close()
+    conn.commit()
+    return conn
+
+
+class ConnectionPool:
+    """執行緒安全的資料庫連接池
+
+    connect 為建立實體連接的函數，測試時可以換成連到本機資料庫
+    或任何符合 DB-API 的替代品（例如 sqlite3.connect）。
+    """
+
+    def __init__(self, connect, minconn=1, maxconn=5, timeout=10.0, ping_after=30.0):
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        # 閒置連接與其歸還時間，後進先出讓常用的連接保持溫熱
+        self._idle = []
+        self._open = 0
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "timeouts": 0,
+            "wait_total_ms": 0.0,
+            "wait_max_ms": 0.0,
+        }
+        for _ in range(minconn):
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    def _new_connection(self):
+        conn = self._connect()
+        with self._lock:
+            self._open += 1
+            self._stats["created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self._open -= 1
+            self._stats["discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_closed(conn):
+        return bool(getattr(conn, 'closed', False))
+
+    def _healthy(self, conn, idle_since):
+        if self._is_closed(conn):
+            return False
+        if time.monotonic() - idle_since < self.ping_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"資料庫連接健康檢查失敗，重新建立連接: {e}")
+            return False
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                item = self._idle.pop() if self._idle else None
+            if item is None:
+                return self._new_connection()
+            conn, idle_since = item
+            if self._healthy(conn, idle_since):
+                return conn
+            self._discard(conn)
+
+    def _checkin(self, conn):
+        if self._is_closed(conn):
+            self._discard(conn)
+            return
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """取出一條連接，區塊正常結束時提交，發生例外時回滾，最後歸還連接池"""
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(f"等待資料庫連接超過 {self.timeout} 秒")
+
+        waited_ms = (time.monotonic() - start) * 1000
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["wait_total_ms"] += waited_ms
+            self._stats["wait_max_ms"] = max(self._stats["wait_max_ms"], waited_ms)
+
+        conn = None
+        try:
+            conn = self._checkout()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if not self._is_closed(conn):
+                    conn.rollback()
+                raise
+        finally:
+            if conn is not None:
+                self._checkin(conn)
+            self._slots.release()
+
+    def metrics(self):
+        """返回連接池大小、等待時間與取出次數"""
+        with self._lock:
+            checkouts = self._stats["checkouts"]
+            return dict(
+                self._stats,
+                size=self._open,
+                idle=len(self._idle),
+                in_use=self._open - len(self._idle),
+                maxconn=self.maxconn,
+                wait_avg_ms=round(self._stats["wait_total_ms"] / checkouts, 2) if checkouts else 0.0,
+            )
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """返回全域連接池，第一次呼叫時才建立"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _connect,
+                    minconn=DB_POOL_MIN,
+                    maxconn=DB_POOL_MAX,
+                    timeout=DB_POOL_TIMEOUT,
+                    ping_after=DB_POOL_PING_AFTER
+                )
+    return _pool
+
+
+def connection():
+    """從全域連接池取出連接的 context manager
+
+    用法:
+        with connection() as conn:
+            cursor = conn.cursor()
+            ...
+    """
+    return get_pool().connection()
+
+
+def pool_metrics():
+    """返回全域連接池的指標，尚未建立時返回 None"""
+    return _pool.metrics() if _pool else None
+
+
 def get_connection():
-    """建立並返回資料庫連接"""
+    """建立並返回不經過連接池的獨立資料庫連接，使用完畢需自行關閉"""
     try:
-        conn = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-        # 設置資料庫連接的時區為台灣時區
-        cursor = conn.cursor()
-        cursor.execute("SET timezone TO 'Asia/Taipei'")
-        conn.commit()
-        return conn
+        return _connect()
     except Exception as e:
         logger.error(f"資料庫連接錯誤: {e}")
         return None
 
 def init_db():
     """初始化資料庫表結構"""
-    conn = get_connection()
-    if not conn:
-        return False
-    
     try:
-        cursor = conn.cursor()
+        with connection() as conn:
+            cursor = conn.cursor()
         
-        # 創建任務表
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tasks (
-            id SERIAL PRIMARY KEY,
-            content TEXT NOT NULL,
-            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            completed BOOLEAN NOT NULL DEFAULT FALSE,
-            completed_at TIMESTAMP,
-            progress INTEGER NOT NULL DEFAULT 0,
-            reminder_time VARCHAR(5),
-            last_reminded_at TIMESTAMP
-        )
-        ''')
+            # 創建任務表
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id SERIAL PRIMARY KEY,
+                content TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                completed BOOLEAN NOT NULL DEFAULT FALSE,
+                completed_at TIMESTAMP,
+                progress INTEGER NOT NULL DEFAULT 0,
+                reminder_time VARCHAR(5),
+                last_reminded_at TIMESTAMP
+            )
+            ''')
         
-        # 創建反思表
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reflections (
-            id SERIAL PRIMARY KEY,
-            question TEXT NOT NULL,
-            answer TEXT NOT NULL,
-            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
+            # 創建反思表
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reflections (
+                id SERIAL PRIMARY KEY,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
         
-        # 創建問題表
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS questions (
-            id SERIAL PRIMARY KEY,
-            time_of_day VARCHAR(20) NOT NULL,
-            content TEXT NOT NULL
-        )
-        ''')
+            # 創建問題表
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS questions (
+                id SERIAL PRIMARY KEY,
+                time_of_day VARCHAR(20) NOT NULL,
+                content TEXT NOT NULL
+            )
+            ''')
         
-        # 創建計畫表
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS daily_plans (
-            id SERIAL PRIMARY KEY,
-            time_slot VARCHAR(30) NOT NULL,
-            content TEXT NOT NULL
-        )
-        ''')
+            # 創建計畫表
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_plans (
+                id SERIAL PRIMARY KEY,
+                time_slot VARCHAR(30) NOT NULL,
+                content TEXT NOT NULL
+            )
+            ''')
         
-        # 初始化問題數據
-        cursor.execute("SELECT COUNT(*) FROM questions")
-        question_count = cursor.fetchone()['count']
+            # 創建訂閱者表（接收排程問題與提醒的使用者）
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS subscribers (
+                user_id VARCHAR(64) PRIMARY KEY,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            
+            # 主動取消訂閱的使用者保留在表中並標記，傳訊息時不會被自動加回
+            cursor.execute("ALTER TABLE subscribers ADD COLUMN IF NOT EXISTS opted_out BOOLEAN NOT NULL DEFAULT FALSE")
+            
+            # 記錄已完成、只需執行一次的資料轉移
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS migrations (
+                name VARCHAR(64) PRIMARY KEY,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            
+            # 任務、反思與計畫依 LINE 使用者 ID 分開儲存
+            for table in ("tasks", "reflections", "daily_plans"):
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS user_id VARCHAR(64)")
+            
+            # 建立索引：提醒排程只查未完成任務的 reminder_time，
+            # 任務列表與今日進度依使用者與建立日期查詢
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tasks_open_reminder
+            ON tasks (reminder_time) WHERE completed = FALSE
+            ''')
+            cursor.execute("DROP INDEX IF EXISTS idx_tasks_created_date")
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tasks_user_created_date
+            ON tasks (user_id, (created_at::date))
+            ''')
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tasks_user_created_at
+            ON tasks (user_id, created_at)
+            ''')
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_reflections_user
+            ON reflections (user_id, timestamp)
+            ''')
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_daily_plans_user
+            ON daily_plans (user_id)
+            ''')
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_questions_time_of_day
+            ON questions (time_of_day)
+            ''')
+            
+            # 初始化問題數據
+            cursor.execute("SELECT COUNT(*) FROM questions")
+            question_count = cursor.fetchone()['count']
         
-        if question_count == 0:
-            # 添加晨間問題
-            morning_questions = [
-                "今天你最重要的一件事是什麼？",
-                "你希望今天結束時能完成什麼？",
-                "今天有什麼可能讓你分心的事情？你要如何應對？",
-                "你今天最期待什麼事情？",
-                "如果今天只能完成一件事，你會選擇做什麼？",
-                "今天你想要專注發展哪方面的能力？",
-                "有什麼小習慣是你今天想要堅持的？"
-            ]
+            if question_count == 0:
+                # 添加晨間問題
+                morning_questions = [
+                    "今天你最重要的一件事是什麼？",
+                    "你希望今天結束時能完成什麼？",
+                    "今天有什麼可能讓你分心的事情？你要如何應對？",
+                    "你今天最期待什麼事情？",
+                    "如果今天只能完成一件事，你會選擇做什麼？",
+                    "今天你想要專注發展哪方面的能力？",
+                    "有什麼小習慣是你今天想要堅持的？"
+                ]
             
-            for q in morning_questions:
-                cursor.execute(
-                    "INSERT INTO questions (time_of_day, content) VALUES (%s, %s)",
-                    ("morning", q)
-                )
+                for q in morning_questions:
+                    cursor.execute(
+                        "INSERT INTO questions (time_of_day, content) VALUES (%s, %s)",
+                        ("morning", q)
+                    )
             
-            # 添加晚間問題
-            evening_questions = [
-                "今天你完成了什麼有意義的事？",
-                "你今天遇到最大的阻力是什麼？",
-                "今天有什麼事情讓你感到開心或有成就感？",
-                "明天你想要改進什麼？",
-                "今天你學到了什麼？",
-                "今天你最感恩的一件事是什麼？",
-                "今天有哪個決定你覺得做得特別好？"
-            ]
+                # 添加晚間問題
+                evening_questions = [
+                    "今天你完成了什麼有意義的事？",
+                    "你今天遇到最大的阻力是什麼？",
+                    "今天有什麼事情讓你感到開心或有成就感？",
+                    "明天你想要改進什麼？",
+                    "今天你學到了什麼？",
+                    "今天你最感恩的一件事是什麼？",
+                    "今天有哪個決定你覺得做得特別好？"
+                ]
             
-            for q in evening_questions:
-                cursor.execute(
-                    "INSERT INTO questions (time_of_day, content) VALUES (%s, %s)",
-                    ("evening", q)
-                )
+                for q in evening_questions:
+                    cursor.execute(
+                        "INSERT INTO questions (time_of_day, content) VALUES (%s, %s)",
+                        ("evening", q)
+                    )
             
-            # 添加深度反思問題
-            deep_questions = [
-                "在過去的一個月中，你注意到自己有什麼成長或改變？",
-                "目前有什麼事情正在阻礙你實現目標？你可以如何突破？",
-                "如果回顧你人生中最有意義的幾個決定，有什麼共同點？",
-                "你最近感到壓力的根源是什麼？有哪些方法可以幫助你減輕它？",
-                "如果可以給一年前的自己一個建議，你會說什麼？"
-            ]
+                # 添加深度反思問題
+                deep_questions = [
+                    "在過去的一個月中，你注意到自己有什麼成長或改變？",
+                    "目前有什麼事情正在阻礙你實現目標？你可以如何突破？",
+                    "如果回顧你人生中最有意義的幾個決定，有什麼共同點？",
+                    "你最近感到壓力的根源是什麼？有哪些方法可以幫助你減輕它？",
+                    "如果可以給一年前的自己一個建議，你會說什麼？"
+                ]
             
-            for q in deep_questions:
-                cursor.execute(
-                    "INSERT INTO questions (time_of_day, content) VALUES (%s, %s)",
-                    ("deep", q)
-                )
+                for q in deep_questions:
+                    cursor.execute(
+                        "INSERT INTO questions (time_of_day, content) VALUES (%s, %s)",
+                        ("deep", q)
+                    )
         
-        conn.commit()
         logger.info("資料庫初始化完成")
         return True
     
     except Exception as e:
-        conn.rollback()
         logger.error(f"初始化資料庫時發生錯誤: {e}")
         return False
-    
-    finally:
-        conn.close()
@@ -17,9 +17,15 @@ let searchInput, searchButton, topicsGrid, materialsList, listTitle, materialsCo
 let backToTopics, materialModal, modalTitle, modalTopicType, modalDescription, modalLinkContainer, modalLink;
 let topicsLoading, materialsLoading, noMaterialsFound;
 
+// Paging: materials are requested page by page with only the fields the list and modal need
+const PAGE_SIZE = 20;
+const LIST_FIELDS = ['標題', '類型', '主題', '描述', '連結'];
+
 // Cache
 let topicsCache = null;
-let materialsCache = {}; // Cache materials by topic
+let materialsCache = {}; // Cache loaded pages by list URL (topic, recommended or search): { items, total }
+let currentList = null; // URL of the list currently shown
+let loadMoreObserver = null;
 
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize LIFF first (assuming liff-init.js handles this)
@@ -74,14 +80,14 @@ function initializeMaterialsPage() {
 
 async function fetchTopics() {
     if (topicsCache) return topicsCache; // Return from cache if available
-    console.log("Fetching topics from API...");
+    console.log("Fetching topic summary from API...");
     try {
-        const response = await fetch('/api/materials/topics');
+        const response = await fetch('/api/materials/summary');
         if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-        const topics = await response.json();
-        topicsCache = topics; // Store in cache
-        console.log("Topics fetched:", topics);
-        return topics;
+        const summary = await response.json();
+        topicsCache = summary.topics; // Store in cache: [{ topic, count }]
+        console.log("Topics fetched:", topicsCache);
+        return topicsCache;
     } catch (error) {
         console.error("Error fetching topics:", error);
         showError(topicsGrid, "無法載入主題列表，請稍後再試。", topicsLoading);
@@ -89,34 +95,30 @@ async function fetchTopics() {
     }
 }
 
-async function fetchMaterialsByTopic(topic) {
-    if (materialsCache[topic]) return materialsCache[topic]; // Return from cache
-    console.log(`Fetching materials for topic: ${topic}...`);
-    try {
-        const response = await fetch(`/api/materials/topic/${encodeURIComponent(topic)}`);
-        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-        const materials = await response.json();
-        materialsCache[topic] = materials; // Store in cache
-        console.log(`Materials for ${topic}:`, materials);
-        return materials;
-    } catch (error) {
-        console.error(`Error fetching materials for topic ${topic}:`, error);
-        showError(materialsContainer, "無法載入學習材料，請稍後再試。", materialsLoading);
-        return null;
-    }
-}
+async function fetchMaterialsPage(listUrl) {
+    // Returns the cached list state after loading its next page
+    const state = materialsCache[listUrl] || { items: [], total: null };
+    materialsCache[listUrl] = state;
+    if (state.total !== null && state.items.length >= state.total) return state;
 
-async function searchMaterialsAPI(keyword) {
-    console.log(`Searching materials for keyword: ${keyword}...`);
+    const params = new URLSearchParams({
+        offset: state.items.length,
+        limit: PAGE_SIZE,
+        fields: LIST_FIELDS.join(',')
+    });
+    console.log(`Fetching ${listUrl} (offset ${state.items.length})...`);
     try {
-        const response = await fetch(`/api/materials/search/${encodeURIComponent(keyword)}`);
+        const response = await fetch(`${listUrl}?${params}`);
         if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-        const results = await response.json();
-        console.log("Search results:", results);
-        return results;
+        const page = await response.json();
+        state.items = state.items.concat(page);
+        const total = parseInt(response.headers.get('X-Total-Count'), 10);
+        state.total = isNaN(total) ? state.items.length : total;
+        if (page.length === 0) state.total = state.items.length; // Nothing more to load
+        return state;
     } catch (error) {
-        console.error(`Error searching materials for keyword ${keyword}:`, error);
-        showError(materialsContainer, "搜索失敗，請稍後再試。", materialsLoading);
+        console.error(`Error fetching ${listUrl}:`, error);
+        showError(materialsContainer, "無法載入學習材料，請稍後再試。", materialsLoading);
         return null;
     }
 }
@@ -130,12 +132,10 @@ async function loadTopics() {
 
     hideLoading(topicsLoading);
     if (topics && topics.length > 0) {
-        // Fetch material counts for each topic (optional, can be slow)
-        // We can simplify for now and just display topic names
-        topics.forEach(topic => {
+        topics.forEach(({ topic, count }) => {
             const card = document.createElement('div');
             card.className = 'topic-card';
-            card.innerHTML = `<div class="topic-title">${topic}</div>`; // Add count later if needed
+            card.innerHTML = `<div class="topic-title">${topic}</div><div class="topic-count">${count} 項</div>`;
             card.onclick = () => loadMaterialsForTopic(topic);
             topicsGrid.appendChild(card);
         });
@@ -154,71 +154,86 @@ async function loadTopics() {
     }
 }
 
-async function loadMaterialsForTopic(topic) {
-    console.log(`Loading materials view for topic: ${topic}`);
+async function loadPagedList(listUrl, title) {
+    console.log(`Loading materials view: ${listUrl}`);
+    currentList = listUrl;
     showLoading(materialsLoading);
     showMaterialsView();
-    listTitle.textContent = topic; // Set title
+    listTitle.textContent = title;
     materialsContainer.innerHTML = ''; // Clear previous content
     hideNoData(noMaterialsFound);
 
-    const materials = await fetchMaterialsByTopic(topic);
+    // Reuse pages loaded earlier, otherwise fetch the first page
+    const cached = materialsCache[listUrl];
+    const state = cached && cached.items.length > 0 ? cached : await fetchMaterialsPage(listUrl);
     hideLoading(materialsLoading);
+    if (currentList !== listUrl || !state) return; // User navigated away or request failed
 
-    if (materials && materials.length > 0) {
-        displayMaterials(materials);
-    } else if (materials) {
+    if (state.items.length > 0) {
+        displayMaterials(state.items);
+        updateLoadMore(listUrl, state);
+    } else {
         showNoData(noMaterialsFound);
     }
 }
 
-async function loadRecommendedMaterials() {
-    console.log("Loading recommended materials...");
-    showLoading(materialsLoading);
-    showMaterialsView();
-    listTitle.textContent = "推薦材料";
-    materialsContainer.innerHTML = '';
-    hideNoData(noMaterialsFound);
+async function loadMoreMaterials(listUrl) {
+    const state = materialsCache[listUrl];
+    if (!state || state.loading) return;
+    state.loading = true;
+    const shown = state.items.length;
+    const updated = await fetchMaterialsPage(listUrl);
+    state.loading = false;
+    if (currentList !== listUrl || !updated) return;
+
+    displayMaterials(updated.items.slice(shown), true);
+    updateLoadMore(listUrl, updated);
+}
 
-    try {
-        const response = await fetch('/api/materials/recommended');
-        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-        const materials = await response.json();
-        hideLoading(materialsLoading);
-        if (materials && materials.length > 0) {
-            displayMaterials(materials);
-        } else {
-            showNoData(noMaterialsFound);
-        }
-    } catch (error) {
-        console.error("Error fetching recommended materials:", error);
-        showError(materialsContainer, "無法載入推薦材料，請稍後再試。", materialsLoading);
+function updateLoadMore(listUrl, state) {
+    // Show a "load more" button at the end of the list; it also loads automatically when scrolled into view
+    const existing = document.getElementById('loadMoreMaterials');
+    if (existing) existing.remove();
+    if (loadMoreObserver) loadMoreObserver.disconnect();
+    if (state.items.length >= state.total) return;
+
+    const button = document.createElement('button');
+    button.id = 'loadMoreMaterials';
+    button.className = 'load-more';
+    button.textContent = `載入更多（${state.items.length}/${state.total}）`;
+    button.onclick = () => loadMoreMaterials(listUrl);
+    materialsContainer.appendChild(button);
+
+    if ('IntersectionObserver' in window) {
+        loadMoreObserver = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) loadMoreMaterials(listUrl);
+        });
+        loadMoreObserver.observe(button);
     }
 }
 
-async function performSearch() {
+function loadMaterialsForTopic(topic) {
+    return loadPagedList(`/api/materials/topic/${encodeURIComponent(topic)}`, topic);
+}
+
+function loadRecommendedMaterials() {
+    console.log("Loading recommended materials...");
+    return loadPagedList('/api/materials/recommended', "推薦材料");
+}
+
+function performSearch() {
     const keyword = searchInput.value.trim();
     if (!keyword) return; // Don't search if empty
 
     console.log(`Performing search for: ${keyword}`);
-    showLoading(materialsLoading);
-    showMaterialsView();
-    listTitle.textContent = `搜索結果: "${keyword}"`;
-    materialsContainer.innerHTML = '';
-    hideNoData(noMaterialsFound);
-
-    const results = await searchMaterialsAPI(keyword);
-    hideLoading(materialsLoading);
-
-    if (results && results.length > 0) {
-        displayMaterials(results);
-    } else if (results) {
-        showNoData(noMaterialsFound);
-    }
+    // Search results are paged like topic lists (the server caps each page), with load-more on scroll
+    return loadPagedList(`/api/materials/search/${encodeURIComponent(keyword)}`, `搜索結果: "${keyword}"`);
 }
 
-function displayMaterials(materials) {
-    materialsContainer.innerHTML = ''; // Clear first
+function displayMaterials(materials, append = false) {
+    const loadMore = document.getElementById('loadMoreMaterials');
+    if (loadMore) loadMore.remove();
+    if (!append) materialsContainer.innerHTML = ''; // Clear first
     materials.forEach(material => {
         const card = document.createElement('div');
         card.className = 'material-card';
@@ -244,6 +259,8 @@ function displayMaterials(materials) {
 
 function showTopicsView() {
     console.log("Switching to topics view");
+    currentList = null;
+    if (loadMoreObserver) loadMoreObserver.disconnect();
     topicsGrid.style.display = 'grid';
     materialsList.style.display = 'none';
     searchInput.value = ''; // Clear search input when going back
@@ -3,41 +3,53 @@
 這個包包含應用程序的所有路由和處理函數。
 """
 
+from utils.command_router import CommandRouter
+
 # 導入各個模塊的藍圖
 try:
     from routes.materials import materials_bp, handle_materials_command
+    from routes.materials import COMMAND_PREFIXES as MATERIALS_COMMANDS
 except ImportError:
     print("Warning: materials module import failed")
     materials_bp = None
     handle_materials_command = None
+    MATERIALS_COMMANDS = ()
 
 try:
     from routes.convert import convert_bp, handle_convert_command
+    from routes.convert import COMMAND_PREFIXES as CONVERT_COMMANDS
 except ImportError:
     print("Warning: convert module import failed")
     convert_bp = None
     handle_convert_command = None
+    CONVERT_COMMANDS = ()
 
 try:
     from routes.map import map_bp, handle_map_command
+    from routes.map import COMMAND_PREFIXES as MAP_COMMANDS
 except ImportError:
     print("Warning: map module import failed")
     map_bp = None
     handle_map_command = None
+    MAP_COMMANDS = ()
 
 try:
     from routes.search import search_bp, handle_search_command
+    from routes.search import COMMAND_PREFIXES as SEARCH_COMMANDS
 except ImportError:
     print("Warning: search module import failed")
     search_bp = None
     handle_search_command = None
+    SEARCH_COMMANDS = ()
 
 try:
     from routes.task import task_bp, handle_task_command
+    from routes.task import COMMAND_PREFIXES as TASK_COMMANDS
 except ImportError:
     print("Warning: task module import failed")
     task_bp = None
     handle_task_command = None
+    TASK_COMMANDS = ()
 
 # 導出模組
 __all__ = [
@@ -46,50 +58,18 @@ __all__ = [
     'convert_bp', 'handle_convert_command',
     'map_bp', 'handle_map_command',
     'search_bp', 'handle_search_command',
-    'task_bp', 'handle_task_command'
+    'task_bp', 'handle_task_command',
+    'command_router'
 ]
 
-# 處理消息分發
-def route_message(line_bot_api, text, user_id, reply_token):
-    """根據消息內容將請求分發到相應的處理函數"""
-    from linebot.models import TextSendMessage
-    
-    # 嘗試調用各個模塊的處理函數
-
-    # 處理時區轉換命令
-    if handle_convert_command and text.startswith("#時區轉換"):
-        response = handle_convert_command(text)
-        if response:
-            line_bot_api.reply_message(reply_token, TextSendMessage(text=response))
-            return True
-
-    # 處理搜索命令
-    if handle_search_command and (text.startswith("#搜尋") or text.startswith("#搜索")):
-        response = handle_search_command(text)
-        if response:
-            line_bot_api.reply_message(reply_token, TextSendMessage(text=response))
-            return True
-
-    # 處理地圖命令
-    if handle_map_command and (text.startswith("熱力學地圖") or text.startswith("記憶術地圖")):
-        response = handle_map_command(text)
-        if response:
-            line_bot_api.reply_message(reply_token, TextSendMessage(text=response))
-            return True
-
-    # 處理學習材料命令
-    if handle_materials_command:
-        response = handle_materials_command(text)
-        if response:
-            line_bot_api.reply_message(reply_token, TextSendMessage(text=response))
-            return True
-
-    # 處理任務命令
-    if handle_task_command and (text.startswith("#今天任務") or text.startswith("#打卡")):
-        response = handle_task_command(text)
-        if response:
-            line_bot_api.reply_message(reply_token, TextSendMessage(text=response))
-            return True
-
-    # 如果沒有匹配的處理函數，返回False
-    return False
+# 各模組的命令前綴登記到同一個命令路由器
+command_router = CommandRouter()
+for _prefixes, _handler in (
+    (CONVERT_COMMANDS, handle_convert_command),
+    (SEARCH_COMMANDS, handle_search_command),
+    (MAP_COMMANDS, handle_map_command),
+    (MATERIALS_COMMANDS, handle_materials_command),
+    (TASK_COMMANDS, handle_task_command),
+):
+    if _handler:
+        command_router.register(_prefixes, _handler)
@@ -1,13 +1,17 @@
 import pytz
 import re
 import datetime
+import functools
 from datetime import datetime, timedelta
-from flask import Blueprint
+from flask import Blueprint, request, jsonify
 from linebot.models import TextSendMessage
 
 # 創建藍圖
 convert_bp = Blueprint('convert', __name__)
 
+# 時區轉換命令，完整格式見 CONVERT_COMMAND_PATTERN
+COMMAND_PREFIXES = ("#時區轉換",)
+
 # 支持的時區代碼和名稱映射
 TIMEZONE_ALIASES = {
     "tw": "Asia/Taipei",
@@ -60,121 +64,349 @@ TIMEZONE_ALIASES = {
     "gmt": "UTC"
 }
 
+def _normalize_zone_key(zone_str):
+    """時區輸入正規化：轉小寫、合併空白，底線視為空白"""
+    return re.sub(r'\s+', ' ', zone_str.replace('_', ' ')).strip().lower()
+
+def _build_zone_index():
+    """建立 小寫名稱 -> 時區名稱 的索引：別名優先，其次為完整名稱，最後是城市名稱"""
+    index = {}
+    for name in sorted(pytz.all_timezones):
+        index.setdefault(_normalize_zone_key(name), name)
+    # 城市名稱（例如 new york），常用時區優先，名稱相同時依字母順序決定
+    for zones in (sorted(pytz.common_timezones), sorted(pytz.all_timezones)):
+        for name in zones:
+            city = _normalize_zone_key(name.rsplit('/', 1)[-1])
+            index.setdefault(city, name)
+    for alias, name in TIMEZONE_ALIASES.items():
+        index[_normalize_zone_key(alias)] = name
+    return index
+
+class _ZoneTrie:
+    """時區名稱的字典樹，用來找出編輯距離最小的名稱"""
+
+    def __init__(self, words):
+        self.root = {}
+        for word in words:
+            node = self.root
+            for char in word:
+                node = node.setdefault(char, {})
+            node[None] = word
+
+    def closest(self, word, max_distance):
+        """返回編輯距離不超過 max_distance 且距離最小的所有名稱"""
+        best = []
+        first_row = list(range(len(word) + 1))
+        for char, child in self.root.items():
+            self._walk(child, char, word, first_row, max_distance, best)
+        if not best:
+            return []
+        distance = min(best)[0]
+        return sorted(name for d, name in best if d == distance)
+
+    def _walk(self, node, char, word, previous_row, max_distance, best):
+        row = [previous_row[0] + 1]
+        for column in range(1, len(word) + 1):
+            row.append(min(
+                row[column - 1] + 1,
+                previous_row[column] + 1,
+                previous_row[column - 1] + (word[column - 1] != char)
+            ))
+        if None in node and row[-1] <= max_distance:
+            best.append((row[-1], node[None]))
+        # 這一列的最小值已超過上限時，往下的節點不可能更接近
+        if min(row) <= max_distance:
+            for next_char, child in node.items():
+                if next_char is not None:
+                    self._walk(child, next_char, word, row, max_distance, best)
+
+@functools.lru_cache(maxsize=None)
+def _zone_lookup():
+    """第一次解析時區時才建立索引與字典樹，之後重用（避免拖慢冷啟動）"""
+    index = _build_zone_index()
+    return index, _ZoneTrie(index)
+
+def _max_edit_distance(key):
+    """短的輸入（例如 tw、ny、none）不做模糊比對，避免誤判"""
+    if len(key) <= 4:
+        return 0
+    return 1 if len(key) <= 8 else 2
+
+@functools.lru_cache(maxsize=1024)
+def resolve_timezone_name(zone_str):
+    """把使用者輸入解析為時區名稱，找不到時返回 None"""
+    key = _normalize_zone_key(zone_str)
+    if not key:
+        return None
+    zone_index, zone_trie = _zone_lookup()
+    if key in zone_index:
+        return zone_index[key]
+    max_distance = _max_edit_distance(key)
+    if max_distance:
+        # 只有唯一的最接近時區時才採用，多個候選距離相同時視為無法判斷
+        candidates = {zone_index[name] for name in zone_trie.closest(key, max_distance)}
+        if len(candidates) == 1:
+            return candidates.pop()
+    return None
+
 def get_timezone(zone_str):
-    """根據輸入的字符串獲取時區對象"""
-    zone_str = zone_str.lower().strip()
-    
-    # 檢查是否是別名
-    if zone_str in TIMEZONE_ALIASES:
-        timezone_str = TIMEZONE_ALIASES[zone_str]
-    else:
-        timezone_str = zone_str
-    
+    """根據輸入的字符串獲取時區對象，找不到時返回 None"""
+    name = resolve_timezone_name(zone_str)
+    return pytz.timezone(name) if name else None
+
+# 中文數字（用於「三點半」、「十點零五分」等說法）
+_CN_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "兩": 2, "两": 2, "三": 3, "四": 4,
+              "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_CN_NUMBER = "[零〇一二兩两三四五六七八九十]{1,3}"
+
+# 相對日期與時段
+_DAY_OFFSETS = {"前天": -2, "昨天": -1, "今天": 0, "明天": 1, "後天": 2, "后天": 2}
+_PM_PERIODS = {"下午", "傍晚", "晚上", "pm", "p.m."}
+_AM_PERIODS = {"凌晨", "早上", "上午", "am", "a.m."}
+
+# 單一正則表達式涵蓋所有支援的時間寫法：
+#   14:30、14:30:00、2:30 PM、2:30PM、2023-06-10 14:30、14時30分、
+#   下午三點半、上午10點一刻、明天 14:00、晚上8點15分
+_TIME_GRAMMAR = rf"""
+    (?:
+        (?P<day>前天|昨天|今天|明天|後天|后天)
+      | (?P<year>\d{{4}})[-/](?P<month>\d{{1,2}})[-/](?P<mday>\d{{1,2}})
+    )?
+    \s*
+    (?P<period>凌晨|早上|上午|中午|下午|傍晚|晚上)?
+    \s*
+    (?P<hour>\d{{1,2}}|{_CN_NUMBER})
+    (?:
+        [:：](?P<minute>\d{{1,2}})(?:[:：](?P<second>\d{{1,2}}))?
+      | [點点時时](?:(?P<half>半)|(?P<quarter>[一三])刻|(?P<cn_minute>\d{{1,2}}|{_CN_NUMBER})分?)?
+    )
+    (?:\s*(?P<suffix>a\.m\.|p\.m\.|am|pm|上午|下午))?
+"""
+TIME_PATTERN = re.compile(_TIME_GRAMMAR, re.VERBOSE | re.IGNORECASE)
+
+def _cn_to_int(text):
+    """把阿拉伯數字或中文數字（最多到五十九）轉為整數"""
+    if text.isdigit():
+        return int(text)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        return (_CN_DIGITS[tens] if tens else 1) * 10 + (_CN_DIGITS[ones] if ones else 0)
+    value = 0
+    for char in text:
+        value = value * 10 + _CN_DIGITS[char]
+    return value
+
+def _time_from_match(match, now=None):
+    """由 TIME_PATTERN 的比對結果建立 datetime，數值不合理時返回 None"""
+    now = now or datetime.now()
     try:
-        return pytz.timezone(timezone_str)
-    except pytz.exceptions.UnknownTimeZoneError:
-        # 如果找不到時區，嘗試搜索相似的時區
-        for name in pytz.all_timezones:
-            if zone_str in name.lower():
-                return pytz.timezone(name)
-        
-        # 如果還是找不到，返回UTC
-        return pytz.UTC
-
-def parse_time_str(time_str):
-    """解析時間字符串，支持多種格式"""
-    time_str = time_str.strip()
-    
-    # 嘗試解析時間格式
-    formats = [
-        "%H:%M",         # 14:30
-        "%I:%M %p",      # 2:30 PM
-        "%I:%M%p",       # 2:30PM
-        "%I:%M",         # 2:30 (假設是24小時制)
-        "%H:%M:%S",      # 14:30:00
-        "%I:%M:%S %p",   # 2:30:00 PM
-        "%Y-%m-%d %H:%M" # 2023-06-10 14:30
-    ]
-    
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(time_str, fmt)
-            # 如果解析成功，使用今天的日期
-            now = datetime.now()
-            return datetime(now.year, now.month, now.day, dt.hour, dt.minute, dt.second)
-        except ValueError:
-            continue
-    
-    # 如果所有格式都失敗，嘗試使用正則表達式解析
-    hour_minute_pattern = r"(\d{1,2})[:：時](\d{1,2})(?:分|)(?:\s*(上午|下午|am|pm|AM|PM)|)"
-    match = re.search(hour_minute_pattern, time_str)
-    
-    if match:
-        hour = int(match.group(1))
-        minute = int(match.group(2))
-        am_pm = match.group(3).lower() if match.group(3) else None
-        
-        # 處理上午/下午/AM/PM
-        if am_pm in ["下午", "pm"]:
-            if hour < 12:
-                hour += 12
-        elif am_pm in ["上午", "am"]:
-            if hour == 12:
-                hour = 0
-                
-        now = datetime.now()
-        return datetime(now.year, now.month, now.day, hour, minute, 0)
-    
-    # 如果還是無法解析，返回None
-    return None
+        hour = _cn_to_int(match.group("hour"))
+        if match.group("half"):
+            minute = 30
+        elif match.group("quarter"):
+            minute = 15 * _cn_to_int(match.group("quarter"))
+        else:
+            minute = _cn_to_int(match.group("minute") or match.group("cn_minute") or "0")
+        second = int(match.group("second") or 0)
+    except KeyError:
+        # 例如「十十」這類不合法的中文數字
+        return None
+
+    # 處理上午/下午/AM/PM
+    period = (match.group("suffix") or match.group("period") or "").lower()
+    extra_days = 0
+    if period == "晚上" and hour == 12:
+        # 晚上12點是當天結束時的午夜，也就是隔天的 0 點
+        hour = 0
+        extra_days = 1
+    elif period in _PM_PERIODS or (period == "中午" and hour < 11):
+        if hour < 12:
+            hour += 12
+    elif period in _AM_PERIODS and hour == 12:
+        hour = 0
+    if hour > 23 or minute > 59 or second > 59:
+        return None
+
+    try:
+        if match.group("year"):
+            date = datetime(int(match.group("year")), int(match.group("month")), int(match.group("mday")))
+        else:
+            date = datetime(now.year, now.month, now.day) + timedelta(days=_DAY_OFFSETS.get(match.group("day"), 0))
+    except ValueError:
+        return None
+    return date.replace(hour=hour, minute=minute, second=second) + timedelta(days=extra_days)
+
+def parse_time_str(time_str, now=None):
+    """解析時間字符串，支持多種格式；沒有指定日期時使用今天"""
+    match = TIME_PATTERN.fullmatch(time_str.strip())
+    if not match:
+        return None
+    return _time_from_match(match, now)
+
+# 時間部分與 TIME_PATTERN 相同，命令只需比對一次
+CONVERT_COMMAND_PATTERN = re.compile(
+    rf"\#時區轉換\s+(?P<time>{_TIME_GRAMMAR})\s+(?P<source>.+?)\s+(?:to|到|轉換到|轉換為)\s+(?P<target>.+)",
+    re.VERBOSE | re.IGNORECASE
+)
+
+# 目標時區可用逗號或頓號分隔，例如「紐約,倫敦,東京」
+_ZONE_SEPARATOR = re.compile(r"\s*[,，、]\s*")
+
+# 單次換算的時間與時區數量上限
+MAX_CONVERT_TIMES = 50
+MAX_CONVERT_ZONES = 50
+
+def split_zones(zones_str):
+    """把以逗號分隔的時區字串拆成列表"""
+    return [zone for zone in _ZONE_SEPARATOR.split(zones_str.strip()) if zone]
+
+def resolve_zones(zone_strs):
+    """每個時區輸入只解析一次，返回 ([(輸入, 時區)], [找不到的輸入])，重複的輸入只保留一個"""
+    resolved = []
+    unknown = []
+    for zone_str in dict.fromkeys(zone_strs):
+        tz = get_timezone(zone_str)
+        if tz is None:
+            unknown.append(zone_str)
+        else:
+            resolved.append((zone_str, tz))
+    return resolved, unknown
+
+def convert_times(times, source_tz, target_zones):
+    """把多個時間從 source_tz 換算到所有目標時區
+
+    times 為不含時區的 datetime 列表，target_zones 為 resolve_zones 返回的 [(輸入, 時區)]。
+    每個時間只設定一次來源時區，之後直接換算到各目標時區，
+    返回 [(來源時間, [目標時間, ...]), ...]。
+    """
+    results = []
+    for dt in times:
+        source_time = source_tz.localize(dt)
+        results.append((source_time, [source_time.astimezone(tz) for _, tz in target_zones]))
+    return results
 
 def handle_timezone_conversion(text):
     """處理時區轉換命令"""
-    # 命令格式例如: "#時區轉換 14:30 台北 to 紐約"
-    pattern = r"#時區轉換\s+(.+?)\s+(.+?)\s+(?:to|到|轉換到|轉換為)\s+(.+)"
-    match = re.search(pattern, text)
-    
-    if not match:
-        return "🕒 時區轉換格式不正確\n正確格式：#時區轉換 [時間] [原時區] to [目標時區]\n例如：#時區轉換 14:30 台北 to 紐約"
-    
-    time_str = match.group(1)
-    source_zone_str = match.group(2)
-    target_zone_str = match.group(3)
+    # 命令格式例如: "#時區轉換 14:30 台北 to 紐約"、"#時區轉換 14:30 台北 to 紐約,倫敦,東京"
+    match = CONVERT_COMMAND_PATTERN.search(text)
+    if match:
+        time_str = match.group("time")
+        # 「今天」、「明天」以原時區的日期為準，與 /api/convert 相同
+        source_tz = get_timezone(match.group("source"))
+        now = datetime.now(source_tz).replace(tzinfo=None) if source_tz else None
+        dt = _time_from_match(match, now)
+    else:
+        # 時間部分無法解析時，以寬鬆的格式判斷應回覆哪種錯誤訊息
+        match = re.search(r"#時區轉換\s+(.+?)\s+(.+?)\s+(?:to|到|轉換到|轉換為)\s+(.+)", text)
+        if not match:
+            return "🕒 時區轉換格式不正確\n正確格式：#時區轉換 [時間] [原時區] to [目標時區]\n例如：#時區轉換 14:30 台北 to 紐約,倫敦,東京"
+        time_str = match.group(1)
+        dt = None
     
     # 解析時間
-    dt = parse_time_str(time_str)
     if not dt:
-        return f"❌ 無法解析時間: {time_str}\n請使用格式如 14:30 或 2:30 PM"
+        return f"❌ 無法解析時間: {time_str}\n請使用格式如 14:30、2:30 PM 或 下午三點半"
     
-    # 獲取時區
-    source_tz = get_timezone(source_zone_str)
-    target_tz = get_timezone(target_zone_str)
+    source_zone_str = match.group("source")
+    target_zone_strs = split_zones(match.group("target"))[:MAX_CONVERT_ZONES]
     
-    # 設置源時區
-    source_time = source_tz.localize(dt)
+    # 獲取時區
+    target_zones, unknown = resolve_zones(target_zone_strs)
+    if source_tz is None:
+        unknown.insert(0, source_zone_str)
+    if unknown:
+        return f"❌ 找不到時區: {'、'.join(unknown)}\n請使用城市或時區名稱，例如 台北、紐約、Europe/London"
     
-    # 轉換到目標時區
-    target_time = source_time.astimezone(target_tz)
+    # 設置源時區並轉換到所有目標時區
+    [(source_time, target_times)] = convert_times([dt], source_tz, target_zones)
     
     # 格式化輸出
     source_time_str = source_time.strftime("%Y-%m-%d %H:%M")
-    target_time_str = target_time.strftime("%Y-%m-%d %H:%M")
-    
-    result = (
-        f"🌐 時區轉換結果：\n\n"
-        f"🕒 {source_zone_str} ({source_tz}): {source_time_str}\n"
-        f"🕒 {target_zone_str} ({target_tz}): {target_time_str}\n\n"
-        f"時差: {_get_timezone_diff(source_tz, target_tz)}"
-    )
+    if len(target_zones) == 1:
+        [(target_zone_str, target_tz)] = target_zones
+        [target_time] = target_times
+        return (
+            f"🌐 時區轉換結果：\n\n"
+            f"🕒 {source_zone_str} ({source_tz}): {source_time_str}\n"
+            f"🕒 {target_zone_str} ({target_tz}): {target_time.strftime('%Y-%m-%d %H:%M')}\n\n"
+            f"時差: {_format_offset_diff(source_time, target_time)}"
+        )
     
-    return result
-
-def _get_timezone_diff(tz1, tz2):
-    """計算兩個時區的時差"""
-    now = datetime.now(pytz.UTC)
-    tz1_offset = now.astimezone(tz1).utcoffset().total_seconds() / 3600
-    tz2_offset = now.astimezone(tz2).utcoffset().total_seconds() / 3600
-    diff = tz2_offset - tz1_offset
+    lines = [f"🌐 時區轉換結果：\n\n🕒 {source_zone_str} ({source_tz}): {source_time_str}"]
+    for (target_zone_str, target_tz), target_time in zip(target_zones, target_times):
+        lines.append(
+            f"🕒 {target_zone_str} ({target_tz}): {target_time.strftime('%Y-%m-%d %H:%M')}"
+            f"（{_format_offset_diff(source_time, target_time)}）"
+        )
+    return "\n".join(lines)
+
+@convert_bp.route('/api/convert', methods=['POST'])
+def convert_api():
+    """批次時區換算
+
+    請求內容例如 {"times": ["14:30", "明天 9:00"], "from": "台北", "to": ["紐約", "倫敦"]}，
+    "time" 可代替 "times"，"to" 也可以是以逗號分隔的字串。
+    """
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "請求內容必須是 JSON 物件"}), 400
+    times = data.get("times", data.get("time"))
+    if isinstance(times, str):
+        times = [times]
+    targets = data.get("to")
+    if isinstance(targets, str):
+        targets = split_zones(targets)
+    source_zone_str = data.get("from")
+
+    if not times or not targets or not isinstance(source_zone_str, str):
+        return jsonify({"error": "需要 times、from 與 to 欄位"}), 400
+    if not isinstance(times, list) or not isinstance(targets, list) or \
+            not all(isinstance(value, str) for value in times + targets):
+        return jsonify({"error": "times 與 to 必須是字串或字串列表"}), 400
+    if len(times) > MAX_CONVERT_TIMES or len(targets) > MAX_CONVERT_ZONES:
+        return jsonify({"error": f"每次最多 {MAX_CONVERT_TIMES} 個時間、{MAX_CONVERT_ZONES} 個時區"}), 400
+
+    source_tz = get_timezone(source_zone_str)
+    target_zones, unknown = resolve_zones(targets)
+    if source_tz is None:
+        unknown.insert(0, source_zone_str)
+    if unknown:
+        return jsonify({"error": "找不到時區", "unknown_zones": unknown}), 400
+
+    now = datetime.now(source_tz).replace(tzinfo=None)
+    parsed = [(time_str, parse_time_str(time_str, now)) for time_str in times]
+    conversions = iter(convert_times([dt for _, dt in parsed if dt], source_tz, target_zones))
+
+    results = []
+    for time_str, dt in parsed:
+        if dt is None:
+            results.append({"time": time_str, "error": "無法解析時間"})
+            continue
+        source_time, target_times = next(conversions)
+        results.append({
+            "time": time_str,
+            "source_time": source_time.isoformat(),
+            "conversions": [
+                {
+                    "zone": zone_str,
+                    "timezone": str(tz),
+                    "time": target_time.isoformat(),
+                    "diff_hours": (target_time.utcoffset() - source_time.utcoffset()).total_seconds() / 3600
+                }
+                for (zone_str, tz), target_time in zip(target_zones, target_times)
+            ]
+        })
+
+    return jsonify({
+        "from": {"zone": source_zone_str, "timezone": str(source_tz)},
+        "results": results
+    })
+
+def _format_offset_diff(source_time, target_time):
+    """以已換算好的兩個時間的 UTC 偏移計算時差，不必再重新查詢時區"""
+    diff = (target_time.utcoffset() - source_time.utcoffset()).total_seconds() / 3600
     
     if diff == 0:
         return "相同時區"
@@ -4,6 +4,9 @@ import logging
 # 創建藍圖
 map_bp = Blueprint('map', __name__)
 
+# 主題地圖命令，沒有 # 開頭
+COMMAND_PREFIXES = ("熱力學地圖", "記憶術地圖")
+
 logger = logging.getLogger(__name__)
 
 # 主題地圖數據 (示例)
@@ -33,7 +36,7 @@ def handle_map_command(text):
         response_text = f"🗺️ {topic}學習地圖\n"
         response_text += "核心知識點:\n" + ", ".join(MAPS[topic]["topics"])
         response_text += "\n學習資源:\n" + ", ".join(MAPS[topic]["resources"])
-        return response_text # 只返回文本，由 route_message 處理發送
+        return response_text # 只返回文本，由 ReplyPipeline 處理發送
     else:
         available_maps = "、".join(MAPS.keys())
         return f"抱歉，目前沒有「{topic}」的主題地圖。\n可用的地圖有：{available_maps}"
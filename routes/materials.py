@@ -1,9 +1,15 @@
 import os
+import gzip
 import json
-import pandas as pd
+import time
+import hashlib
+import threading
 import logging
+from datetime import datetime
 import re  # 導入正則表達式模組
-from flask import jsonify, Blueprint
+from flask import jsonify, Blueprint, request, Response
+from utils.search_index import InvertedIndex
+from utils.text_utils import normalize_text
 
 # 設定日誌
 logging.basicConfig(
@@ -15,10 +21,25 @@ logger = logging.getLogger(__name__)
 # 創建藍圖
 materials_bp = Blueprint('materials', __name__)
 
+# 學習材料的主題列表、推薦與詳細資訊命令
+COMMAND_PREFIXES = ("#材料", "#學習材料", "#推薦材料", "#推薦", "#詳細")
+
 # 學習材料文件路徑
 MATERIALS_FILE = 'learning_materials.xlsx'
 MATERIALS_CACHE_FILE = 'materials_cache.json'
 
+# 檢查試算表是否更新的最短間隔（秒）
+MATERIALS_CHECK_INTERVAL = float(os.environ.get('MATERIALS_CHECK_INTERVAL', '5'))
+
+# 材料 API 回應允許瀏覽器快取的秒數，過期後以 ETag 重新驗證
+MATERIALS_HTTP_MAX_AGE = int(os.environ.get('MATERIALS_HTTP_MAX_AGE', '60'))
+
+# 小於此大小的回應不壓縮
+GZIP_MIN_SIZE = 1024
+
+# 分頁查詢單頁的筆數上限
+MAX_PAGE_SIZE = 200
+
 # 材料類型與對應的圖標
 MATERIAL_ICONS = {
     "文章": "fa-file-text",
@@ -31,8 +52,77 @@ MATERIAL_ICONS = {
     "項目": "fa-project-diagram"
 }
 
-def load_materials_from_excel():
-    """從Excel讀取學習材料數據，使用快取機制"""
+# 主題與推薦欄位
+TOPIC_COLUMN = '主題'
+RECOMMENDED_COLUMN = '推薦'
+DEFAULT_TOPIC = '未分類'
+
+# 全文搜索涵蓋的欄位（另外也會比對主題名稱）
+SEARCH_FIELDS = ['標題', '描述']
+
+# 視為「推薦」的欄位值（比對前會轉為小寫字串）
+RECOMMENDED_VALUES = ['true', 'yes', 'y', '是', '1', '1.0']
+
+def _normalize_column(series):
+    """把整欄轉換為 JSON 可序列化的 Python 值：NaN -> None、日期 -> ISO 日期字串"""
+    import pandas as pd
+
+    missing = series.isna()
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.dt.strftime('%Y-%m-%d')
+    elif pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        # astype(object) 會把 numpy 數值轉成 Python 的 int / float / bool
+        values = series.astype(object)
+    else:
+        # 純文字欄位直接使用，混合型別的欄位才逐格轉換
+        if pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+            values = series
+        else:
+            values = series.map(_normalize_value)
+    return values.astype(object).where(~missing, None)
+
+def _normalize_value(value):
+    # pd.Timestamp 是 datetime 的子類別，不必為了型別檢查載入 pandas
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+def _is_recommended(value):
+    """判斷推薦欄位的值是否為肯定值（與 _recommended_flags 使用相同規則）"""
+    return value is not None and str(value).strip().lower() in RECOMMENDED_VALUES
+
+def _recommended_flags(series):
+    """把推薦欄位轉為布林值"""
+    return series.astype(str).str.strip().str.lower().isin(RECOMMENDED_VALUES) & series.notna()
+
+def read_materials_frame(path=MATERIALS_FILE):
+    """讀取材料試算表（所有欄位都會出現在材料資料中）"""
+    # pandas 只在試算表更新、需要重新讀取時才載入，不拖慢冷啟動
+    import pandas as pd
+
+    return pd.read_excel(path)
+
+def group_materials(df):
+    """把材料 DataFrame 整欄正規化後，依主題分組為 {主題: [材料, ...]}"""
+    import pandas as pd
+
+    normalized = pd.DataFrame({col: _normalize_column(df[col]) for col in df.columns}, index=df.index)
+    if RECOMMENDED_COLUMN in df.columns:
+        normalized[RECOMMENDED_COLUMN] = _recommended_flags(df[RECOMMENDED_COLUMN]).astype(object)
+
+    records = normalized.to_dict('records')
+    if TOPIC_COLUMN not in df.columns:
+        return {DEFAULT_TOPIC: records} if records else {}
+
+    # 只做一次 groupby，依主題第一次出現的順序排列
+    topics = df[TOPIC_COLUMN].astype(object).where(df[TOPIC_COLUMN].notna(), DEFAULT_TOPIC).astype(str)
+    groups = sorted(topics.groupby(topics, sort=False).indices.items(), key=lambda item: item[1][0])
+    return {topic: [records[i] for i in positions] for topic, positions in groups}
+
+def _read_materials_file():
+    """從Excel讀取學習材料數據，試算表未更新時使用 JSON 快取檔案"""
     try:
         # 檢查是否存在快取文件
         if os.path.exists(MATERIALS_CACHE_FILE):
@@ -45,93 +135,336 @@ def load_materials_from_excel():
                 with open(MATERIALS_CACHE_FILE, 'r', encoding='utf-8') as f:
                     return json.load(f)
 
-        # 讀取Excel文件
-        df = pd.read_excel(MATERIALS_FILE)
-
-        # 將DataFrame轉換為字典列表
-        materials = []
-        for _, row in df.iterrows():
-            material = {col: row[col] for col in df.columns}
-            # 確保數值是JSON可序列化的
-            for key, value in material.items():
-                if pd.isna(value):
-                    material[key] = None
-                elif isinstance(value, pd.Timestamp):
-                    material[key] = value.strftime('%Y-%m-%d')
-                elif isinstance(value, (int, float)): # 確保數字類型正確
-                    material[key] = value
-                else:
-                    material[key] = str(value) # 其他類型轉換為字符串
-            materials.append(material)
-
-        # 按主題分組材料
-        materials_by_topic = {}
-        for material in materials:
-            topic = material.get('主題', '未分類')
-            if topic not in materials_by_topic:
-                materials_by_topic[topic] = []
-            materials_by_topic[topic].append(material)
+        # 讀取Excel文件並整欄轉換
+        materials_by_topic = group_materials(read_materials_frame())
 
         # 保存到快取文件
         with open(MATERIALS_CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(materials_by_topic, f, ensure_ascii=False, indent=2)
+            json.dump(materials_by_topic, f, ensure_ascii=False)
 
         return materials_by_topic
 
     except Exception as e:
         logger.error(f"讀取學習材料時出錯: {e}")
-        return {}
+        return None
+
+class MaterialsSnapshot:
+    """某一版本的學習材料，建立後不再修改，可在多個線程間共用"""
+
+    def __init__(self, materials_by_topic, mtime=None):
+        self.materials = materials_by_topic
+        self.mtime = mtime
+        # 以內容雜湊作為版本，試算表內容不變時 ETag 也不變
+        self.version = hashlib.sha1(
+            json.dumps(materials_by_topic, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        # 各端點已序列化（含 gzip 壓縮）的回應內容
+        self._responses = {}
+        self._responses_lock = threading.Lock()
+        # 搜索索引的文件編號對應 self.entries 的位置
+        self.entries = [
+            (topic, material)
+            for topic, topic_materials in materials_by_topic.items()
+            for material in topic_materials
+        ]
+        # 衍生資料在載入時計算一次，API 與聊天命令共用
+        self.topics = list(materials_by_topic)
+        self.topic_counts = {topic: len(topic_materials) for topic, topic_materials in materials_by_topic.items()}
+        self.recommended = [
+            (topic, material) for topic, material in self.entries
+            if _is_recommended(material.get(RECOMMENDED_COLUMN))
+        ]
+        self.recommended_materials = [material for _, material in self.recommended]
+        self.all_materials = [material for _, material in self.entries]
+        # 建立索引很耗時，由 build_search_index() 在背景線程建立；建立完成前搜索改用逐筆比對
+        self.search_index = None
+        self._index_lock = threading.Lock()
+        self._scan_texts = None
+
+    @staticmethod
+    def _search_text(topic, material):
+        return ' '.join([str(material.get(field) or '') for field in SEARCH_FIELDS] + [topic])
+
+    def build_search_index(self):
+        """建立搜索索引並返回，已建立時直接返回"""
+        with self._index_lock:
+            if self.search_index is None:
+                start = time.monotonic()
+                self.search_index = InvertedIndex(
+                    self._search_text(topic, material) for topic, material in self.entries
+                )
+                logger.info(f"學習材料搜索索引已建立，共 {len(self.entries)} 筆，耗時 {time.monotonic() - start:.1f} 秒")
+        return self.search_index
+
+    def get_material(self, topic, index):
+        """依主題與編號（從 0 開始）取得材料，不存在時返回 None"""
+        topic_materials = self.materials.get(topic)
+        if topic_materials is None or not 0 <= index < len(topic_materials):
+            return None
+        return topic_materials[index]
+
+    def etag(self, key):
+        """由快照版本與端點 key 組成的 ETag"""
+        return f"{self.version[:16]}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+
+    def serialized(self, key, build, cache=True):
+        """返回 (ETag, JSON 內容, gzip 壓縮後的內容)
+
+        cache 為 True 時每個 key 在同一版本只序列化一次；
+        分頁等組合很多的回應不保留內容，只共用以版本計算的 ETag。
+        """
+        entry = self._responses.get(key)
+        if entry is None:
+            body = json.dumps(build(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            compressed = gzip.compress(body) if cache and len(body) >= GZIP_MIN_SIZE else None
+            entry = (self.etag(key), body, compressed)
+            if cache:
+                with self._responses_lock:
+                    entry = self._responses.setdefault(key, entry)
+        return entry
+
+    def _scan(self, keyword, limit=None, offset=0):
+        """索引建立完成前的搜索：逐筆比對標題、描述與主題，依材料順序排列"""
+        words = normalize_text(keyword).split()
+        if not words:
+            return 0, []
+        if self._scan_texts is None:
+            self._scan_texts = [normalize_text(self._search_text(topic, material)) for topic, material in self.entries]
+        matches = [
+            self.entries[i][1] for i, text in enumerate(self._scan_texts)
+            if all(word in text for word in words)
+        ]
+        end = None if limit is None else offset + max(0, limit)
+        return len(matches), matches[max(0, offset):end]
+
+    def search(self, keyword, limit=None, offset=0):
+        """返回 (符合的材料總數, 依相關程度排列的材料)"""
+        index = self.search_index
+        if index is None:
+            return self._scan(keyword, limit=limit, offset=offset)
+        total, hits = index.search(keyword, limit=limit, offset=offset)
+        return total, [self.entries[doc_id][1] for doc_id, _ in hits]
+
+class MaterialsCache:
+    """常駐記憶體的學習材料快取
+
+    每隔 check_interval 秒最多檢查一次試算表的修改時間，
+    檔案更新時在背景線程重新載入、建立搜索索引後整份替換快照；
+    重新載入期間讀取者繼續使用舊的快照，不會被阻塞。
+    第一次載入時沒有舊快照可用，先返回尚未建立索引的快照，索引在背景線程建立。
+    """
+
+    def __init__(self, loader, path, check_interval=MATERIALS_CHECK_INTERVAL):
+        self.loader = loader
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._reloading = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _mtime(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def _load(self, mtime, build_index):
+        """讀取材料並替換快照，讀取失敗時保留舊的快照
+
+        build_index 為 True 時先建立搜索索引再替換（背景重新載入）；
+        否則在背景線程建立索引，讓第一次請求不必等待。
+        """
+        materials = self.loader()
+        snapshot = None
+        if materials is not None:
+            snapshot = MaterialsSnapshot(materials, mtime)
+            if build_index:
+                snapshot.build_search_index()
+        with self._lock:
+            if snapshot is not None:
+                self._snapshot = snapshot
+                logger.info(f"學習材料已載入，共 {len(materials)} 個主題")
+            elif self._snapshot is None:
+                # 沒有舊資料時先返回空資料，下次檢查再重試
+                self._snapshot = snapshot = MaterialsSnapshot({}, None)
+            current = self._snapshot
+        if snapshot is not None and snapshot.search_index is None:
+            threading.Thread(
+                target=snapshot.build_search_index, name="materials-index", daemon=True
+            ).start()
+        return current
+
+    def _background_reload(self, mtime):
+        try:
+            with self._load_lock:
+                self._load(mtime, build_index=True)
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def get(self):
+        """返回目前的材料快照"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            # 第一次載入時沒有舊資料可用，其他線程等待同一次載入
+            with self._load_lock:
+                if self._snapshot is None:
+                    self._checked_at = time.monotonic()
+                    return self._load(self._mtime(), build_index=False)
+                return self._snapshot
+
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            if self._reloading or now - self._checked_at < self.check_interval:
+                return self._snapshot
+            self._checked_at = now
+            mtime = self._mtime()
+            if mtime == self._snapshot.mtime:
+                return self._snapshot
+            self._reloading = True
+
+        threading.Thread(
+            target=self._background_reload, args=(mtime,), name="materials-reload", daemon=True
+        ).start()
+        return snapshot
+
+materials_cache = MaterialsCache(_read_materials_file, MATERIALS_FILE)
+
+def get_materials_snapshot():
+    """返回目前的學習材料快照"""
+    return materials_cache.get()
+
+def load_materials_from_excel():
+    """返回依主題分組的學習材料（來自記憶體快照，請勿修改）"""
+    return get_materials_snapshot().materials
+
+def _cached_json_response(snapshot, key, build, cache=True):
+    """以快照中預先序列化的內容回應，支援 If-None-Match 與 gzip"""
+    etag = snapshot.etag(key)
+    if request.if_none_match.contains_weak(etag):
+        # 內容未變，不必序列化；304 沒有內容，不帶 Flask 預設的 text/html
+        response = Response(status=304)
+        del response.headers['Content-Type']
+    else:
+        etag, body, compressed = snapshot.serialized(key, build, cache=cache)
+        if compressed is not None and 'gzip' in request.accept_encodings:
+            response = Response(compressed, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(body, mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = f'public, max-age={MATERIALS_HTTP_MAX_AGE}'
+    response.vary.add('Accept-Encoding')
+    return response
+
+class InvalidPageArgs(ValueError):
+    """limit / offset 不是非負整數"""
+
+@materials_bp.errorhandler(InvalidPageArgs)
+def _invalid_page_args(error):
+    return jsonify({"error": str(error)}), 400
+
+def _int_arg(name, default):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise InvalidPageArgs(f"{name} 必須是非負整數")
+    if number < 0:
+        raise InvalidPageArgs(f"{name} 必須是非負整數")
+    return number
+
+def _page_args(required=False):
+    """讀取 limit / offset / fields 參數，limit 預設且最多為 MAX_PAGE_SIZE
+
+    三者都沒有且 required 為 False 時返回 None（返回完整內容）；
+    limit 或 offset 不是非負整數時拋出 InvalidPageArgs（回應 400）。
+    """
+    if not required and not any(name in request.args for name in ('limit', 'offset', 'fields')):
+        return None
+    limit = min(_int_arg('limit', MAX_PAGE_SIZE), MAX_PAGE_SIZE)
+    offset = _int_arg('offset', 0)
+    fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    return limit, offset, fields
+
+def _project(materials, fields):
+    """只保留指定的欄位，fields 為空時返回完整材料"""
+    if not fields:
+        return list(materials)
+    return [{field: material[field] for field in fields if field in material} for material in materials]
+
+def _materials_list_response(snapshot, key, materials, page):
+    """回應材料列表；有分頁參數時只回應該頁，總數放在 X-Total-Count 標頭"""
+    if page is None:
+        return _cached_json_response(snapshot, key, lambda: materials)
+    limit, offset, fields = page
+    end = offset + limit
+    page_key = f"{key}?limit={limit}&offset={offset}&fields={','.join(fields)}"
+    response = _cached_json_response(
+        snapshot, page_key, lambda: _project(materials[offset:end], fields), cache=False
+    )
+    response.headers['X-Total-Count'] = str(len(materials))
+    return response
 
 @materials_bp.route('/api/materials', methods=['GET'])
 def get_materials():
-    """獲取所有學習材料"""
-    materials = load_materials_from_excel()
-    return jsonify(materials)
+    """獲取所有學習材料；加上 limit / offset / fields 時改為分頁返回材料列表"""
+    snapshot = get_materials_snapshot()
+    page = _page_args()
+    if page is None:
+        return _cached_json_response(snapshot, 'materials', lambda: snapshot.materials)
+    return _materials_list_response(snapshot, 'materials', snapshot.all_materials, page)
+
+@materials_bp.route('/api/materials/summary', methods=['GET'])
+def get_materials_summary():
+    """獲取各主題的材料數量"""
+    snapshot = get_materials_snapshot()
+    return _cached_json_response(snapshot, 'summary', lambda: {
+        "total": len(snapshot.all_materials),
+        "recommended": len(snapshot.recommended),
+        "topics": [
+            {"topic": topic, "count": count} for topic, count in snapshot.topic_counts.items()
+        ]
+    })
 
 @materials_bp.route('/api/materials/topics', methods=['GET'])
 def get_topics():
     """獲取所有主題"""
-    materials = load_materials_from_excel()
-    topics = list(materials.keys())
-    return jsonify(topics)
+    snapshot = get_materials_snapshot()
+    return _cached_json_response(snapshot, 'topics', lambda: snapshot.topics)
 
 @materials_bp.route('/api/materials/topic/<topic>', methods=['GET'])
 def get_materials_by_topic(topic):
-    """獲取特定主題的材料"""
-    materials = load_materials_from_excel()
-    topic_materials = materials.get(topic, [])
-    return jsonify(topic_materials)
+    """獲取特定主題的材料，可用 limit / offset / fields 分頁"""
+    snapshot = get_materials_snapshot()
+    if topic not in snapshot.materials:
+        # 不存在的主題不快取，避免任意主題名稱佔用記憶體
+        response = jsonify([])
+        response.headers['X-Total-Count'] = '0'
+        return response
+    return _materials_list_response(snapshot, f'topic:{topic}', snapshot.materials[topic], _page_args())
 
 @materials_bp.route('/api/materials/recommended', methods=['GET'])
 def get_recommended_materials():
-    """獲取推薦的學習材料"""
-    materials = load_materials_from_excel()
-    recommended = []
-    
-    # 遍歷每個主題，獲取其中的推薦材料
-    for topic, topic_materials in materials.items():
-        for material in topic_materials:
-            if material.get('推薦', False):
-                recommended.append(material)
-    
-    return jsonify(recommended)
+    """獲取推薦的學習材料，可用 limit / offset / fields 分頁"""
+    snapshot = get_materials_snapshot()
+    return _materials_list_response(snapshot, 'recommended', snapshot.recommended_materials, _page_args())
 
 @materials_bp.route('/api/materials/search/<keyword>', methods=['GET'])
 def search_materials(keyword):
-    """搜索學習材料"""
-    materials = load_materials_from_excel()
-    results = []
-    
-    # 搜索所有材料
-    for topic, topic_materials in materials.items():
-        for material in topic_materials:
-            # 檢查標題、描述和主題是否包含關鍵詞
-            title = str(material.get('標題', '')).lower()
-            description = str(material.get('描述', '')).lower()
-            if keyword.lower() in title or keyword.lower() in description or keyword.lower() in topic.lower():
-                results.append(material)
-    
-    return jsonify(results)
+    """搜索學習材料，可用 limit / offset 分頁（每頁最多 MAX_PAGE_SIZE 筆）、fields 指定欄位，符合的總數放在 X-Total-Count 標頭"""
+    limit, offset, fields = _page_args(required=True)
+    total, results = get_materials_snapshot().search(keyword, limit=limit, offset=offset)
+    response = jsonify(_project(results, fields))
+    response.headers['X-Total-Count'] = str(total)
+    return response
 
 # 獲取材料的圖標
 def get_material_icon(material_type):
@@ -141,11 +474,12 @@ def get_material_icon(material_type):
 # LINE機器人處理函數
 def handle_materials_command(text):
     """處理與學習材料相關的命令"""
-    materials = load_materials_from_excel() # 先載入資料
+    snapshot = get_materials_snapshot() # 先載入資料
+    materials = snapshot.materials
 
     # 處理查詢所有材料的命令
     if text == "#材料" or text == "#學習材料":
-        topics = list(materials.keys())
+        topics = snapshot.topics
         if not topics:
             return "📚 目前沒有可用的學習材料。"
 
@@ -180,13 +514,7 @@ def handle_materials_command(text):
 
     # 處理推薦材料的命令
     if text == "#推薦材料" or text == "#推薦":
-        recommended = []
-        for topic, topic_materials in materials.items():
-            for material in topic_materials:
-                # 檢查'推薦'欄位是否存在且為True或'是'等肯定值
-                recommend_flag = material.get('推薦')
-                if recommend_flag and str(recommend_flag).lower() in ['true', 'yes', '是', '1']:
-                     recommended.append((topic, material))
+        recommended = snapshot.recommended
 
         if recommended:
             response = "🌟 推薦學習材料：\\n\\n"
@@ -210,10 +538,8 @@ def handle_materials_command(text):
             return "❌ 材料編號格式錯誤，請輸入數字。"
 
         if topic in materials:
-            topic_materials = materials[topic]
-            if 0 <= material_index < len(topic_materials):
-                material = topic_materials[material_index]
-
+            material = snapshot.get_material(topic, material_index)
+            if material is not None:
                 # 構建詳細資訊回應
                 title = material.get('標題', 'N/A')
                 material_type = material.get('類型', 'N/A')
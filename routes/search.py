@@ -1,8 +1,14 @@
+import os
 import re
+import time
 import logging
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from flask import Blueprint
 from linebot.models import TextSendMessage
+from utils import http_client
+from utils.http_client import HTTP_CONNECT_TIMEOUT
+from utils.lookup_cache import LookupCache
 
 # 設定日誌
 logging.basicConfig(
@@ -14,6 +20,36 @@ logger = logging.getLogger(__name__)
 # 創建藍圖
 search_bp = Blueprint('search', __name__)
 
+# 查詢萌典與維基百科的命令，兩種寫法都接受
+COMMAND_PREFIXES = ("#搜尋", "#搜索")
+
+# 查詢結果快取：找到的結果保留一天，找不到的結果保留一小時
+SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', '512'))
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', '86400'))
+SEARCH_CACHE_NEGATIVE_TTL = int(os.environ.get('SEARCH_CACHE_NEGATIVE_TTL', '3600'))
+SEARCH_CACHE_FILE = os.environ.get('SEARCH_CACHE_FILE', 'search_cache.db')
+
+search_cache = LookupCache(
+    max_entries=SEARCH_CACHE_SIZE,
+    ttl=SEARCH_CACHE_TTL,
+    negative_ttl=SEARCH_CACHE_NEGATIVE_TTL,
+    path=SEARCH_CACHE_FILE or None
+)
+
+# 各來源同時查詢，整體最多等待 SEARCH_DEADLINE 秒；須小於回覆時限 REPLY_DEADLINE（預設 5 秒），
+# 留時間格式化與送出回覆
+SEARCH_DEADLINE = float(os.environ.get('SEARCH_DEADLINE', '3'))
+SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', '4'))
+
+search_executor = ThreadPoolExecutor(max_workers=max(1, SEARCH_WORKERS), thread_name_prefix="search")
+
+# 查詢使用共用的用戶端，但不重試、讀取逾時等於 SEARCH_DEADLINE，
+# 超過時限後仍在背景進行的查詢最多再佔用線程 (連線 + 讀取) 逾時的時間
+SEARCH_HTTP_TIMEOUT = (min(HTTP_CONNECT_TIMEOUT, SEARCH_DEADLINE), SEARCH_DEADLINE)
+
+# 進行中（含排隊）的查詢數上限，線程都被慢查詢佔住時新的查詢直接略過，不在佇列中堆積
+_search_slots = threading.BoundedSemaphore(max(1, SEARCH_WORKERS))
+
 # 定義搜索源
 SEARCH_SOURCES = {
     "wikipedia": {
@@ -63,8 +99,8 @@ def extract_moedict_definition(data):
         return "\n\n".join(definitions)
     return None
 
-def search_wikipedia(query, lang="zh"):
-    """使用Wikipedia API搜索關鍵詞"""
+def _fetch_wikipedia(query):
+    """查詢維基百科，找不到時返回 None，連線或格式錯誤時拋出例外"""
     source = SEARCH_SOURCES["wikipedia"]
     api_url = source["api_url"]
     params = source["params"].copy()
@@ -72,68 +108,110 @@ def search_wikipedia(query, lang="zh"):
     # 添加查詢詞
     params["titles"] = query
     
-    try:
-        response = requests.get(api_url, params=params)
-        data = response.json()
+    response = http_client.get(api_url, params=params, timeout=SEARCH_HTTP_TIMEOUT, retries=0)
+    response.raise_for_status()
+    data = response.json()
+    
+    # 提取頁面內容
+    pages = data["query"]["pages"]
+    for page_id in pages:
+        page = pages[page_id]
         
-        # 提取頁面內容
-        pages = data["query"]["pages"]
-        for page_id in pages:
-            page = pages[page_id]
+        # 檢查是否找到內容
+        if "extract" in page and page["extract"]:
+            # 摘要可能很長，僅返回前200個字符，並確保完整句子
+            extract = page["extract"]
+            if len(extract) > 200:
+                sentences = re.split(r'[。！？.!?]', extract)
+                short_extract = ""
+                for sentence in sentences:
+                    if len(short_extract + sentence) < 200:
+                        short_extract += sentence + "。"
+                    else:
+                        break
+                extract = short_extract
             
-            # 檢查是否找到內容
-            if "extract" in page and page["extract"]:
-                # 摘要可能很長，僅返回前200個字符，並確保完整句子
-                extract = page["extract"]
-                if len(extract) > 200:
-                    sentences = re.split(r'[。！？.!?]', extract)
-                    short_extract = ""
-                    for sentence in sentences:
-                        if len(short_extract + sentence) < 200:
-                            short_extract += sentence + "。"
-                        else:
-                            break
-                    extract = short_extract
-                
-                return {
-                    "title": page.get("title", query),
-                    "extract": extract,
-                    "url": f"https://zh.wikipedia.org/wiki/{page.get('title', query).replace(' ', '_')}"
-                }
-            elif "missing" in page:
-                return None
-        
-        return None
-    except Exception as e:
-        logger.error(f"維基百科搜索錯誤: {e}")
-        return None
+            return {
+                "title": page.get("title", query),
+                "extract": extract,
+                "url": f"https://zh.wikipedia.org/wiki/{page.get('title', query).replace(' ', '_')}"
+            }
+        elif "missing" in page:
+            return None
+    
+    return None
 
-def search_moedict(query):
-    """使用萌典API搜尋中文詞彙定義"""
+def search_wikipedia(query, lang="zh"):
+    """使用Wikipedia API搜索關鍵詞（結果會快取）"""
+    return search_cache.get_or_fetch("wikipedia", query, _fetch_wikipedia)
+
+def _fetch_moedict(query):
+    """查詢萌典，找不到時返回 None，連線或伺服器錯誤時拋出例外"""
     source = SEARCH_SOURCES["dictionary"]
     api_url = source["api_url"] + query
     
-    try:
-        response = requests.get(api_url)
-        
-        # 檢查是否成功
-        if response.status_code == 200:
-            data = response.json()
-            
-            # 使用提取函數獲取定義
-            definition = source["extract_func"](data)
-            
-            if definition:
-                return {
-                    "title": query,
-                    "extract": definition,
-                    "url": f"https://www.moedict.tw/#{query}"
-                }
-        
-        return None
-    except Exception as e:
-        logger.error(f"萌典搜索錯誤: {e}")
+    response = http_client.get(api_url, timeout=SEARCH_HTTP_TIMEOUT, retries=0)
+    
+    # 萌典找不到詞彙時回應 404
+    if response.status_code == 404:
         return None
+    response.raise_for_status()
+    data = response.json()
+    
+    # 使用提取函數獲取定義
+    definition = source["extract_func"](data)
+    
+    if definition:
+        return {
+            "title": query,
+            "extract": definition,
+            "url": f"https://www.moedict.tw/#{query}"
+        }
+    
+    return None
+
+def search_moedict(query):
+    """使用萌典API搜尋中文詞彙定義（結果會快取）"""
+    return search_cache.get_or_fetch("dictionary", query, _fetch_moedict)
+
+def search_sources(keyword, deadline=SEARCH_DEADLINE):
+    """同時查詢萌典（中文詞彙）與維基百科，返回 (來源, 結果)
+
+    依優先順序取結果：萌典有結果就直接返回，沒有才使用維基百科的結果。
+    超過 deadline 秒仍未完成的查詢會被略過（在背景完成後仍會寫入快取）；
+    所有查詢線程都在忙時不再排入新的查詢。
+    """
+    # 先嘗試用萌典搜索（如果是中文詞彙），然後是維基百科
+    source_keys = ["wikipedia"]
+    if any('\u4e00' <= char <= '\u9fff' for char in keyword):
+        source_keys.insert(0, "dictionary")
+
+    search_functions = {"dictionary": search_moedict, "wikipedia": search_wikipedia}
+    futures = {}
+    for key in source_keys:
+        if not _search_slots.acquire(blocking=False):
+            logger.warning(f"查詢線程皆忙碌，略過{SEARCH_SOURCES[key]['name']}查詢")
+            continue
+        future = search_executor.submit(search_functions[key], keyword)
+        future.add_done_callback(lambda _: _search_slots.release())
+        futures[key] = future
+    end = time.monotonic() + deadline
+    try:
+        for key in source_keys:
+            if key not in futures:
+                continue
+            try:
+                result = futures[key].result(timeout=max(0, end - time.monotonic()))
+            except FutureTimeoutError:
+                logger.warning(f"{SEARCH_SOURCES[key]['name']}查詢超過 {deadline} 秒，略過")
+                continue
+            if result:
+                return key, result
+        return None, None
+    finally:
+        # 尚未開始的查詢直接取消，已在進行中的查詢結果不再等待
+        for future in futures.values():
+            future.cancel()
 
 def handle_search_command(text):
     """處理搜索命令"""
@@ -150,16 +228,9 @@ def handle_search_command(text):
     if not keyword:
         return "🔍 請提供要搜尋的關鍵詞，例如: #搜尋 量子力學"
     
-    # 先嘗試用萌典搜索（如果是中文詞彙）
-    if any('\u4e00' <= char <= '\u9fff' for char in keyword):
-        result = search_moedict(keyword)
-        if result:
-            return format_search_result(result, "dictionary")
-    
-    # 然後嘗試用維基百科搜索
-    result = search_wikipedia(keyword)
+    source_key, result = search_sources(keyword)
     if result:
-        return format_search_result(result, "wikipedia")
+        return format_search_result(result, source_key)
     
     # 如果都沒找到結果
     return f"🔍 抱歉，找不到關於「{keyword}」的資訊。"
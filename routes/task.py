@@ -4,6 +4,9 @@ import logging
 # 創建藍圖
 task_bp = Blueprint('task', __name__)
 
+# 今天任務與打卡命令
+COMMAND_PREFIXES = ("#今天任務", "#打卡")
+
 logger = logging.getLogger(__name__)
 
 # 任務相關的函數（示例）
@@ -0,0 +1,25 @@
+"""資料儲存包
+
+這個包負責任務、反思等資料的讀寫，提供 JSON 檔案與 PostgreSQL 兩種實作。
+"""
+
+from storage.base import StorageBackend
+from storage.task_store import TaskStore, DEFAULT_FLUSH_INTERVAL
+from storage.reflection_journal import ReflectionJournal
+from storage.json_backend import JsonStorage
+
+__all__ = [
+    'StorageBackend', 'TaskStore', 'ReflectionJournal', 'JsonStorage',
+    'DEFAULT_FLUSH_INTERVAL', 'create_storage'
+]
+
+
+def create_storage(backend, timezone, **options):
+    """依名稱建立儲存後端，backend 可為 'json' 或 'postgres'"""
+    if backend == 'json':
+        return JsonStorage(timezone, **options)
+    if backend == 'postgres':
+        # 延遲導入，只使用 JSON 儲存時不需要連接資料庫
+        from storage.postgres_backend import PostgresStorage
+        return PostgresStorage(timezone, legacy_owner=options.get('legacy_owner'))
+    raise ValueError(f"未知的儲存後端: {backend}")
@@ -0,0 +1,68 @@
+class StorageBackend:
+    """任務、反思與問題資料的儲存介面
+
+    app.py 的 add_task、get_tasks、complete_task、save_reflection、
+    get_random_question 等函數都透過此介面存取資料，
+    可依設定切換為 JSON 檔案或 PostgreSQL 實作。
+    任務、反思與每日計畫都依 LINE 使用者 ID 分開儲存。
+    """
+
+    name = None
+
+    def start(self):
+        """啟動背景工作或初始化資料表"""
+
+    def stop(self):
+        """停止背景工作並寫回尚未儲存的資料"""
+
+    def compact(self):
+        """整理儲存空間，預設不做任何事"""
+        return True
+
+    def add_subscriber(self, user_id, opt_in=False):
+        """記錄會接收排程問題與提醒的使用者
+
+        已用 remove_subscriber(opt_out=True) 取消訂閱的使用者不會被自動加回，
+        opt_in 為 True（使用者主動訂閱）時才重新加入。
+        """
+        raise NotImplementedError
+
+    def remove_subscriber(self, user_id, opt_out=False):
+        """移除訂閱者；opt_out 為 True 時記錄使用者主動取消，之後傳訊息也不會自動訂閱"""
+        raise NotImplementedError
+
+    def get_subscribers(self):
+        raise NotImplementedError
+
+    def add_task(self, user_id, task_content, reminder_time=None):
+        raise NotImplementedError
+
+    def get_tasks(self, user_id, completed=None):
+        """返回任務列表，最新建立的排在前面"""
+        raise NotImplementedError
+
+    def complete_task(self, user_id, task_content):
+        raise NotImplementedError
+
+    def get_today_progress(self, user_id):
+        """返回 (已完成數, 總數, 百分比)"""
+        raise NotImplementedError
+
+    def set_daily_plan(self, user_id, plan_data):
+        raise NotImplementedError
+
+    def get_daily_plan(self, user_id):
+        raise NotImplementedError
+
+    def set_task_reminder(self, user_id, task_content, reminder_time):
+        raise NotImplementedError
+
+    def collect_due_reminders(self, now):
+        """返回所有使用者到期需要提醒的任務（含 user_id 欄位），並記錄提醒時間"""
+        raise NotImplementedError
+
+    def save_reflection(self, user_id, question, answer):
+        raise NotImplementedError
+
+    def get_random_question(self, time_of_day):
+        raise NotImplementedError
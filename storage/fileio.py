@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+
+def atomic_write_text(filename, text):
+    """以「寫入暫存檔再改名」的方式寫檔，避免寫到一半當機造成檔案截斷"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(filename) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        # os.replace 在同一檔案系統上是原子操作
+        os.replace(tmp_path, filename)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,330 @@
+import os
+import re
+import json
+import random
+import atexit
+import datetime
+import logging
+import threading
+
+from storage.base import StorageBackend
+from storage.fileio import atomic_write_text
+from storage.task_store import TaskStore, DEFAULT_FLUSH_INTERVAL, due_minutes
+from storage.reflection_journal import ReflectionJournal
+
+logger = logging.getLogger(__name__)
+
+# LINE 使用者 ID 只包含英數字，限制字元以免被當成路徑
+USER_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class UserShard:
+    """單一使用者的任務與反思資料"""
+
+    def __init__(self, directory, timezone, flush_interval, legacy_reflections_file=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.tasks = TaskStore(os.path.join(directory, 'tasks.json'), timezone, flush_interval=flush_interval)
+        self.reflections = ReflectionJournal(
+            os.path.join(directory, 'reflections.jsonl'),
+            legacy_filename=legacy_reflections_file
+        )
+
+
+class JsonStorage(StorageBackend):
+    """以本機 JSON 檔案儲存資料
+
+    每個使用者的資料存放在 data_dir/users/<user_id>/ 之下，各自有獨立的
+    常駐記憶體 TaskStore 與反思日誌，一位使用者的資料量不會影響其他人的延遲。
+    提醒索引記錄每個分鐘有哪些使用者設有提醒，排程檢查時只查看這些使用者。
+    所有使用者的修改由同一條背景線程批次寫回。
+    """
+
+    name = 'json'
+
+    def __init__(self, timezone, data_dir, questions_file, legacy_owner=None,
+                 legacy_tasks_file=None, legacy_reflections_file=None,
+                 legacy_journal_file=None, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.timezone = timezone
+        self.data_dir = data_dir
+        self.users_dir = os.path.join(data_dir, 'users')
+        self.subscribers_file = os.path.join(data_dir, 'subscribers.json')
+        self.questions_file = questions_file
+        self.flush_interval = flush_interval
+        # 舊版單一使用者的資料檔案，啟動時轉移給 legacy_owner
+        self.legacy_owner = legacy_owner
+        self.legacy_tasks_file = legacy_tasks_file
+        self.legacy_reflections_file = legacy_reflections_file
+        self.legacy_journal_file = legacy_journal_file
+
+        self._shards = {}
+        self._shards_lock = threading.Lock()
+        self._subscribers = None
+        # 主動取消訂閱的使用者，傳訊息時不會被自動加回
+        self._opted_out = None
+        self._subscribers_lock = threading.Lock()
+        # 提醒索引：HH:MM -> 設有該時間提醒的使用者
+        self._minute_users = {}
+        self._user_minutes = {}
+        self._index_lock = threading.Lock()
+        self._last_reminder_tick = None
+        self._stopping = threading.Event()
+        self._flusher = None
+
+        self._questions = None
+        self._questions_mtime = None
+        self._questions_lock = threading.Lock()
+
+    # ---- 啟動與寫回 ----
+
+    def start(self):
+        os.makedirs(self.users_dir, exist_ok=True)
+        self._migrate_legacy()
+
+        # 載入所有使用者的任務以建立提醒索引
+        for user_id in sorted(os.listdir(self.users_dir)):
+            if USER_ID_PATTERN.match(user_id):
+                self._refresh_reminders(user_id, self._shard(user_id))
+
+        if self.flush_interval > 0 and not self._flusher:
+            self._flusher = threading.Thread(target=self._flush_loop, name="json-storage-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.stop)
+            logger.info(f"任務背景寫入線程已啟動 (間隔 {self.flush_interval} 秒)")
+
+    def _migrate_legacy(self):
+        """把舊版全域的 tasks.json 與反思檔案轉移到 legacy_owner 的目錄"""
+        legacy_files = [
+            (self.legacy_tasks_file, 'tasks.json'),
+            (self.legacy_journal_file, 'reflections.jsonl'),
+        ]
+        pending = [
+            (src, name) for src, name in legacy_files if src and os.path.exists(src)
+        ]
+        has_legacy_reflections = self.legacy_reflections_file and os.path.exists(self.legacy_reflections_file)
+        if not pending and not has_legacy_reflections:
+            return
+
+        if not self.legacy_owner or not USER_ID_PATTERN.match(self.legacy_owner):
+            logger.warning("發現舊版資料檔案，但未設定有效的 USER_ID，暫不轉移")
+            return
+
+        directory = os.path.join(self.users_dir, self.legacy_owner)
+        os.makedirs(directory, exist_ok=True)
+        for src, name in pending:
+            dst = os.path.join(directory, name)
+            if os.path.exists(dst):
+                logger.warning(f"{dst} 已存在，保留舊版檔案 {src} 不轉移")
+                continue
+            os.replace(src, dst)
+            logger.info(f"已將 {src} 轉移到 {dst}")
+
+        if has_legacy_reflections:
+            # 由該使用者的反思日誌在第一次存取時完成格式轉換
+            self._shard(self.legacy_owner, legacy_reflections_file=self.legacy_reflections_file).reflections.read_all()
+
+        self.add_subscriber(self.legacy_owner)
+
+    def _flush_loop(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        with self._shards_lock:
+            shards = list(self._shards.values())
+        ok = True
+        for shard in shards:
+            ok = shard.tasks.flush() and ok
+        return ok
+
+    def stop(self):
+        self._stopping.set()
+        if self._flusher:
+            self._flusher.join(timeout=10)
+            self._flusher = None
+        self.flush()
+
+    def compact(self):
+        with self._shards_lock:
+            shards = list(self._shards.values())
+        ok = True
+        for shard in shards:
+            ok = shard.reflections.compact() and ok
+        return ok
+
+    # ---- 使用者分片 ----
+
+    def _shard(self, user_id, legacy_reflections_file=None):
+        if not user_id or not USER_ID_PATTERN.match(user_id):
+            raise ValueError(f"無效的使用者 ID: {user_id!r}")
+        with self._shards_lock:
+            shard = self._shards.get(user_id)
+            if shard is None:
+                shard = UserShard(
+                    os.path.join(self.users_dir, user_id),
+                    self.timezone,
+                    self.flush_interval,
+                    legacy_reflections_file=legacy_reflections_file
+                )
+                self._shards[user_id] = shard
+            return shard
+
+    def _refresh_reminders(self, user_id, shard):
+        """同步單一使用者在提醒索引中的分鐘
+
+        讀取任務的提醒分鐘與更新索引都在 _index_lock 內完成，
+        同一使用者同時有多個修改時，後完成的更新一定看得到最新的任務狀態。
+        """
+        with self._index_lock:
+            minutes = shard.tasks.reminder_minutes()
+            old_minutes = self._user_minutes.get(user_id, set())
+            for minute in old_minutes - minutes:
+                users = self._minute_users.get(minute)
+                if users is not None:
+                    users.discard(user_id)
+                    if not users:
+                        del self._minute_users[minute]
+            for minute in minutes - old_minutes:
+                self._minute_users.setdefault(minute, set()).add(user_id)
+            if minutes:
+                self._user_minutes[user_id] = minutes
+            else:
+                self._user_minutes.pop(user_id, None)
+
+    # ---- 訂閱者 ----
+
+    def _load_subscribers(self):
+        """需在持有 _subscribers_lock 時呼叫"""
+        if self._subscribers is not None:
+            return
+        self._subscribers = set()
+        self._opted_out = set()
+        if os.path.exists(self.subscribers_file):
+            try:
+                with open(self.subscribers_file, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+                self._subscribers = set(data.get("subscribers", []))
+                self._opted_out = set(data.get("opted_out", []))
+            except Exception as e:
+                logger.error(f"讀取 {self.subscribers_file} 時發生錯誤: {e}")
+
+    def _save_subscribers(self):
+        """需在持有 _subscribers_lock 時呼叫"""
+        try:
+            os.makedirs(self.data_dir, exist_ok=True)
+            atomic_write_text(
+                self.subscribers_file,
+                json.dumps(
+                    {"subscribers": sorted(self._subscribers), "opted_out": sorted(self._opted_out)},
+                    ensure_ascii=False, indent=2
+                )
+            )
+            return True
+        except Exception as e:
+            logger.error(f"儲存 {self.subscribers_file} 時發生錯誤: {e}")
+            return False
+
+    def add_subscriber(self, user_id, opt_in=False):
+        if not user_id or not USER_ID_PATTERN.match(user_id):
+            return False
+        with self._subscribers_lock:
+            self._load_subscribers()
+            if user_id in self._opted_out:
+                if not opt_in:
+                    return True
+                self._opted_out.discard(user_id)
+            elif user_id in self._subscribers:
+                return True
+            self._subscribers.add(user_id)
+            return self._save_subscribers()
+
+    def remove_subscriber(self, user_id, opt_out=False):
+        if not user_id or not USER_ID_PATTERN.match(user_id):
+            return False
+        with self._subscribers_lock:
+            self._load_subscribers()
+            if user_id not in self._subscribers and (not opt_out or user_id in self._opted_out):
+                return True
+            self._subscribers.discard(user_id)
+            if opt_out:
+                self._opted_out.add(user_id)
+            return self._save_subscribers()
+
+    def get_subscribers(self):
+        with self._subscribers_lock:
+            self._load_subscribers()
+            return sorted(self._subscribers)
+
+    # ---- 任務與反思 ----
+
+    def add_task(self, user_id, task_content, reminder_time=None):
+        shard = self._shard(user_id)
+        result = shard.tasks.add_task(task_content, reminder_time)
+        if reminder_time:
+            self._refresh_reminders(user_id, shard)
+        return result
+
+    def get_tasks(self, user_id, completed=None):
+        return self._shard(user_id).tasks.get_tasks(completed)
+
+    def complete_task(self, user_id, task_content):
+        shard = self._shard(user_id)
+        result = shard.tasks.complete_task(task_content)
+        self._refresh_reminders(user_id, shard)
+        return result
+
+    def get_today_progress(self, user_id):
+        return self._shard(user_id).tasks.get_today_progress()
+
+    def set_daily_plan(self, user_id, plan_data):
+        return self._shard(user_id).tasks.set_daily_plan(plan_data)
+
+    def get_daily_plan(self, user_id):
+        return self._shard(user_id).tasks.get_daily_plan()
+
+    def set_task_reminder(self, user_id, task_content, reminder_time):
+        shard = self._shard(user_id)
+        result = shard.tasks.set_task_reminder(task_content, reminder_time)
+        self._refresh_reminders(user_id, shard)
+        return result
+
+    def collect_due_reminders(self, now):
+        with self._index_lock:
+            minutes = due_minutes(self._last_reminder_tick, now)
+            self._last_reminder_tick = minutes[-1]
+            users = set()
+            for minute in minutes:
+                users.update(self._minute_users.get(minute.strftime("%H:%M"), ()))
+
+        due = []
+        for user_id in sorted(users):
+            for task in self._shard(user_id).tasks.collect_reminders_at(minutes, now):
+                task["user_id"] = user_id
+                due.append(task)
+        return due
+
+    def save_reflection(self, user_id, question, answer):
+        return self._shard(user_id).reflections.append({
+            "question": question,
+            "answer": answer,
+            "created_at": datetime.datetime.now(self.timezone).strftime("%Y-%m-%d %H:%M:%S")
+        })
+
+    def _load_questions(self):
+        with self._questions_lock:
+            try:
+                mtime = os.path.getmtime(self.questions_file)
+                if self._questions is None or mtime != self._questions_mtime:
+                    with open(self.questions_file, 'r', encoding='utf-8') as file:
+                        self._questions = json.load(file)
+                    self._questions_mtime = mtime
+            except Exception as e:
+                logger.error(f"讀取 {self.questions_file} 時發生錯誤: {e}")
+            return self._questions
+
+    def get_random_question(self, time_of_day):
+        data = self._load_questions()
+        if not data or time_of_day not in data or not data[time_of_day]:
+            return None
+        return random.choice(data[time_of_day])
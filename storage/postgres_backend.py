@@ -0,0 +1,260 @@
+import datetime
+import logging
+import threading
+
+import database
+from storage.base import StorageBackend
+from storage.task_store import due_minutes
+
+logger = logging.getLogger(__name__)
+
+TASK_COLUMNS = "id, user_id, content, created_at, completed, completed_at, progress, reminder_time, last_reminded_at"
+
+# migrations 表中標記舊資料已歸屬給 legacy_owner 的名稱
+LEGACY_OWNER_MIGRATION = 'legacy_owner_backfill'
+
+
+def _format_time(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else None
+
+
+def _row_to_task(row):
+    """把資料列轉換成與 JSON 儲存相同格式的任務字典"""
+    return {
+        "id": row["id"],
+        "user_id": row["user_id"],
+        "content": row["content"],
+        "created_at": _format_time(row["created_at"]),
+        "completed": row["completed"],
+        "completed_at": _format_time(row["completed_at"]),
+        "reminder_time": row["reminder_time"],
+        "last_reminded_at": _format_time(row["last_reminded_at"]),
+        "progress": row["progress"]
+    }
+
+
+class PostgresStorage(StorageBackend):
+    """以 PostgreSQL 儲存資料，重新部署後資料不會遺失
+
+    提醒與今日進度查詢都走 database.init_db 建立的索引
+    （未完成任務的 reminder_time 部分索引、(user_id, created_at::date) 索引），
+    資料量增加時查詢成本只與符合條件的筆數相關，
+    也不會因為其他使用者的資料量而變慢。
+    """
+
+    name = 'postgres'
+
+    def __init__(self, timezone, legacy_owner=None):
+        self.timezone = timezone
+        # 舊版資料沒有 user_id，啟動時歸屬給 legacy_owner
+        self.legacy_owner = legacy_owner
+        self._last_reminder_tick = None
+        self._tick_lock = threading.Lock()
+        self._known_subscribers = set()
+
+    def start(self):
+        if not database.init_db():
+            logger.error("PostgreSQL 資料表初始化失敗")
+            return
+        if self.legacy_owner:
+            self._migrate_legacy()
+
+    def _migrate_legacy(self):
+        """把沒有 user_id 的舊資料歸屬給 legacy_owner
+
+        完成後記錄在 migrations 表，之後的啟動只需查詢一次標記，不再掃描整個資料表。
+        """
+        try:
+            with database.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1 FROM migrations WHERE name = %s", (LEGACY_OWNER_MIGRATION,))
+                if cursor.fetchone():
+                    return True
+                for table in ("tasks", "reflections", "daily_plans"):
+                    cursor.execute(f"UPDATE {table} SET user_id = %s WHERE user_id IS NULL", (self.legacy_owner,))
+                cursor.execute(
+                    "INSERT INTO migrations (name) VALUES (%s) ON CONFLICT (name) DO NOTHING",
+                    (LEGACY_OWNER_MIGRATION,)
+                )
+        except Exception as e:
+            logger.error(f"轉移舊資料失敗: {e}")
+            return False
+        logger.info(f"已將舊資料歸屬給使用者 {self.legacy_owner}")
+        return self.add_subscriber(self.legacy_owner)
+
+    def _now(self):
+        return datetime.datetime.now(self.timezone).replace(tzinfo=None)
+
+    def _execute(self, sql, params=(), fetch=None, default=None):
+        """執行單一語句，fetch 可為 'one'、'all' 或 None，失敗時返回 default"""
+        try:
+            with database.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                if fetch == 'one':
+                    return cursor.fetchone()
+                if fetch == 'all':
+                    return cursor.fetchall()
+                return True
+        except Exception as e:
+            logger.error(f"資料庫操作失敗: {e}")
+            return default
+
+    def add_subscriber(self, user_id, opt_in=False):
+        if not user_id:
+            return False
+        if opt_in:
+            result = self._execute(
+                "INSERT INTO subscribers (user_id) VALUES (%s) "
+                "ON CONFLICT (user_id) DO UPDATE SET opted_out = FALSE",
+                (user_id,), default=False
+            )
+        else:
+            # 已知的使用者不必每則訊息都寫一次資料庫；主動取消過的使用者保留 opted_out
+            if user_id in self._known_subscribers:
+                return True
+            result = self._execute(
+                "INSERT INTO subscribers (user_id) VALUES (%s) ON CONFLICT (user_id) DO NOTHING",
+                (user_id,), default=False
+            )
+        if result:
+            self._known_subscribers.add(user_id)
+        return result
+
+    def remove_subscriber(self, user_id, opt_out=False):
+        if not user_id:
+            return False
+        if opt_out:
+            result = self._execute(
+                "INSERT INTO subscribers (user_id, opted_out) VALUES (%s, TRUE) "
+                "ON CONFLICT (user_id) DO UPDATE SET opted_out = TRUE",
+                (user_id,), default=False
+            )
+        else:
+            result = self._execute("DELETE FROM subscribers WHERE user_id = %s", (user_id,), default=False)
+            self._known_subscribers.discard(user_id)
+        return result
+
+    def get_subscribers(self):
+        rows = self._execute(
+            "SELECT user_id FROM subscribers WHERE opted_out = FALSE ORDER BY user_id", fetch='all', default=[]
+        )
+        return [row["user_id"] for row in rows]
+
+    def add_task(self, user_id, task_content, reminder_time=None):
+        return self._execute(
+            "INSERT INTO tasks (user_id, content, created_at, reminder_time) VALUES (%s, %s, %s, %s)",
+            (user_id, task_content, self._now(), reminder_time),
+            default=False
+        )
+
+    def get_tasks(self, user_id, completed=None):
+        if completed is None:
+            rows = self._execute(
+                f"SELECT {TASK_COLUMNS} FROM tasks WHERE user_id = %s ORDER BY created_at DESC",
+                (user_id,), fetch='all', default=[]
+            )
+        else:
+            rows = self._execute(
+                f"SELECT {TASK_COLUMNS} FROM tasks WHERE user_id = %s AND completed = %s ORDER BY created_at DESC",
+                (user_id, completed), fetch='all', default=[]
+            )
+        return [_row_to_task(row) for row in rows]
+
+    def complete_task(self, user_id, task_content):
+        row = self._execute(
+            """
+            UPDATE tasks SET completed = TRUE, completed_at = %s
+            WHERE id = (
+                SELECT id FROM tasks WHERE user_id = %s AND content = %s AND completed = FALSE
+                ORDER BY created_at LIMIT 1
+            )
+            RETURNING id
+            """,
+            (self._now(), user_id, task_content), fetch='one'
+        )
+        return row is not None
+
+    def get_today_progress(self, user_id):
+        row = self._execute(
+            """
+            SELECT COUNT(*) AS total, COUNT(*) FILTER (WHERE completed) AS completed
+            FROM tasks WHERE user_id = %s AND created_at::date = %s
+            """,
+            (user_id, self._now().date()), fetch='one'
+        )
+        if not row:
+            return 0, 0, 0
+        total, completed = row["total"], row["completed"]
+        percentage = (completed / total * 100) if total > 0 else 0
+        return completed, total, percentage
+
+    def set_daily_plan(self, user_id, plan_data):
+        try:
+            with database.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM daily_plans WHERE user_id = %s", (user_id,))
+                for time_slot, content in plan_data.items():
+                    cursor.execute(
+                        "INSERT INTO daily_plans (user_id, time_slot, content) VALUES (%s, %s, %s)",
+                        (user_id, time_slot, content)
+                    )
+            return True
+        except Exception as e:
+            logger.error(f"儲存每日計畫失敗: {e}")
+            return False
+
+    def get_daily_plan(self, user_id):
+        rows = self._execute(
+            "SELECT time_slot, content FROM daily_plans WHERE user_id = %s ORDER BY id",
+            (user_id,), fetch='all', default=[]
+        )
+        return {row["time_slot"]: row["content"] for row in rows}
+
+    def set_task_reminder(self, user_id, task_content, reminder_time):
+        row = self._execute(
+            """
+            UPDATE tasks SET reminder_time = %s
+            WHERE id = (
+                SELECT id FROM tasks WHERE user_id = %s AND content = %s AND completed = FALSE
+                ORDER BY created_at LIMIT 1
+            )
+            RETURNING id
+            """,
+            (reminder_time, user_id, task_content), fetch='one'
+        )
+        return row is not None
+
+    def collect_due_reminders(self, now):
+        with self._tick_lock:
+            minutes = due_minutes(self._last_reminder_tick, now)
+            self._last_reminder_tick = minutes[-1]
+        rows = self._execute(
+            f"""
+            UPDATE tasks SET last_reminded_at = %s
+            WHERE completed = FALSE AND reminder_time = ANY(%s)
+              AND (last_reminded_at IS NULL OR last_reminded_at < %s)
+            RETURNING {TASK_COLUMNS}
+            """,
+            (
+                now.replace(tzinfo=None),
+                [minute.strftime("%H:%M") for minute in minutes],
+                minutes[0].replace(tzinfo=None)
+            ),
+            fetch='all', default=[]
+        )
+        return [_row_to_task(row) for row in rows]
+
+    def save_reflection(self, user_id, question, answer):
+        return self._execute(
+            "INSERT INTO reflections (user_id, question, answer, timestamp) VALUES (%s, %s, %s, %s)",
+            (user_id, question, answer, self._now()),
+            default=False
+        )
+
+    def get_random_question(self, time_of_day):
+        row = self._execute(
+            "SELECT content FROM questions WHERE time_of_day = %s ORDER BY random() LIMIT 1",
+            (time_of_day,), fetch='one'
+        )
+        return row["content"] if row else None
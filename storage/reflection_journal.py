@@ -0,0 +1,124 @@
+import os
+import json
+import logging
+import threading
+
+from storage.fileio import atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+
+class ReflectionJournal:
+    """只追加的反思日誌 (JSON Lines 格式)
+
+    每筆反思佔一行，新增反思只需要一次 write()，不必重寫整個檔案。
+    開啟時若發現舊版 {"reflections": [...]} 檔案會自動轉換；
+    若日誌中有寫到一半的殘行，compact() 會以原子改名的方式重寫出乾淨的檔案。
+    """
+
+    def __init__(self, filename, legacy_filename=None):
+        self.filename = filename
+        self.legacy_filename = legacy_filename
+        self._lock = threading.Lock()
+        self._file = None
+        self._opened = False
+        # 上次掃描時發現的無效行數，大於 0 時需要壓縮
+        self._invalid_lines = 0
+
+    def _open(self):
+        """第一次存取時完成舊檔轉換並檢查日誌（需在持有鎖時呼叫）"""
+        if self._opened:
+            return
+        self._migrate_legacy()
+        records, self._invalid_lines, torn = self._scan()
+        if self._invalid_lines or torn:
+            self._rewrite(records)
+        self._opened = True
+
+    def _migrate_legacy(self):
+        if not self.legacy_filename or not os.path.exists(self.legacy_filename):
+            return
+
+        if not os.path.exists(self.filename):
+            try:
+                with open(self.legacy_filename, 'r', encoding='utf-8') as file:
+                    reflections = json.load(file).get("reflections", [])
+            except Exception as e:
+                logger.error(f"讀取 {self.legacy_filename} 時發生錯誤，暫不轉換: {e}")
+                return
+            self._rewrite(reflections)
+            logger.info(f"已將 {len(reflections)} 筆反思從 {self.legacy_filename} 轉換到 {self.filename}")
+
+        # 日誌已完整寫入後才把舊檔改名，轉換途中當機也不會遺失資料
+        os.replace(self.legacy_filename, self.legacy_filename + '.migrated')
+
+    def _scan(self):
+        """讀取日誌，返回 (有效紀錄, 無效行數, 最後一行是否缺少換行)"""
+        records = []
+        invalid = 0
+        torn = False
+        if not os.path.exists(self.filename):
+            return records, invalid, torn
+
+        with open(self.filename, 'r', encoding='utf-8') as file:
+            for line in file:
+                if not line.endswith('\n'):
+                    torn = True
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    invalid += 1
+        return records, invalid, torn
+
+    def _rewrite(self, records):
+        if self._file:
+            self._file.close()
+            self._file = None
+        text = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        atomic_write_text(self.filename, text)
+        self._invalid_lines = 0
+
+    def append(self, record):
+        """追加一筆反思"""
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            try:
+                self._open()
+                if not self._file:
+                    self._file = open(self.filename, 'a', encoding='utf-8')
+                self._file.write(line)
+                self._file.flush()
+                return True
+            except Exception as e:
+                logger.error(f"寫入 {self.filename} 時發生錯誤: {e}")
+                return False
+
+    def read_all(self):
+        """讀取所有反思，略過無法解析的行"""
+        with self._lock:
+            try:
+                self._open()
+                records, self._invalid_lines, _ = self._scan()
+                return records
+            except Exception as e:
+                logger.error(f"讀取 {self.filename} 時發生錯誤: {e}")
+                return []
+
+    def compact(self, force=False):
+        """移除殘行並重寫日誌，沒有需要清理的內容時不做任何事"""
+        with self._lock:
+            try:
+                self._open()
+                records, self._invalid_lines, torn = self._scan()
+                if not force and not self._invalid_lines and not torn:
+                    return True
+                dropped = self._invalid_lines
+                self._rewrite(records)
+                logger.info(f"反思日誌壓縮完成，保留 {len(records)} 筆，移除 {dropped} 行無效內容")
+                return True
+            except Exception as e:
+                logger.error(f"壓縮 {self.filename} 時發生錯誤: {e}")
+                return False
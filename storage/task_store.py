@@ -0,0 +1,269 @@
+import os
+import json
+import datetime
+import logging
+import threading
+
+from storage.fileio import atomic_write_text
+
+logger = logging.getLogger(__name__)
+
+# 預設每 2 秒把累積的修改批次寫回檔案
+DEFAULT_FLUSH_INTERVAL = 2.0
+
+# 排程線程延遲喚醒時，最多補發幾分鐘內錯過的提醒
+REMINDER_CATCHUP_MINUTES = 60
+
+
+class TaskStore:
+    """常駐記憶體的任務資料庫
+
+    啟動後只讀取一次 tasks.json，之後的查詢都直接走記憶體；
+    修改只會標記為「待寫入」，由 JsonStorage 的背景線程每隔 flush_interval 秒呼叫 flush() 批次寫回，
+    並以暫存檔改名的方式寫入，避免當機時把檔案寫壞。
+    flush_interval <= 0 時改為每次修改都立即同步寫入。
+
+    注意：資料只存在於單一行程中，部署時請使用單一 worker。
+    """
+
+    def __init__(self, filename, timezone, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.filename = filename
+        self.timezone = timezone
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._tasks = None
+        self._daily_plan = {}
+        # 日期 -> [當日建立任務數, 其中已完成數]
+        self._day_stats = {}
+        # 提醒索引：HH:MM -> {id(task): task}，只包含未完成且設有提醒的任務
+        self._reminder_index = {}
+        self._version = 0
+        self._flushed_version = 0
+
+    # ---- 載入與寫回 ----
+
+    def _ensure_loaded(self):
+        """第一次存取時載入檔案（需在持有鎖時呼叫），載入失敗時返回 False"""
+        if self._tasks is not None:
+            return True
+
+        data = {"tasks": [], "daily_plan": {}}
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+            except Exception as e:
+                # 不覆寫無法解析的檔案，下次存取時再重試
+                logger.error(f"讀取 {self.filename} 時發生錯誤: {e}")
+                return False
+
+        tasks = data.get("tasks", [])
+        tasks.sort(key=lambda x: x["created_at"])
+        self._tasks = tasks
+        self._daily_plan = data.get("daily_plan", {})
+        self._day_stats = {}
+        self._reminder_index = {}
+        for task in tasks:
+            self._count_task(task)
+            self._index_reminder(task)
+        logger.info(f"已載入 {len(tasks)} 筆任務")
+        return True
+
+    def _count_task(self, task, completed_delta=None):
+        stats = self._day_stats.setdefault(task["created_at"].split()[0], [0, 0])
+        if completed_delta is None:
+            stats[0] += 1
+            if task["completed"]:
+                stats[1] += 1
+        else:
+            stats[1] += completed_delta
+
+    def _index_reminder(self, task):
+        if not task["completed"] and task.get("reminder_time"):
+            self._reminder_index.setdefault(task["reminder_time"], {})[id(task)] = task
+
+    def _unindex_reminder(self, task):
+        bucket = self._reminder_index.get(task.get("reminder_time"))
+        if bucket is not None:
+            bucket.pop(id(task), None)
+            if not bucket:
+                del self._reminder_index[task["reminder_time"]]
+
+    def _mark_dirty(self):
+        """標記資料已修改（需在持有鎖時呼叫）"""
+        self._version += 1
+
+    def _write_through(self):
+        """不批次寫入時立即寫回；需在釋放 _lock 後呼叫，flush() 先取得 _flush_lock 再取得 _lock"""
+        if self.flush_interval <= 0:
+            return self.flush()
+        return True
+
+    def flush(self):
+        """把尚未寫入的修改寫回檔案"""
+        with self._flush_lock:
+            with self._lock:
+                if self._tasks is None or self._version == self._flushed_version:
+                    return True
+                version = self._version
+                text = json.dumps(
+                    {"tasks": self._tasks, "daily_plan": self._daily_plan},
+                    ensure_ascii=False, indent=2
+                )
+
+            try:
+                atomic_write_text(self.filename, text)
+            except Exception as e:
+                logger.error(f"儲存 {self.filename} 時發生錯誤: {e}")
+                return False
+
+            with self._lock:
+                self._flushed_version = max(self._flushed_version, version)
+            return True
+
+    # ---- 任務操作 ----
+
+    def _now_str(self):
+        return datetime.datetime.now(self.timezone).strftime("%Y-%m-%d %H:%M:%S")
+
+    def _find_open_task(self, task_content):
+        for task in self._tasks:
+            if task["content"] == task_content and not task["completed"]:
+                return task
+        return None
+
+    def add_task(self, task_content, reminder_time=None):
+        with self._lock:
+            if not self._ensure_loaded():
+                return False
+
+            new_task = {
+                "content": task_content,
+                "created_at": self._now_str(),
+                "completed": False,
+                "completed_at": None,
+                "reminder_time": reminder_time,
+                "last_reminded_at": None,
+                "progress": 0
+            }
+            self._tasks.append(new_task)
+            # 系統時間倒退時維持依建立時間排序
+            if len(self._tasks) > 1 and self._tasks[-2]["created_at"] > new_task["created_at"]:
+                self._tasks.sort(key=lambda x: x["created_at"])
+            self._count_task(new_task)
+            self._index_reminder(new_task)
+            self._mark_dirty()
+        return self._write_through()
+
+    def get_tasks(self, completed=None):
+        """返回任務的副本，最新建立的排在前面"""
+        with self._lock:
+            if not self._ensure_loaded():
+                return []
+            return [
+                dict(task) for task in reversed(self._tasks)
+                if completed is None or task["completed"] == completed
+            ]
+
+    def complete_task(self, task_content):
+        with self._lock:
+            if not self._ensure_loaded():
+                return False
+
+            task = self._find_open_task(task_content)
+            if not task:
+                return False
+            self._unindex_reminder(task)
+            task["completed"] = True
+            task["completed_at"] = self._now_str()
+            self._count_task(task, completed_delta=1)
+            self._mark_dirty()
+        return self._write_through()
+
+    def get_today_progress(self):
+        with self._lock:
+            if not self._ensure_loaded():
+                return 0, 0, 0
+
+            today = datetime.datetime.now(self.timezone).strftime("%Y-%m-%d")
+            total, completed = self._day_stats.get(today, (0, 0))
+            percentage = (completed / total * 100) if total > 0 else 0
+            return completed, total, percentage
+
+    def set_daily_plan(self, plan_data):
+        with self._lock:
+            if not self._ensure_loaded():
+                return False
+            self._daily_plan = plan_data
+            self._mark_dirty()
+        return self._write_through()
+
+    def get_daily_plan(self):
+        with self._lock:
+            if not self._ensure_loaded():
+                return {}
+            return dict(self._daily_plan)
+
+    def set_task_reminder(self, task_content, reminder_time):
+        with self._lock:
+            if not self._ensure_loaded():
+                return False
+
+            task = self._find_open_task(task_content)
+            if not task:
+                return False
+            self._unindex_reminder(task)
+            task["reminder_time"] = reminder_time
+            self._index_reminder(task)
+            self._mark_dirty()
+        return self._write_through()
+
+    def reminder_minutes(self):
+        """返回目前設有提醒的分鐘 (HH:MM)"""
+        with self._lock:
+            if not self._ensure_loaded():
+                return set()
+            return set(self._reminder_index)
+
+    def collect_reminders_at(self, minutes, now):
+        """透過提醒索引找出在 minutes 中任一分鐘到期的任務，並記錄提醒時間
+
+        只有實際發出提醒時才會標記需要寫回。
+        """
+        with self._lock:
+            if not self._ensure_loaded():
+                return []
+
+            due = []
+            reminded_at = now.strftime("%Y-%m-%d %H:%M:%S")
+            for minute in minutes:
+                bucket = self._reminder_index.get(minute.strftime("%H:%M"))
+                if not bucket:
+                    continue
+                due_at = minute.strftime("%Y-%m-%d %H:%M")
+                for task in bucket.values():
+                    # 同一分鐘已經提醒過的任務不重複提醒（例如重新啟動後）
+                    if (task.get("last_reminded_at") or "") >= due_at:
+                        continue
+                    task["last_reminded_at"] = reminded_at
+                    due.append(dict(task))
+            if due:
+                self._mark_dirty()
+        if due:
+            self._write_through()
+        return due
+
+
+def due_minutes(last_tick, now):
+    """返回本次提醒檢查涵蓋的分鐘，由早到晚排列，最後一個為 now 所在的分鐘
+
+    排程線程延遲喚醒時，會補上 last_tick 之後錯過的分鐘
+    （最多 REMINDER_CATCHUP_MINUTES 分鐘）。
+    """
+    current_minute = now.replace(second=0, microsecond=0)
+    if last_tick is None or current_minute <= last_tick:
+        return [current_minute]
+    missed = int((current_minute - last_tick).total_seconds() // 60)
+    missed = min(missed, REMINDER_CATCHUP_MINUTES)
+    return [current_minute - datetime.timedelta(minutes=i) for i in range(missed - 1, -1, -1)]
@@ -0,0 +1,65 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class CommandRouter:
+    """以前綴字典樹分派聊天命令
+
+    各功能模組以 register() 登記自己的命令前綴與處理函數，
+    分派時沿著訊息開頭的字元走一次字典樹，成本只與命令長度有關，
+    與登記了多少功能無關；不是命令的一般訊息在第一個字元就會結束比對。
+    """
+
+    def __init__(self):
+        # 區分大小寫與不區分大小寫（以小寫登記）的命令各用一棵字典樹
+        self._root = {}
+        self._folded_root = {}
+        self._order = 0
+        self._lock = threading.Lock()
+
+    def register(self, prefixes, handler, name=None, ignore_case=False):
+        """登記命令前綴，handler(text) 返回回覆文字，返回 None 表示不處理
+
+        前綴預設區分大小寫；ignore_case=True 時不分大小寫比對（例如 help / HELP）。
+        同一個前綴可以登記多個處理函數，依登記順序嘗試。
+        """
+        if isinstance(prefixes, str):
+            prefixes = [prefixes]
+        name = name or getattr(handler, '__name__', 'handler')
+        root = self._folded_root if ignore_case else self._root
+        with self._lock:
+            for prefix in prefixes:
+                node = root
+                for char in (prefix.lower() if ignore_case else prefix):
+                    node = node.setdefault(char, {})
+                self._order += 1
+                node.setdefault(None, []).append((self._order, name, handler))
+
+    @staticmethod
+    def _walk(root, text):
+        """返回 [(前綴長度, 登記順序, 名稱, 處理函數)]"""
+        matched = []
+        node = root
+        for length, char in enumerate(text, 1):
+            node = node.get(char)
+            if node is None:
+                break
+            for order, name, handler in node.get(None, ()):
+                matched.append((length, order, name, handler))
+        return matched
+
+    def candidates(self, text):
+        """返回符合訊息開頭的 (名稱, 處理函數)，較長的前綴排在前面，同長度依登記順序"""
+        matched = self._walk(self._root, text) + self._walk(self._folded_root, text.lower())
+        matched.sort(key=lambda item: (-item[0], item[1]))
+        return [(name, handler) for _, _, name, handler in matched]
+
+    def dispatch(self, text):
+        """依序嘗試符合的處理函數，返回 (名稱, 回覆文字)；沒有處理函數回覆時返回 (None, None)"""
+        for name, handler in self.candidates(text):
+            response = handler(text)
+            if response:
+                return name, response
+        return None, None
@@ -0,0 +1,125 @@
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 佇列已滿時的處理方式
+FULL_POLICY_INLINE = 'inline'   # 在請求線程中直接處理（較慢，但不會遺失事件）
+FULL_POLICY_REJECT = 'reject'   # 拒絕整批事件，回應 503 讓 LINE 重新傳送
+FULL_POLICY_DROP = 'drop'       # 記錄後丟棄事件，仍回應 200
+FULL_POLICIES = (FULL_POLICY_INLINE, FULL_POLICY_REJECT, FULL_POLICY_DROP)
+
+
+class EventDispatcher:
+    """以有界佇列與固定數量工作線程處理 webhook 事件
+
+    /callback 驗證簽名後把事件交給 submit_all() 即可立刻回應，
+    實際的訊息處理（外部查詢、回覆訊息等）在工作線程中完成。
+    """
+
+    def __init__(self, handle_event, workers=4, max_queue=100, full_policy=FULL_POLICY_INLINE):
+        if full_policy not in FULL_POLICIES:
+            raise ValueError(f"未知的佇列已滿處理方式: {full_policy}")
+        self.handle_event = handle_event
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.full_policy = full_policy
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._busy = 0
+        self._stats = {
+            "submitted": 0,
+            "processed": 0,
+            "failed": 0,
+            "inline": 0,
+            "rejected": 0,
+            "dropped": 0,
+            "max_depth": 0,
+        }
+        self._total_wait = 0.0
+
+    def _ensure_started(self):
+        """第一次提交事件時才啟動工作線程（需在持有鎖時呼叫），避免在 fork 前建立線程"""
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"webhook-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Webhook 工作線程已啟動 ({self.workers} 個，佇列上限 {self.max_queue})")
+
+    def submit_all(self, events):
+        """提交同一個 webhook 請求中的所有事件
+
+        整批事件要嘛全部進入佇列，要嘛依 full_policy 一起處理，
+        避免部分事件已處理、其餘卻被 LINE 重送而重複執行。
+        返回 False 表示事件被拒絕，呼叫端應回應 503。
+        """
+        events = list(events)
+        if not events:
+            return True
+
+        with self._cond:
+            self._ensure_started()
+            if len(self._queue) + len(events) <= self.max_queue:
+                now = time.monotonic()
+                for event in events:
+                    self._queue.append((now, event))
+                self._stats["submitted"] += len(events)
+                self._stats["max_depth"] = max(self._stats["max_depth"], len(self._queue))
+                self._cond.notify(len(events))
+                return True
+
+            logger.warning(f"Webhook 佇列已滿 ({len(self._queue)}/{self.max_queue})，處理方式: {self.full_policy}")
+            if self.full_policy == FULL_POLICY_REJECT:
+                self._stats["rejected"] += len(events)
+                return False
+            if self.full_policy == FULL_POLICY_DROP:
+                self._stats["dropped"] += len(events)
+                return True
+            self._stats["inline"] += len(events)
+
+        for event in events:
+            self._run(event)
+        return True
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                enqueued_at, event = self._queue.popleft()
+                self._busy += 1
+                self._total_wait += time.monotonic() - enqueued_at
+            try:
+                self._run(event)
+            finally:
+                with self._cond:
+                    self._busy -= 1
+
+    def _run(self, event):
+        try:
+            self.handle_event(event)
+            ok = True
+        except Exception as e:
+            logger.error(f"處理 webhook 事件時發生錯誤: {e}")
+            ok = False
+        with self._cond:
+            self._stats["processed" if ok else "failed"] += 1
+
+    def metrics(self):
+        """返回佇列深度與處理統計"""
+        with self._cond:
+            dequeued = self._stats["submitted"] - len(self._queue)
+            return dict(
+                self._stats,
+                queue_depth=len(self._queue),
+                max_queue=self.max_queue,
+                workers=self.workers,
+                busy_workers=self._busy,
+                full_policy=self.full_policy,
+                avg_queue_wait_ms=round(self._total_wait / dequeued * 1000, 2) if dequeued else 0.0,
+            )
@@ -0,0 +1,114 @@
+import os
+import glob
+import logging
+import functools
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 可指定字體檔案路徑，優先於自動搜尋
+FONT_PATH_ENV = os.environ.get('FONT_PATH')
+
+# 常見的中文字體位置（Windows / macOS / Linux）
+FONT_CANDIDATES = [
+    "C:/Windows/Fonts/msjh.ttc",       # 微軟正黑體
+    "C:/Windows/Fonts/msyh.ttc",       # 微軟雅黑
+    "C:/Windows/Fonts/simhei.ttf",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/usr/share/fonts/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",   # apt-get install fonts-wqy-zenhei
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+]
+
+# 候選路徑都不存在時，在字體目錄中搜尋這些檔名
+FONT_DIRS = ["/usr/share/fonts", "/usr/local/share/fonts", os.path.expanduser("~/.fonts")]
+FONT_GLOBS = ["NotoSansCJK*", "NotoSansTC*", "NotoSansSC*", "wqy-*", "SourceHanSans*"]
+
+
+def _discover_font_path():
+    """返回第一個可用的中文字體路徑，找不到時返回 None"""
+    if FONT_PATH_ENV:
+        if os.path.exists(FONT_PATH_ENV):
+            return FONT_PATH_ENV
+        logger.warning(f"FONT_PATH 指定的字體不存在: {FONT_PATH_ENV}")
+    for path in FONT_CANDIDATES:
+        if os.path.exists(path):
+            return path
+    for directory in FONT_DIRS:
+        for pattern in FONT_GLOBS:
+            matches = sorted(glob.glob(os.path.join(directory, '**', pattern), recursive=True))
+            if matches:
+                return matches[0]
+    return None
+
+
+class FontRegistry:
+    """所有 Rich Menu 繪製程式共用的字體登錄
+
+    中文字體只搜尋一次；每種 (字體, 大小) 只載入一次 FreeTypeFont，
+    文字的邊界框依 (字體, 大小, 文字) 記憶，重複繪製時不必重新量測。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._discovered = False
+        self._font_path = None
+        self._fonts = {}
+
+    @property
+    def font_path(self):
+        """中文字體的路徑，第一次使用時才搜尋；找不到時為 None"""
+        if not self._discovered:
+            with self._lock:
+                if not self._discovered:
+                    self._font_path = _discover_font_path()
+                    self._discovered = True
+                    if self._font_path:
+                        logger.info(f"使用字體: {self._font_path}")
+                    else:
+                        logger.warning("找不到指定的中文字體，Rich Menu 上的文字可能無法正確顯示。")
+        return self._font_path
+
+    def get_font(self, size, path=None):
+        """返回指定大小的字體，path 未指定時使用搜尋到的中文字體；都無法載入時返回默認字體"""
+        from PIL import ImageFont
+
+        path = path or self.font_path
+        key = (path, size)
+        with self._lock:
+            font = self._fonts.get(key)
+        if font is not None:
+            return font
+
+        font = None
+        if path:
+            try:
+                font = ImageFont.truetype(path, size)
+            except Exception as e:
+                logger.error(f"加載字體時出錯: {e}")
+        if font is None:
+            font = ImageFont.load_default()
+        with self._lock:
+            return self._fonts.setdefault(key, font)
+
+    def text_bbox(self, text, size, path=None):
+        """返回文字在 (0, 0) 繪製時的邊界框 (left, top, right, bottom)"""
+        return self._text_bbox(path or self.font_path, size, text)
+
+    @functools.lru_cache(maxsize=4096)
+    def _text_bbox(self, path, size, text):
+        font = self.get_font(size, path)
+        if hasattr(font, 'getbbox'):  # Pillow >= 9.2.0
+            return font.getbbox(text)
+        width, height = font.getsize(text)
+        return (0, 0, width, height)
+
+    def text_size(self, text, size, path=None):
+        """返回文字的 (寬, 高)"""
+        left, top, right, bottom = self.text_bbox(text, size, path)
+        return right - left, bottom - top
+
+
+# 整個程式共用的字體登錄
+font_registry = FontRegistry()
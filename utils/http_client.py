@@ -0,0 +1,140 @@
+import os
+import time
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.latency import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# 對外 HTTP 請求的預設設定
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '3.05'))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '10'))
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', '2'))
+HTTP_BACKOFF_FACTOR = float(os.environ.get('HTTP_BACKOFF_FACTOR', '0.3'))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '10'))
+
+# 延遲直方圖的區間上限（毫秒），最後一格為超過最大值的請求
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# 只對冪等的方法與暫時性錯誤重試
+RETRY_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class _HostStats:
+    """單一上游主機的請求數、錯誤數與延遲直方圖"""
+
+    def __init__(self):
+        self.errors = 0
+        self.latency = LatencyHistogram(LATENCY_BUCKETS_MS)
+
+    def record(self, elapsed_ms, ok):
+        if not ok:
+            self.errors += 1
+        self.latency.record(elapsed_ms)
+
+    def as_dict(self):
+        return dict({"requests": self.latency.count, "errors": self.errors}, **self.latency.as_dict())
+
+
+class HttpClient:
+    """共用的對外 HTTP 用戶端
+
+    所有請求共用同一個 requests.Session，每個主機第一次連線時掛上自己的
+    HTTPAdapter（連接池），之後的請求可重用 TCP/TLS 連線。
+    每個請求都有連線與讀取逾時，GET 等冪等請求遇到連線錯誤、逾時、429 或 5xx
+    時以指數退避重試，並依主機記錄延遲直方圖（重試算在同一個請求內）。
+    逾時與重試次數可在單次請求覆寫，例如有時限的查詢只等一次、不重試。
+    """
+
+    def __init__(self, connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 max_retries=HTTP_MAX_RETRIES, backoff_factor=HTTP_BACKOFF_FACTOR,
+                 pool_size=HTTP_POOL_SIZE):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt, response=None):
+        """第 attempt 次重試前等待的秒數，回應有 Retry-After（秒數）時依其指示"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.strip().isdigit():
+            return float(retry_after)
+        return self.backoff_factor * (2 ** attempt)
+
+    def _host_stats(self, url):
+        """返回主機的統計資料，第一次遇到該主機時為它掛上專用的連接池"""
+        parts = urlsplit(url)
+        host = parts.netloc
+        with self._lock:
+            stats = self._hosts.get(host)
+            if stats is None:
+                # 重試由 request() 處理，才能依單次請求調整次數
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                self.session.mount(f"{parts.scheme}://{host}/", adapter)
+                stats = self._hosts[host] = _HostStats()
+            return stats
+
+    def request(self, method, url, timeout=None, retries=None, **kwargs):
+        """發送請求
+
+        timeout 未指定時使用預設的 (連線, 讀取) 逾時；retries 未指定時使用 max_retries，
+        只有冪等的方法會重試。
+        """
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.max_retries if retries is None else retries
+        attempts = 1 + (max(0, retries) if method.upper() in RETRY_METHODS else 0)
+        stats = self._host_stats(url)
+        start = time.perf_counter()
+        ok = False
+        try:
+            for attempt in range(attempts):
+                last = attempt == attempts - 1
+                try:
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if last:
+                        raise
+                    logger.warning(f"{method} {url} 失敗，重試中: {e}")
+                    time.sleep(self._backoff(attempt))
+                    continue
+                if response.status_code in RETRY_STATUSES and not last:
+                    delay = self._backoff(attempt, response)
+                    response.close()
+                    time.sleep(delay)
+                    continue
+                ok = response.status_code < 500
+                return response
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                stats.record(elapsed_ms, ok)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def metrics(self):
+        """返回各上游主機的請求統計"""
+        with self._lock:
+            return {host: stats.as_dict() for host, stats in self._hosts.items()}
+
+
+# 整個程式共用的用戶端
+http_client = HttpClient()
+
+
+def get(url, **kwargs):
+    """以共用用戶端發送 GET 請求"""
+    return http_client.get(url, **kwargs)
+
+
+def metrics():
+    return http_client.metrics()
@@ -0,0 +1,29 @@
+import bisect
+
+
+class LatencyHistogram:
+    """延遲的次數、平均、最大值與直方圖（非線程安全，由呼叫端加鎖）
+
+    buckets_ms 為各區間的上限（毫秒），最後另有一格記錄超過最大上限的延遲。
+    """
+
+    def __init__(self, buckets_ms):
+        self.buckets_ms = tuple(buckets_ms)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(self.buckets_ms) + 1)
+
+    def record(self, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect.bisect_left(self.buckets_ms, elapsed_ms)] += 1
+
+    def as_dict(self):
+        labels = [f"<={bound}ms" for bound in self.buckets_ms] + [f">{self.buckets_ms[-1]}ms"]
+        return {
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "latency_histogram": dict(zip(labels, self.buckets)),
+        }
@@ -1,13 +1,15 @@
 from linebot.models import RichMenu, RichMenuArea, RichMenuBounds, RichMenuSize
 from linebot.models import MessageAction, URIAction
-from PIL import Image, ImageDraw, ImageFont
 import os
 import logging
+from utils.fonts import font_registry
 
 logger = logging.getLogger(__name__)
 
 def create_rich_menu_image():
     """創建Rich Menu圖片"""
+    from PIL import Image, ImageDraw
+
     try:
         img = Image.new('RGB', (2500, 1686), (255, 255, 255))
         draw = ImageDraw.Draw(img)
@@ -19,11 +21,9 @@ def create_rich_menu_image():
         draw.line([(1250, 0), (1250, 1686)], fill=(200, 200, 200), width=5)
         draw.line([(1875, 0), (1875, 1686)], fill=(200, 200, 200), width=5)
         
-        # 嘗試加載字體
-        try:
-            font = ImageFont.truetype("Arial.ttf", 50)
-        except IOError:
-            font = ImageFont.load_default()
+        # 使用共用的中文字體
+        font_size = 50
+        font = font_registry.get_font(font_size)
         
         # 添加文字
         menu_items = [
@@ -43,10 +43,7 @@ def create_rich_menu_image():
         
         for text, x, y in menu_items:
             # 計算文字寬度以居中顯示
-            if hasattr(draw, 'textlength'):
-                text_width = draw.textlength(text, font=font)
-            else:
-                text_width = font.getsize(text)[0]
+            text_width, _ = font_registry.text_size(text, font_size)
             
             draw.text((x - text_width // 2, y), text, fill=(50, 50, 50), font=font)
         
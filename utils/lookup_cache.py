@@ -0,0 +1,177 @@
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 每寫入這麼多筆就清理一次磁碟上過期的項目
+PURGE_EVERY = 200
+
+
+def normalize_query(query):
+    """查詢字串正規化：全形轉半形、合併空白
+
+    不轉小寫：上游查詢區分大小寫（例如維基百科的 NASA 與 nasa），
+    快取鍵必須與實際送出的查詢相同。
+    """
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', query)).strip()
+
+
+class LookupCache:
+    """外部查詢結果的 LRU 快取，每筆項目有各自的存活時間
+
+    找不到結果（None）也會快取，但使用較短的 negative_ttl；
+    查詢發生錯誤時不快取，下次仍會重新查詢。
+    指定 path 時同時寫入 SQLite 檔案，重新啟動後仍可使用。
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_entries=512, ttl=86400, negative_ttl=3600, path=None):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self._stats = {
+            "hits": 0,
+            "negative_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "errors": 0,
+        }
+
+    # ---- SQLite 持久化 ----
+
+    def _connection(self):
+        """需在持有 _db_lock 時呼叫，第一次使用時才開啟資料庫"""
+        if self._db is None and self.path:
+            try:
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS lookup_cache ("
+                    "source TEXT NOT NULL, query TEXT NOT NULL, value TEXT, expires_at REAL NOT NULL, "
+                    "PRIMARY KEY (source, query))"
+                )
+                self._db.execute("DELETE FROM lookup_cache WHERE expires_at < ?", (time.time(),))
+                self._db.commit()
+            except Exception as e:
+                logger.error(f"開啟查詢快取檔案 {self.path} 失敗，僅使用記憶體快取: {e}")
+                self.path = None
+                self._db = None
+        return self._db
+
+    def _load_from_disk(self, key):
+        with self._db_lock:
+            db = self._connection()
+            if db is None:
+                return self._MISSING
+            try:
+                row = db.execute(
+                    "SELECT value, expires_at FROM lookup_cache WHERE source = ? AND query = ?", key
+                ).fetchone()
+            except Exception as e:
+                logger.error(f"讀取查詢快取失敗: {e}")
+                return self._MISSING
+        if row is None or row[1] < time.time():
+            return self._MISSING
+        return row[1], json.loads(row[0]) if row[0] is not None else None
+
+    def _save_to_disk(self, key, expires_at, value):
+        with self._db_lock:
+            db = self._connection()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO lookup_cache (source, query, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (key[0], key[1], json.dumps(value, ensure_ascii=False) if value is not None else None, expires_at)
+                )
+                self._writes += 1
+                if self._writes % PURGE_EVERY == 0:
+                    db.execute("DELETE FROM lookup_cache WHERE expires_at < ?", (time.time(),))
+                db.commit()
+            except Exception as e:
+                logger.error(f"寫入查詢快取失敗: {e}")
+
+    # ---- 快取操作 ----
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get(self, source, query):
+        """返回快取的結果；沒有快取時返回 LookupCache._MISSING"""
+        key = (source, normalize_query(query))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits" if value is not None else "negative_hits"] += 1
+                    return value
+                del self._entries[key]
+                self._stats["expired"] += 1
+
+        entry = self._load_from_disk(key)
+        if entry is self._MISSING:
+            self._count("misses")
+            return self._MISSING
+        self._count("disk_hits")
+        self._remember(key, *entry)
+        return entry[1]
+
+    def _remember(self, key, expires_at, value):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def put(self, source, query, value):
+        """存入查詢結果，value 為 None 表示找不到"""
+        key = (source, normalize_query(query))
+        expires_at = time.time() + (self.ttl if value is not None else self.negative_ttl)
+        self._remember(key, expires_at, value)
+        self._save_to_disk(key, expires_at, value)
+
+    def get_or_fetch(self, source, query, fetch):
+        """先查快取，沒有時以正規化後的查詢呼叫 fetch 並存入結果；fetch 拋出例外時返回 None 且不快取"""
+        query = normalize_query(query)
+        value = self.get(source, query)
+        if value is not self._MISSING:
+            return value
+        try:
+            value = fetch(query)
+        except Exception as e:
+            self._count("errors")
+            logger.error(f"{source} 查詢失敗: {e}")
+            return None
+        self.put(source, query, value)
+        return value
+
+    def metrics(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["negative_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hit_rate = (lookups - self._stats["misses"]) / lookups if lookups else 0.0
+            return dict(
+                self._stats,
+                size=len(self._entries),
+                max_entries=self.max_entries,
+                hit_rate=round(hit_rate, 3),
+                persistent=bool(self.path),
+            )
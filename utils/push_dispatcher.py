@@ -0,0 +1,196 @@
+import time
+import uuid
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from linebot.exceptions import LineBotApiError
+from linebot.models import TextSendMessage
+
+logger = logging.getLogger(__name__)
+
+# LINE multicast 單次最多 500 位收件者
+MULTICAST_LIMIT = 500
+
+# LINE 文字訊息的長度上限
+MAX_TEXT_LENGTH = 5000
+
+
+class RateLimiter:
+    """令牌桶限速器，多條線程共用"""
+
+    def __init__(self, rate_per_second, burst=None):
+        self.rate = float(rate_per_second)
+        self.capacity = float(burst or max(1, rate_per_second))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一個令牌，不足時等待"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def coalesce_messages(messages):
+    """把同一位使用者的多則訊息合併成一則（超過長度上限時再切開）
+
+    messages 為 (user_id, text) 的序列，返回 {user_id: [text, ...]}，保持原本順序。
+    """
+    by_user = {}
+    for user_id, text in messages:
+        if not user_id or not text:
+            continue
+        by_user.setdefault(user_id, []).append(text)
+
+    combined = {}
+    for user_id, texts in by_user.items():
+        parts = []
+        current = ""
+        for text in texts:
+            candidate = f"{current}\n\n{text}" if current else text
+            if current and len(candidate) > MAX_TEXT_LENGTH:
+                parts.append(current)
+                current = text
+            else:
+                current = candidate
+        parts.append(current)
+        combined[user_id] = [part[:MAX_TEXT_LENGTH] for part in parts]
+    return combined
+
+
+class PushDispatcher:
+    """排程問題與任務提醒的批次推播
+
+    同一位使用者的多則訊息會先合併，內容相同的訊息再以 multicast
+    一次送給最多 500 位使用者；各批次在線程池中並行發送，
+    以令牌桶限制每秒請求數，遇到 429、5xx、逾時或連線錯誤時以指數退避重試。
+    每個批次產生一個 X-Line-Retry-Key 並在重試時沿用，第一次其實已送達時
+    LINE 會回應 409 而不會重複發送。
+    """
+
+    def __init__(self, line_bot_api, max_workers=4, rate_per_second=10, max_retries=3, backoff_base=1.0):
+        self.line_bot_api = line_bot_api
+        self.max_workers = max(1, max_workers)
+        self.limiter = RateLimiter(rate_per_second)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "recipients": 0,
+            "retries": 0,
+            "failed_requests": 0,
+            "failed_recipients": 0,
+        }
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self._stats[key] += value
+
+    def _build_batches(self, messages):
+        """返回 [(收件者列表, 文字)]，相同內容的訊息分組並依上限切批"""
+        recipients_by_text = {}
+        for user_id, texts in coalesce_messages(messages).items():
+            for text in texts:
+                recipients_by_text.setdefault(text, []).append(user_id)
+
+        batches = []
+        for text, user_ids in recipients_by_text.items():
+            for i in range(0, len(user_ids), MULTICAST_LIMIT):
+                batches.append((user_ids[i:i + MULTICAST_LIMIT], text))
+        return batches
+
+    @staticmethod
+    def _is_retryable(error):
+        status = getattr(error, 'status_code', None)
+        return status == 429 or (status is not None and status >= 500)
+
+    def _retry_delay(self, error, attempt):
+        headers = getattr(error, 'headers', None) or {}
+        retry_after = headers.get('Retry-After') if hasattr(headers, 'get') else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.backoff_base * (2 ** attempt) + random.uniform(0, self.backoff_base)
+
+    def _send_batch(self, user_ids, text):
+        message = TextSendMessage(text=text)
+        # 同一批次的所有嘗試使用同一個重試鍵
+        retry_key = str(uuid.uuid4())
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                if len(user_ids) == 1:
+                    self.line_bot_api.push_message(user_ids[0], message, retry_key=retry_key)
+                else:
+                    self.line_bot_api.multicast(user_ids, message, retry_key=retry_key)
+                self._count(requests=1, recipients=len(user_ids))
+                return True
+            except LineBotApiError as e:
+                self._count(requests=1)
+                if attempt > 0 and e.status_code == 409:
+                    # 先前的嘗試已被接受，這次重試沒有重複發送
+                    self._count(recipients=len(user_ids))
+                    return True
+                if attempt < self.max_retries and self._is_retryable(e):
+                    delay = self._retry_delay(e, attempt)
+                    logger.warning(f"推播失敗 (狀態 {e.status_code})，{delay:.1f} 秒後重試")
+                    self._count(retries=1)
+                    time.sleep(delay)
+                    continue
+                logger.error(f"推播失敗: {e}")
+                break
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                self._count(requests=1)
+                if attempt < self.max_retries:
+                    delay = self._retry_delay(e, attempt)
+                    logger.warning(f"推播逾時或連線失敗，{delay:.1f} 秒後重試: {e}")
+                    self._count(retries=1)
+                    time.sleep(delay)
+                    continue
+                logger.error(f"推播失敗: {e}")
+                break
+            except Exception as e:
+                self._count(requests=1)
+                logger.error(f"推播失敗: {e}")
+                break
+
+        self._count(failed_requests=1, failed_recipients=len(user_ids))
+        return False
+
+    def send(self, messages):
+        """發送 (user_id, text) 訊息，返回成功送達的人次"""
+        if not self.line_bot_api:
+            logger.error("LINE Bot API 未初始化，無法發送訊息")
+            return 0
+
+        batches = self._build_batches(messages)
+        if not batches:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as executor:
+            results = list(executor.map(lambda batch: self._send_batch(*batch), batches))
+
+        delivered = sum(len(user_ids) for (user_ids, _), ok in zip(batches, results) if ok)
+        logger.info(f"推播完成：{len(batches)} 個批次，送達 {delivered} 人次")
+        return delivered
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,111 @@
+import io
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Rich Menu 圖片的磁碟快取目錄與記憶體中保留的圖片數
+RICH_MENU_CACHE_DIR = os.environ.get('RICH_MENU_CACHE_DIR', 'rich_menu_cache')
+RICH_MENU_CACHE_ENTRIES = int(os.environ.get('RICH_MENU_CACHE_ENTRIES', '8'))
+
+# 繪製程式改變時調高版本，讓舊的快取圖片失效
+RENDER_VERSION = 2
+
+
+def design_key(name, params):
+    """以設計名稱與參數（標籤、位置、顏色、字體、隨機種子等）計算快取鍵"""
+    payload = json.dumps(
+        {"version": RENDER_VERSION, "name": name, "params": params},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """以設計參數為鍵的 PNG 圖片快取
+
+    相同參數的圖片只繪製與編碼一次，PNG 內容保存在記憶體（LRU）與磁碟上，
+    預覽與上傳共用同一份位元組；重新啟動後也能直接從磁碟讀回。
+    繪製結果必須只取決於參數（裝飾用的亂數需使用參數中的固定種子）。
+    """
+
+    def __init__(self, cache_dir=RICH_MENU_CACHE_DIR, max_entries=RICH_MENU_CACHE_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "renders": 0}
+
+    def _path(self, name, key):
+        return os.path.join(self.cache_dir, f"{name}-{key}.png") if self.cache_dir else None
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _read_disk(self, path):
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError as e:
+            logger.warning(f"讀取快取圖片 {path} 失敗: {e}")
+            return None
+
+    def _write_disk(self, path, data):
+        """寫入暫存檔再改名，避免其他線程讀到寫到一半的圖片"""
+        if not path:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix='.render.', suffix='.tmp', dir=self.cache_dir)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"寫入快取圖片 {path} 失敗: {e}")
+
+    def get_or_render(self, name, params, render):
+        """返回設計的 PNG 位元組，快取中沒有時呼叫 render() 取得 PIL 圖片並編碼"""
+        key = design_key(name, params)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return data
+
+        path = self._path(name, key)
+        data = self._read_disk(path)
+        if data is not None:
+            with self._lock:
+                self._stats["disk_hits"] += 1
+            self._remember(key, data)
+            return data
+
+        buffer = io.BytesIO()
+        render().save(buffer, format='PNG')
+        data = buffer.getvalue()
+        with self._lock:
+            self._stats["renders"] += 1
+        self._remember(key, data)
+        self._write_disk(path, data)
+        logger.info(f"已繪製 Rich Menu 圖片 {name} ({len(data)} bytes)")
+        return data
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+
+# Rich Menu 各種設計共用的快取
+rich_menu_cache = RenderCache()
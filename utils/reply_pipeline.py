@@ -0,0 +1,133 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from linebot.models import TextSendMessage
+
+from utils.latency import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# 處理延遲直方圖的區間上限（毫秒），最後一格為超過最大值的訊息
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# 沒有任何處理函數回覆的訊息在統計中的名稱
+UNMATCHED = 'unmatched'
+
+
+class _HandlerStats:
+    """單一處理函數的訊息數、逾時改用推播的次數與延遲直方圖"""
+
+    def __init__(self):
+        self.deferred = 0
+        self.errors = 0
+        self.latency = LatencyHistogram(LATENCY_BUCKETS_MS)
+
+    def record(self, elapsed_ms, deferred, ok):
+        if deferred:
+            self.deferred += 1
+        if not ok:
+            self.errors += 1
+        self.latency.record(elapsed_ms)
+
+    def as_dict(self):
+        return dict(
+            {"messages": self.latency.count, "deferred": self.deferred, "errors": self.errors},
+            **self.latency.as_dict()
+        )
+
+
+class ReplyPipeline:
+    """在回覆權杖的時限內回覆訊息，逾時則先回覆處理中、完成後再推播
+
+    訊息交給工作線程以命令路由器處理，等待時間從事件抵達（event.timestamp）起算，
+    但至少等待 min_wait 秒，重送或排隊過久的舊事件也能直接回覆即時完成的命令。
+    處理函數在時限內完成就用回覆權杖直接回覆；逾時且仍在執行時先用權杖回覆
+    processing_text，避免權杖失效而遺失回覆，結果完成後再以推播送出。
+    每個處理函數的延遲與改用推播的次數都會記錄下來。
+    """
+
+    def __init__(self, line_bot_api, router, push_dispatcher, budget=5.0, workers=4,
+                 fallback_text=None, processing_text="⏳ 處理中，完成後會再傳給你…", min_wait=0.3):
+        self.line_bot_api = line_bot_api
+        self.router = router
+        self.push_dispatcher = push_dispatcher
+        self.budget = budget
+        self.min_wait = min_wait
+        self.fallback_text = fallback_text
+        self.processing_text = processing_text
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='reply')
+        self._handlers = {}
+        self._lock = threading.Lock()
+
+    def _remaining(self, event_timestamp):
+        """返回回覆時限剩餘的秒數，event_timestamp 為 LINE 事件的毫秒時間戳"""
+        if not event_timestamp:
+            return self.budget
+        elapsed = time.time() - event_timestamp / 1000.0
+        return self.budget - max(0.0, elapsed)
+
+    def _record(self, name, elapsed_ms, deferred, ok):
+        with self._lock:
+            stats = self._handlers.get(name)
+            if stats is None:
+                stats = self._handlers[name] = _HandlerStats()
+            stats.record(elapsed_ms, deferred, ok)
+
+    def _run(self, text):
+        """以命令路由器處理訊息，返回 (處理函數名稱, 回覆文字, 耗時毫秒, 是否成功)"""
+        start = time.perf_counter()
+        try:
+            name, response = self.router.dispatch(text)
+            ok = True
+        except Exception as e:
+            logger.error(f"處理訊息 '{text}' 時發生錯誤: {e}")
+            name, response, ok = None, None, False
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return name or UNMATCHED, response or self.fallback_text, elapsed_ms, ok
+
+    def _reply(self, reply_token, text):
+        try:
+            self.line_bot_api.reply_message(reply_token, TextSendMessage(text=text))
+            return True
+        except Exception as e:
+            logger.error(f"回覆訊息失敗: {e}")
+            return False
+
+    def _push_result(self, user_id, future):
+        name, response, elapsed_ms, ok = future.result()
+        self._record(name, elapsed_ms, True, ok)
+        logger.info(f"處理函數 {name} 耗時 {elapsed_ms:.0f}ms，超過回覆時限，改用推播")
+        if not response:
+            return
+        if not user_id:
+            logger.error("沒有使用者 ID，無法推播延遲的回覆")
+            return
+        self.push_dispatcher.send([(user_id, response)])
+
+    def process(self, text, user_id, reply_token, event_timestamp=None):
+        """處理一則文字訊息，返回是否在時限內直接回覆"""
+        future = self.executor.submit(self._run, text)
+        try:
+            name, response, elapsed_ms, ok = future.result(
+                timeout=max(self.min_wait, self._remaining(event_timestamp))
+            )
+        except TimeoutError:
+            if not future.done():
+                # 處理函數確實還在執行才改用推播，避免浪費推播額度
+                self._reply(reply_token, self.processing_text)
+                future.add_done_callback(lambda done: self._push_result(user_id, done))
+                return False
+            name, response, elapsed_ms, ok = future.result()
+
+        self._record(name, elapsed_ms, False, ok)
+        if response:
+            self._reply(reply_token, response)
+        return True
+
+    def metrics(self):
+        """返回各處理函數的延遲統計"""
+        with self._lock:
+            handlers = {name: stats.as_dict() for name, stats in self._handlers.items()}
+        return {"budget_seconds": self.budget, "min_wait_seconds": self.min_wait, "handlers": handlers}
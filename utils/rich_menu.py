@@ -3,8 +3,10 @@ import logging
 from linebot import LineBotApi
 from linebot.models import RichMenu, RichMenuArea, RichMenuSize, RichMenuBounds, URIAction, MessageAction
 from linebot.exceptions import LineBotApiError
-from PIL import Image, ImageDraw, ImageFont
 import io
+import random
+from utils.render_cache import rich_menu_cache
+from utils.fonts import font_registry
 
 # 設定日誌
 logging.basicConfig(
@@ -16,103 +18,152 @@ logger = logging.getLogger(__name__)
 # 從環境變數獲取LINE Bot API密鑰
 LINE_CHANNEL_ACCESS_TOKEN = os.environ.get('LINE_CHANNEL_ACCESS_TOKEN', '')
 
-def create_minimal_design_rich_menu():
+# 選單尺寸與六個區域的標籤
+MENU_SIZE = (2500, 1686)
+MENU_LABELS = ["主題地圖", "呼叫角色", "今日任務", "問答挑戰", "專注訓練", "AI助手"]
+
+# 裝飾點使用固定的隨機種子，相同參數畫出的圖片完全相同，才能快取
+DECORATION_SEED = 20240101
+
+# 簡約線條風格
+MINIMAL_DESIGN = {
+    "background": (25, 25, 25, 255),
+    "line_color": (255, 255, 255, 100),
+    "line_width": 3,
+    "circle_radius": 200,
+    "circle_color": (255, 255, 255, 150),
+    "circle_width": 5,
+    "dot_color": (255, 255, 255, 200),
+    "label_color": (255, 255, 255, 255),
+    "label_offset": 100,
+    "font_size": 60,
+    "decoration_color": (255, 255, 255),
+    "decoration_count": 50,
+    "decoration_size": (1, 3),
+}
+
+# 金色主題
+GOLD_DESIGN = {
+    "background": (0, 20, 40, 255),
+    "line_color": (200, 180, 120, 100),
+    "line_width": 2,
+    "circle_radius": 150,
+    "circle_color": (220, 200, 140, 255),
+    "circle_width": 4,
+    "label_color": (220, 200, 140, 255),
+    "label_offset": 40,
+    "font_size": 60,
+    "decoration_color": (220, 200, 140),
+    "decoration_count": 100,
+    "decoration_size": (1, 2),
+}
+
+def _menu_positions(width, height):
+    """六個區域的中心點（兩欄三列）"""
+    return [
+        (width//4, height//6), (width*3//4, height//6),
+        (width//4, height//2), (width*3//4, height//2),
+        (width//4, height*5//6), (width*3//4, height*5//6)
+    ]
+
+def design_params(design, seed=DECORATION_SEED):
+    """組合繪製一種設計所需的全部參數，也是圖片快取的鍵"""
+    width, height = MENU_SIZE
+    return dict(
+        design,
+        size=MENU_SIZE,
+        labels=MENU_LABELS,
+        positions=_menu_positions(width, height),
+        font_path=font_registry.font_path,
+        seed=seed
+    )
+
+def _draw_label(draw, label, center_x, y, params):
+    """以中心點水平置中繪製標籤"""
+    try:
+        font = font_registry.get_font(params["font_size"], params["font_path"])
+        text_width, _ = font_registry.text_size(label, params["font_size"], params["font_path"])
+        draw.text((center_x - text_width // 2, y), label, fill=params["label_color"], font=font)
+    except Exception as e:
+        logger.error(f"繪製文字時出錯: {e}")
+
+def _draw_decorations(draw, params):
+    """以固定種子的亂數畫出裝飾點"""
+    width, height = params["size"]
+    rng = random.Random(params["seed"])
+    min_size, max_size = params["decoration_size"]
+    for _ in range(params["decoration_count"]):
+        x = rng.randint(0, width)
+        y = rng.randint(0, height)
+        size = rng.randint(min_size, max_size)
+        opacity = rng.randint(50, 150)
+        draw.ellipse(
+            [(x-size, y-size), (x+size, y+size)],
+            fill=tuple(params["decoration_color"]) + (opacity,)
+        )
+
+def create_minimal_design_rich_menu(params=None):
     """創建簡約線條風格的Rich Menu圖像"""
-    width, height = 2500, 1686
+    # Pillow 只在繪製選單圖片時才載入，不拖慢冷啟動
+    from PIL import Image, ImageDraw
+
+    params = params or design_params(MINIMAL_DESIGN)
+    width, height = params["size"]
     # 黑色背景
-    image = Image.new('RGBA', (width, height), (25, 25, 25, 255))
+    image = Image.new('RGBA', (width, height), params["background"])
     draw = ImageDraw.Draw(image)
     
     # 劃分六個區域，只用線條
-    cell_width = width // 2
     cell_height = height // 3
     
     # 水平線
     for i in range(1, 3):
         y = i * cell_height
-        draw.line([(0, y), (width, y)], fill=(255, 255, 255, 100), width=3)
+        draw.line([(0, y), (width, y)], fill=params["line_color"], width=params["line_width"])
     
     # 垂直線
-    draw.line([(width//2, 0), (width//2, height)], fill=(255, 255, 255, 100), width=3)
-    
-    # 定義每個區域的圖標和標籤
-    icons = ["🗺️", "👤", "📋", "❓", "⏱️", "🤖"]
-    labels = ["主題地圖", "呼叫角色", "今日任務", "問答挑戰", "專注訓練", "AI助手"]
+    draw.line([(width//2, 0), (width//2, height)], fill=params["line_color"], width=params["line_width"])
     
-    positions = [
-        (width//4, height//6), (width*3//4, height//6),
-        (width//4, height//2), (width*3//4, height//2),
-        (width//4, height*5//6), (width*3//4, height*5//6)
-    ]
-    
-    # 嘗試加載字體，如果失敗則使用默認字體
-    try:
-        # 嘗試找一個系統上可能存在的字體
-        font_path = None
-        for path in ["C:/Windows/Fonts/msjh.ttc", "C:/Windows/Fonts/simhei.ttf", 
-                    "/System/Library/Fonts/PingFang.ttc", "/usr/share/fonts/noto/NotoSansCJK-Regular.ttc"]:
-            if os.path.exists(path):
-                font_path = path
-                break
-        
-        # 如果找到了字體，使用它
-        if font_path:
-            label_font = ImageFont.truetype(font_path, 60)
-        else:
-            # 否則使用默認字體
-            label_font = ImageFont.load_default()
-            logger.warning("無法找到合適的中文字體，使用默認字體")
-    except Exception as e:
-        logger.error(f"加載字體時出錯: {e}")
-        label_font = ImageFont.load_default()
+    radius = params["circle_radius"]
     
     # 圓形背景和中心點標記
-    for i, (pos, icon, label) in enumerate(zip(positions, icons, labels)):
+    for pos, label in zip(params["positions"], params["labels"]):
         # 繪製圓形背景
         draw.ellipse(
-            [(pos[0]-200, pos[1]-200), (pos[0]+200, pos[1]+200)],
-            outline=(255, 255, 255, 150),
-            width=5
+            [(pos[0]-radius, pos[1]-radius), (pos[0]+radius, pos[1]+radius)],
+            outline=params["circle_color"],
+            width=params["circle_width"]
         )
         
         # 繪製中心點
         draw.ellipse(
             [(pos[0]-10, pos[1]-10), (pos[0]+10, pos[1]+10)],
-            fill=(255, 255, 255, 200)
+            fill=params["dot_color"]
         )
         
         # 繪製標籤
-        try:
-            if hasattr(draw, 'textbbox'):  # PIL 8.0.0 以上版本
-                bbox = draw.textbbox((0, 0), label, font=label_font)
-                text_width = bbox[2] - bbox[0]
-                text_height = bbox[3] - bbox[1]
-            else:  # 舊版本
-                text_width, text_height = draw.textsize(label, font=label_font)
-            
-            draw.text(
-                (pos[0] - text_width // 2, pos[1] + 100),
-                label,
-                fill=(255, 255, 255, 255),
-                font=label_font
-            )
-        except Exception as e:
-            logger.error(f"繪製文字時出錯: {e}")
+        _draw_label(draw, label, pos[0], pos[1] + params["label_offset"], params)
     
     # 添加細小點作為裝飾
-    for _ in range(50):
-        import random
-        x = random.randint(0, width)
-        y = random.randint(0, height)
-        size = random.randint(1, 3)
-        opacity = random.randint(50, 150)
-        draw.ellipse(
-            [(x-size, y-size), (x+size, y+size)],
-            fill=(255, 255, 255, opacity)
-        )
+    _draw_decorations(draw, params)
     
     return image
 
+def render_rich_menu_png(name):
+    """返回指定設計（minimal 或 gold）的 PNG 位元組，參數相同時直接使用快取"""
+    if name == 'gold':
+        params = design_params(GOLD_DESIGN)
+        render = lambda: create_gold_design_rich_menu(params)
+    else:
+        params = design_params(MINIMAL_DESIGN)
+        render = lambda: create_minimal_design_rich_menu(params)
+    return rich_menu_cache.get_or_render(f"rich_menu_{name}", params, render)
+
+def _save_png(data, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
 def create_rich_menu_object():
     """創建Rich Menu物件"""
     rich_menu = RichMenu(
@@ -163,16 +214,11 @@ def create_and_apply_rich_menu():
         rich_menu_id = line_bot_api.create_rich_menu(rich_menu)
         logger.info(f"已創建Rich Menu，ID: {rich_menu_id}")
         
-        # 創建圖像
-        image = create_minimal_design_rich_menu()
-        
-        # 將PIL圖像轉換為字節流
-        image_bytes = io.BytesIO()
-        image.save(image_bytes, format='PNG')
-        image_bytes.seek(0)
+        # 取得圖像（與預覽共用快取的 PNG）
+        png = render_rich_menu_png('minimal')
         
         # 上傳圖像
-        line_bot_api.set_rich_menu_image(rich_menu_id, 'image/png', image_bytes)
+        line_bot_api.set_rich_menu_image(rich_menu_id, 'image/png', io.BytesIO(png))
         logger.info(f"已上傳Rich Menu圖像")
         
         # 設為默認選單
@@ -180,8 +226,7 @@ def create_and_apply_rich_menu():
         logger.info(f"已設置為默認Rich Menu")
         
         # 保存圖像到本地（可選）
-        os.makedirs('resources/images', exist_ok=True)
-        image.save('resources/images/rich_menu_minimal.png')
+        _save_png(png, 'resources/images/rich_menu_minimal.png')
         
         return f"Rich Menu 創建成功，ID: {rich_menu_id}"
     
@@ -221,15 +266,12 @@ def delete_all_rich_menus():
 def preview_rich_menu():
     """生成Rich Menu預覽圖像，保存到本地但不上傳到LINE"""
     try:
-        # 創建圖像
-        image = create_minimal_design_rich_menu()
-        
-        # 確保目錄存在
-        os.makedirs('resources/images', exist_ok=True)
+        # 取得圖像（參數未改變時不重新繪製）
+        png = render_rich_menu_png('minimal')
         
         # 保存圖像到本地
         preview_path = 'resources/images/rich_menu_preview.png'
-        image.save(preview_path)
+        _save_png(png, preview_path)
         
         logger.info(f"Rich Menu預覽已保存到: {preview_path}")
         return f"Rich Menu預覽已保存到: {preview_path}"
@@ -238,94 +280,47 @@ def preview_rich_menu():
         logger.error(f"創建Rich Menu預覽時出錯: {e}")
         return f"錯誤：{e}"
 
-def create_gold_design_rich_menu():
+def create_gold_design_rich_menu(params=None):
     """創建金色主題的Rich Menu圖像，與您分享的圖片風格相似"""
-    width, height = 2500, 1686
+    from PIL import Image, ImageDraw
+
+    params = params or design_params(GOLD_DESIGN)
+    width, height = params["size"]
     # 深藍背景
-    image = Image.new('RGBA', (width, height), (0, 20, 40, 255))
+    image = Image.new('RGBA', (width, height), params["background"])
     draw = ImageDraw.Draw(image)
     
     # 劃分六個區域
-    cell_width = width // 2
     cell_height = height // 3
     
     # 水平線
     for i in range(1, 3):
         y = i * cell_height
-        draw.line([(0, y), (width, y)], fill=(200, 180, 120, 100), width=2)
+        draw.line([(0, y), (width, y)], fill=params["line_color"], width=params["line_width"])
     
     # 垂直線
-    draw.line([(width//2, 0), (width//2, height)], fill=(200, 180, 120, 100), width=2)
-    
-    # 定義每個區域的圖標和標籤
-    labels = ["主題地圖", "呼叫角色", "今日任務", "問答挑戰", "專注訓練", "AI助手"]
-    
-    positions = [
-        (width//4, height//6), (width*3//4, height//6),
-        (width//4, height//2), (width*3//4, height//2),
-        (width//4, height*5//6), (width*3//4, height*5//6)
-    ]
+    draw.line([(width//2, 0), (width//2, height)], fill=params["line_color"], width=params["line_width"])
     
-    # 嘗試加載字體
-    try:
-        font_path = None
-        for path in ["C:/Windows/Fonts/msjh.ttc", "C:/Windows/Fonts/simhei.ttf", 
-                    "/System/Library/Fonts/PingFang.ttc", "/usr/share/fonts/noto/NotoSansCJK-Regular.ttc"]:
-            if os.path.exists(path):
-                font_path = path
-                break
-        
-        if font_path:
-            label_font = ImageFont.truetype(font_path, 60)
-        else:
-            label_font = ImageFont.load_default()
-            logger.warning("無法找到合適的中文字體，使用默認字體")
-    except Exception as e:
-        logger.error(f"加載字體時出錯: {e}")
-        label_font = ImageFont.load_default()
+    circle_radius = params["circle_radius"]
     
     # 繪製每個項目
-    for i, (pos, label) in enumerate(zip(positions, labels)):
+    for i, (pos, label) in enumerate(zip(params["positions"], params["labels"])):
         # 繪製金色圓形
-        circle_radius = 150
         draw.ellipse(
             [(pos[0]-circle_radius, pos[1]-circle_radius), 
              (pos[0]+circle_radius, pos[1]+circle_radius)],
-            outline=(220, 200, 140, 255),
-            width=4
+            outline=params["circle_color"],
+            width=params["circle_width"]
         )
         
         # 根據不同選項添加不同的圖標
         draw_icon(draw, i, pos, circle_radius)
         
         # 繪製標籤
-        try:
-            if hasattr(draw, 'textbbox'):  # PIL 8.0.0 以上版本
-                bbox = draw.textbbox((0, 0), label, font=label_font)
-                text_width = bbox[2] - bbox[0]
-            else:  # 舊版本
-                text_width, _ = draw.textsize(label, font=label_font)
-            
-            draw.text(
-                (pos[0] - text_width // 2, pos[1] + circle_radius + 40),
-                label,
-                fill=(220, 200, 140, 255),
-                font=label_font
-            )
-        except Exception as e:
-            logger.error(f"繪製文字時出錯: {e}")
+        _draw_label(draw, label, pos[0], pos[1] + circle_radius + params["label_offset"], params)
     
     # 添加細小星點作為裝飾
-    for _ in range(100):
-        import random
-        x = random.randint(0, width)
-        y = random.randint(0, height)
-        size = random.randint(1, 2)
-        opacity = random.randint(50, 150)
-        draw.ellipse(
-            [(x-size, y-size), (x+size, y+size)],
-            fill=(220, 200, 140, opacity)
-        )
+    _draw_decorations(draw, params)
     
     return image
 
@@ -532,15 +527,12 @@ def draw_icon(draw, icon_index, position, radius):
 def preview_gold_rich_menu():
     """生成金色風格Rich Menu預覽圖像"""
     try:
-        # 創建圖像
-        image = create_gold_design_rich_menu()
-        
-        # 確保目錄存在
-        os.makedirs('resources/images', exist_ok=True)
+        # 取得圖像（參數未改變時不重新繪製）
+        png = render_rich_menu_png('gold')
         
         # 保存圖像到本地
         preview_path = 'resources/images/rich_menu_gold_preview.png'
-        image.save(preview_path)
+        _save_png(png, preview_path)
         
         logger.info(f"金色風格Rich Menu預覽已保存到: {preview_path}")
         return f"金色風格Rich Menu預覽已保存到: {preview_path}"
@@ -563,16 +555,11 @@ def create_and_apply_gold_rich_menu():
         rich_menu_id = line_bot_api.create_rich_menu(rich_menu)
         logger.info(f"已創建Rich Menu，ID: {rich_menu_id}")
         
-        # 創建圖像
-        image = create_gold_design_rich_menu()
-        
-        # 將PIL圖像轉換為字節流
-        image_bytes = io.BytesIO()
-        image.save(image_bytes, format='PNG')
-        image_bytes.seek(0)
+        # 取得圖像（與預覽共用快取的 PNG）
+        png = render_rich_menu_png('gold')
         
         # 上傳圖像
-        line_bot_api.set_rich_menu_image(rich_menu_id, 'image/png', image_bytes)
+        line_bot_api.set_rich_menu_image(rich_menu_id, 'image/png', io.BytesIO(png))
         logger.info(f"已上傳Rich Menu圖像")
         
         # 設為默認選單
@@ -580,8 +567,7 @@ def create_and_apply_gold_rich_menu():
         logger.info(f"已設置為默認Rich Menu")
         
         # 保存圖像到本地（可選）
-        os.makedirs('resources/images', exist_ok=True)
-        image.save('resources/images/rich_menu_gold.png')
+        _save_png(png, 'resources/images/rich_menu_gold.png')
         
         return f"金色風格Rich Menu 創建成功，ID: {rich_menu_id}"
     
@@ -0,0 +1,184 @@
+import re
+import math
+import heapq
+from collections import Counter
+
+from utils.text_utils import tokenize, tokenize_query
+
+# BM25 參數
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 倒排列表超過文件總數的 1/BITMAP_RATIO 時另存一份點陣圖，計算交集大小時使用
+BITMAP_RATIO = 64
+
+# 符合的文件數不超過此值時直接替所有符合的文件計分，較多時才用閾值演算法
+DIRECT_SCORE_MAX = 1024
+
+# 每個位元組中為 1 的位元位置
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+_NONZERO_BYTE = re.compile(rb'[^\x00]')
+
+
+def _rank_key(item):
+    """分數高的在前，同分時依文件順序"""
+    score, doc_id = item
+    return -score, doc_id
+
+
+def _popcount(bits):
+    return bits.bit_count() if hasattr(bits, 'bit_count') else bin(bits).count('1')
+
+
+def _bitmap(doc_ids, size):
+    """以 Python 整數表示的文件集合，第 doc_id 個位元為 1"""
+    buffer = bytearray((size + 7) // 8)
+    for doc_id in doc_ids:
+        buffer[doc_id >> 3] |= 1 << (doc_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _bitmap_ids(bits, size):
+    """返回點陣圖中所有為 1 的文件編號（由小到大）"""
+    data = bits.to_bytes((size + 7) // 8, 'little')
+    doc_ids = []
+    for match in _NONZERO_BYTE.finditer(data):
+        position = match.start()
+        doc_ids.extend((position << 3) + bit for bit in _BYTE_BITS[data[position]])
+    return doc_ids
+
+
+class InvertedIndex:
+    """以 BM25 排序的倒排索引
+
+    建立後不再修改，可在多個線程間共用。每個詞的倒排列表直接存放各文件的
+    BM25 分數貢獻，並依分數由高到低排好（impact-ordered）。
+    只有一個查詢詞時直接取列表的片段；多個查詢詞且有 limit 時，先以點陣圖 AND
+    計算符合的文件數，符合的文件不多就直接計分，很多時以閾值演算法（Fagin TA）
+    同時往下掃描各列表，第 k 名的分數超過各列表目前分數的總和即停止，
+    不必替所有候選文件計分。
+    """
+
+    def __init__(self, texts, k1=BM25_K1, b=BM25_B):
+        postings = {}
+        lengths = []
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, {})[doc_id] = tf
+
+        self.size = len(lengths)
+        avg_length = (sum(lengths) / self.size) if self.size else 0
+        norms = [k1 * (1 - b + b * (length / avg_length if avg_length else 0)) for length in lengths]
+        bitmap_min = max(1, self.size // BITMAP_RATIO)
+
+        # 倒排列表：詞 -> {文件編號: 該詞的 BM25 分數}
+        self._postings = {}
+        # 依分數排序的倒排列表：詞 -> ([文件編號, ...], [分數, ...])
+        self._ranked = {}
+        # 較長的倒排列表的點陣圖：詞 -> int
+        self._bitmaps = {}
+        for term, docs in postings.items():
+            idf = math.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+            impacts = {
+                doc_id: idf * tf * (k1 + 1) / (tf + norms[doc_id])
+                for doc_id, tf in docs.items()
+            }
+            self._postings[term] = impacts
+            ranked = sorted(impacts, key=lambda doc_id: (-impacts[doc_id], doc_id))
+            self._ranked[term] = (ranked, [impacts[doc_id] for doc_id in ranked])
+            if len(impacts) >= bitmap_min:
+                self._bitmaps[term] = _bitmap(impacts, self.size)
+
+    def _matches(self, terms, lists):
+        """返回 (同時包含所有查詢詞的文件數, 這些文件的編號)
+
+        符合的文件超過 DIRECT_SCORE_MAX 份時不列出編號（返回 None），改用閾值演算法排序。
+        """
+        shortest = min(range(len(lists)), key=lambda i: len(lists[i]))
+        if terms[shortest] not in self._bitmaps:
+            # 最短的列表很短，逐一檢查即可
+            others = [docs for i, docs in enumerate(lists) if i != shortest]
+            doc_ids = [doc_id for doc_id in lists[shortest] if all(doc_id in docs for docs in others)]
+            return len(doc_ids), doc_ids
+        # 最短的列表也有點陣圖，表示所有查詢詞都有
+        bits = self._bitmaps[terms[0]]
+        for term in terms[1:]:
+            bits &= self._bitmaps[term]
+        total = _popcount(bits)
+        return total, (_bitmap_ids(bits, self.size) if total <= DIRECT_SCORE_MAX else None)
+
+    def _top(self, terms, lists, k):
+        """閾值演算法：返回同時包含所有查詢詞、分數最高的 k 份文件 [(分數, doc_id), ...]"""
+        ranked = [self._ranked[term] for term in terms]
+        heap = []  # (分數, -doc_id) 的最小堆積，堆頂是目前的第 k 名
+        seen = set()
+        depth = 0
+        while True:
+            threshold = 0.0
+            for doc_ids, scores in ranked:
+                if depth >= len(doc_ids):
+                    # 任一列表已掃完：所有符合的文件都在這個列表中，已全部看過
+                    return [(score, -neg_id) for score, neg_id in heap]
+                doc_id = doc_ids[depth]
+                threshold += scores[depth]
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                score = 0.0
+                for docs in lists:
+                    impact = docs.get(doc_id)
+                    if impact is None:
+                        break
+                    score += impact
+                else:
+                    item = (score, -doc_id)
+                    if len(heap) < k:
+                        heapq.heappush(heap, item)
+                    elif item > heap[0]:
+                        heapq.heapreplace(heap, item)
+            # 還沒看過的文件在每個列表中的分數都不超過目前位置的分數
+            if len(heap) >= k and heap[0][0] > threshold:
+                return [(score, -neg_id) for score, neg_id in heap]
+            depth += 1
+
+    def search(self, query, limit=None, offset=0):
+        """返回 (符合的文件總數, [(doc_id, 分數), ...])，依分數由高到低排列"""
+        terms = tokenize_query(query)
+        if not terms:
+            return 0, []
+        offset = max(0, offset)
+        end = None if limit is None else offset + max(0, limit)
+
+        lists = []
+        for term in terms:
+            docs = self._postings.get(term)
+            if not docs:
+                return 0, []
+            lists.append(docs)
+
+        if len(lists) == 1:
+            doc_ids, scores = self._ranked[terms[0]]
+            return len(doc_ids), list(zip(doc_ids[offset:end], scores[offset:end]))
+
+        if end is not None:
+            total, doc_ids = self._matches(terms, lists)
+            if not total or end <= offset:
+                return total, []
+            if doc_ids is None:
+                top = self._top(terms, lists, end)
+            else:
+                top = [(sum(docs[doc_id] for docs in lists), doc_id) for doc_id in doc_ids]
+            ranked = heapq.nsmallest(end, top, key=_rank_key)
+            return total, [(doc_id, score) for score, doc_id in ranked[offset:end]]
+
+        lists.sort(key=len)
+        candidates = lists[0].keys()
+        for docs in lists[1:]:
+            candidates = candidates & docs.keys()
+            if not candidates:
+                return 0, []
+
+        scored = [(sum(docs[doc_id] for docs in lists), doc_id) for doc_id in candidates]
+        return len(scored), [(doc_id, score) for score, doc_id in sorted(scored, key=_rank_key)[offset:]]
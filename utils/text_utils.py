@@ -0,0 +1,48 @@
+import re
+import unicodedata
+
+# 中日韓文字沒有空白分隔，以字元 n-gram 建立索引
+_CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_TOKEN_PATTERN = re.compile(f'([{_CJK_RANGES}]+)|([^\\W_{_CJK_RANGES}]+)')
+
+
+def normalize_text(text):
+    """全形轉半形並轉為小寫，讓「ＰＹＴＨＯＮ」與「python」視為相同"""
+    return unicodedata.normalize('NFKC', str(text)).casefold()
+
+
+def _iter_runs(text):
+    """依序返回 (是否為中日韓文字, 連續片段)"""
+    for match in _TOKEN_PATTERN.finditer(normalize_text(text)):
+        cjk, word = match.groups()
+        yield (True, cjk) if cjk else (False, word)
+
+
+def tokenize(text):
+    """文件用的分詞：英數字以單字為單位，中日韓文字取單字與相鄰兩字 (bigram)
+
+    同時保留單字是為了讓只有一個字的查詢也能命中。
+    """
+    if not text:
+        return []
+    tokens = []
+    for is_cjk, run in _iter_runs(text):
+        if not is_cjk:
+            tokens.append(run)
+            continue
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def tokenize_query(text):
+    """查詢用的分詞：中日韓文字只取 bigram（只有一個字時才用單字），並去除重複"""
+    if not text:
+        return []
+    tokens = []
+    for is_cjk, run in _iter_runs(text):
+        if not is_cjk or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return list(dict.fromkeys(tokens))